@@ -0,0 +1,135 @@
+import http.server
+import json
+import random
+import threading
+import time
+from collections import Counter
+
+# A fake Anthropic Messages API for benchmarks and load tests. Answers are canned, but the timing
+# is not: every request waits for a time-to-first-token, streamed answers arrive at a fixed token
+# rate, and every rate_limit_every-th request is rejected with a 429 and a retry-after header.
+
+class FakeAnthropic:
+    def __init__(self, first_token_seconds=0.2, tokens_per_second=200, answer_words=150, rate_limit_every=0, retry_after_seconds=0.5, seed=1, host="127.0.0.1", port=0):
+        self.first_token_seconds = first_token_seconds
+        self.tokens_per_second = tokens_per_second
+        self.answer_words = answer_words
+        self.rate_limit_every = rate_limit_every
+        self.retry_after_seconds = retry_after_seconds
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.input_characters = 0
+
+        fake = self
+
+        class Handler(MessagesRequestHandler):
+            server_fake = fake
+
+        self.server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def admit(self, request):
+        # Returns False when this request should be rate limited
+        with self.lock:
+            self.counts["requests"] += 1
+            self.input_characters += len(json.dumps(request.get("messages", [])))
+            if self.rate_limit_every and self.counts["requests"] % self.rate_limit_every == 0:
+                self.counts["rate_limited"] += 1
+                return False
+            self.counts["streamed" if request.get("stream") else "completed"] += 1
+            return True
+
+    def answer_chunks(self):
+        with self.lock:
+            words = [self.rng.choice(["the", "fund", "letters", "discussed", "inflation", "rates", "positioning", "[Fund 2024 Q1]"]) for _ in range(self.answer_words)]
+        text = "<thinking>Plan the answer.</thinking><answer>" + " ".join(words) + "</answer>"
+        # About one token per word
+        return [text[index:index + 40] for index in range(0, len(text), 40)], len(words) + 10
+
+    def stats(self):
+        with self.lock:
+            return {"requests": dict(self.counts), "input_characters": self.input_characters}
+
+    def reset_stats(self):
+        with self.lock:
+            self.counts = Counter()
+            self.input_characters = 0
+
+class MessagesRequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_fake = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        fake = self.server_fake
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+
+        if not self.path.rstrip("/").endswith("/v1/messages"):
+            return self.send_json(404, {"type": "error", "error": {"type": "not_found_error", "message": self.path}})
+
+        if not fake.admit(request):
+            return self.send_json(429, {"type": "error", "error": {"type": "rate_limit_error", "message": "Rate limited by the fake server"}},
+                                  {"retry-after": str(fake.retry_after_seconds)})
+
+        chunks, output_tokens = fake.answer_chunks()
+        input_tokens = len(json.dumps(request.get("messages", []))) // 4
+        message = {"id": "msg_fake", "type": "message", "role": "assistant", "model": request.get("model", "fake"),
+                   "stop_reason": None, "stop_sequence": None}
+        time.sleep(fake.first_token_seconds)
+
+        if not request.get("stream"):
+            time.sleep(output_tokens / fake.tokens_per_second if fake.tokens_per_second else 0)
+            return self.send_json(200, dict(message, content=[{"type": "text", "text": "".join(chunks)}], stop_reason="end_turn",
+                                            usage={"input_tokens": input_tokens, "output_tokens": output_tokens}))
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(name, payload):
+            self.write_chunk(f"event: {name}\ndata: {json.dumps(payload)}\n\n".encode())
+
+        event("message_start", {"type": "message_start", "message": dict(message, content=[], usage={"input_tokens": input_tokens, "output_tokens": 0})})
+        event("content_block_start", {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})
+        pause = output_tokens / fake.tokens_per_second / len(chunks) if fake.tokens_per_second else 0
+        for chunk in chunks:
+            event("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": chunk}})
+            time.sleep(pause)
+        event("content_block_stop", {"type": "content_block_stop", "index": 0})
+        event("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None}, "usage": {"output_tokens": output_tokens}})
+        event("message_stop", {"type": "message_stop"})
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
@@ -0,0 +1,307 @@
+import argparse
+import contextlib
+import math
+import os
+import resource
+import tempfile
+import threading
+import time
+import urllib.request
+from collections import defaultdict
+from unittest import mock
+from unittest.mock import MagicMock
+
+import streamlit.config
+import streamlit.logger
+from streamlit.components.v2.component_manager import BidiComponentManager
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.dataframe_source_manager import DataframeSourceManager
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.testing.v1 import AppTest
+
+from run_benchmarks import REPO_DIR, SyntheticDataset, add_backend_arguments, configure_environment, import_app, remove_work_dir, report_header, reset_caches, start_backends, write_report
+from synthetic_data import add_arguments, dataset_parameters, generate_objects
+
+# Drives many simulated sessions through main() at once with Streamlit's AppTest, against the
+# S3 stand-in and the fake Anthropic server, and reports rerun latency percentiles, throughput,
+# peak RSS and backend calls per scenario.
+#
+# All sessions share one process, like the sessions of one replica: st.cache_resource singletons,
+# clients and caches are shared, and the sessions compete for the GIL and for the backends.
+
+APP_PATH = os.path.join(REPO_DIR, "testv16_without_API.py")
+
+class SessionError(Exception):
+    pass
+
+class Session:
+    # One browser tab: an AppTest whose reruns are timed
+    def __init__(self, index, dataset, timeout):
+        self.index = index
+        self.dataset = dataset
+        self.app_test = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        self.reruns = []
+
+    def rerun(self, step, action=None):
+        start = time.perf_counter()
+        (action or self.app_test).run()
+        self.reruns.append((step, time.perf_counter() - start))
+        if self.app_test.exception:
+            raise SessionError(f"{step}: {self.app_test.exception[0].value}")
+        return self.app_test
+
+    def widget(self, kind, label):
+        for element in getattr(self.app_test, kind):
+            if element.label == label:
+                return element
+        raise SessionError(f"No {kind} labelled {label!r}")
+
+    def choose(self, step, kind, label, value):
+        return self.rerun(step, self.widget(kind, label).set_value(value))
+
+    def click(self, step, label):
+        return self.rerun(step, self.widget("button", label).click())
+
+    def type(self, step, label, text):
+        return self.rerun(step, self.widget("text_input", label).input(text))
+
+    def fund(self):
+        # Sessions spread over the funds, as a team of analysts would
+        return self.dataset.hedge_funds[self.index % len(self.dataset.hedge_funds)]
+
+def opportunity_scout(session):
+    session.rerun("open")
+    session.choose("navigate", "radio", "Navigation", "Bird's-Eye View (Multiple Funds)")
+    session.choose("select funds", "multiselect", "Select Funds", ["All"])
+    session.click("submit", "Submit")
+
+def deep_dive_pdf(session):
+    session.rerun("open")
+    session.choose("navigate", "radio", "Navigation", "Deep Dive (Single Fund)")
+    app_test = session.choose("select fund", "selectbox", "Select a Hedge Funds", session.fund())
+
+    # The browser fetches a presigned PDF link straight from S3; the file download is served by Streamlit
+    links = [element.proto.url for element in app_test.get("link_button")]
+    if links:
+        start = time.perf_counter()
+        with urllib.request.urlopen(links[0]) as response:
+            response.read()
+        session.reruns.append(("pdf download", time.perf_counter() - start))
+    elif not app_test.get("download_button"):
+        raise SessionError("No summary PDF offered")
+
+def deep_dive_ask_anything(session):
+    session.rerun("open")
+    session.choose("navigate", "radio", "Navigation", "Deep Dive (Single Fund)")
+    session.choose("select fund", "selectbox", "Select a Hedge Funds", session.fund())
+    session.choose("ask anything", "radio", "Select Analysis", "Ask Anything")
+    session.type("question", "Enter your question:", "What did the letter say about inflation and rates?")
+
+def market_mood_monitor(session, poll_seconds=0.5, timeout_seconds=120):
+    session.rerun("open")
+    session.choose("navigate", "radio", "Navigation", "Bird's-Eye View (Multiple Funds)")
+    session.choose("select section", "selectbox", "Select an option", "Market Mood Monitor")
+    session.choose("select funds", "multiselect", "Select Funds", ["All"])
+    themes = session.widget("multiselect", "Select market commentary themes:").options
+    session.choose("select themes", "multiselect", "Select market commentary themes:", themes[:2])
+    session.click("submit", "Submit")
+
+    # The analysis runs as a background job; the page polls until its result is shown
+    deadline = time.monotonic() + timeout_seconds
+    while True:
+        app_test = session.rerun("poll")
+        if app_test.error:
+            raise SessionError(f"poll: {app_test.error[0].value}")
+        if any(expander.label.startswith("Market Commentary:") for expander in app_test.expander):
+            return
+        if time.monotonic() > deadline:
+            raise SessionError("Analysis did not finish")
+        time.sleep(poll_seconds)
+
+SCENARIOS = {
+    "opportunity_scout": opportunity_scout,
+    "deep_dive_pdf": deep_dive_pdf,
+    "deep_dive_ask_anything": deep_dive_ask_anything,
+    "market_mood_monitor": market_mood_monitor,
+}
+
+class RssSampler:
+    # Peak resident set size while a scenario runs, sampled from /proc (ru_maxrss elsewhere)
+    def __init__(self, interval_seconds=0.05):
+        self.interval_seconds = interval_seconds
+        self.peak_bytes = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def current_bytes(self):
+        try:
+            with open("/proc/self/statm") as statm:
+                return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError):
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.peak_bytes = max(self.peak_bytes, self.current_bytes())
+            self.stopped.wait(self.interval_seconds)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+        self.peak_bytes = max(self.peak_bytes, self.current_bytes())
+
+def percentile(values, percent):
+    # Nearest-rank percentile
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+def latency_summary(seconds):
+    milliseconds = [value * 1000 for value in seconds]
+    return {
+        "count": len(milliseconds),
+        "p50_ms": round(percentile(milliseconds, 50), 2) if milliseconds else None,
+        "p95_ms": round(percentile(milliseconds, 95), 2) if milliseconds else None,
+        "p99_ms": round(percentile(milliseconds, 99), 2) if milliseconds else None,
+        "max_ms": round(max(milliseconds), 2) if milliseconds else None,
+    }
+
+def run_session(scenario, index, dataset, iterations, timeout, start_delay, results, lock):
+    time.sleep(start_delay)
+    for _ in range(iterations):
+        session = Session(index, dataset, timeout)
+        error = None
+        try:
+            scenario(session)
+        except Exception as e:
+            error = f"{type(e).__name__}: {str(e)}"
+        with lock:
+            results["reruns"].extend(session.reruns)
+            results["completed" if error is None else "failed"] += 1
+            if error is not None:
+                results["errors"].append(error)
+
+def run_scenario(name, sessions, iterations, ramp_seconds, timeout, dataset, s3_stand_in, fake_anthropic):
+    results = {"reruns": [], "completed": 0, "failed": 0, "errors": []}
+    lock = threading.Lock()
+    s3_stand_in.reset_stats()
+    fake_anthropic.reset_stats()
+
+    threads = [
+        threading.Thread(target=run_session, args=(SCENARIOS[name], index, dataset, iterations, timeout, ramp_seconds * index / max(1, sessions), results, lock), daemon=True)
+        for index in range(sessions)
+    ]
+    with RssSampler() as rss:
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall_seconds = time.perf_counter() - start
+
+    steps = defaultdict(list)
+    for step, seconds in results["reruns"]:
+        steps[step].append(seconds)
+
+    return dict(
+        latency_summary([seconds for step, seconds in results["reruns"] if step != "pdf download"]),
+        sessions=sessions,
+        iterations=iterations,
+        completed=results["completed"],
+        failed=results["failed"],
+        errors=sorted(set(results["errors"]))[:10],
+        wall_seconds=round(wall_seconds, 3),
+        reruns_per_second=round(len(results["reruns"]) / wall_seconds, 2),
+        scenarios_per_second=round(results["completed"] / wall_seconds, 3),
+        peak_rss_mb=round(rss.peak_bytes / 1e6, 1),
+        steps={step: latency_summary(seconds) for step, seconds in steps.items()},
+        s3=s3_stand_in.stats(),
+        llm=fake_anthropic.stats(),
+    )
+
+class RuntimeSlot:
+    # Receives the runtime AppTest installs (and removes) around every run, see concurrent_app_tests
+    _instance = None
+
+@contextlib.contextmanager
+def concurrent_app_tests():
+    # AppTest is written for one test at a time: every run installs a fresh global Runtime and
+    # ScriptCache, toggles the global.appTest option, and undoes all three when it finishes, which
+    # breaks the runs of other sessions still in flight. Under `streamlit run` all sessions share one
+    # runtime and compile the script once, so the sessions here do the same.
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.dataframe_source_mgr = DataframeSourceManager()
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    runtime.bidi_component_registry = BidiComponentManager()
+    runtime.bidi_component_registry.discover_and_register_components(start_file_watching=False)
+    script_cache = ScriptCache()
+
+    streamlit.config.set_option("global.appTest", True)
+    Runtime._instance = runtime
+    try:
+        with mock.patch("streamlit.testing.v1.app_test.Runtime", RuntimeSlot), \
+                mock.patch("streamlit.testing.v1.app_test.ScriptCache", lambda: script_cache), \
+                mock.patch("streamlit.testing.v1.local_script_runner.ScriptCache", lambda: script_cache):
+            yield
+    finally:
+        Runtime._instance = None
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive concurrent simulated sessions through the app and report rerun latency, throughput, RSS and backend calls")
+    add_arguments(parser)
+    add_backend_arguments(parser)
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="Scenario to run (repeatable; default: all)")
+    parser.add_argument("--sessions", type=int, default=10, help="Concurrent sessions per scenario")
+    parser.add_argument("--iterations", type=int, default=1, help="Times each session runs its script, each time as a new session")
+    parser.add_argument("--ramp-seconds", type=float, default=0.0, help="Spread the session starts over this many seconds")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Timeout of a single rerun in seconds")
+    parser.add_argument("--keep-caches", action="store_true", help="Do not clear the process and disk caches between scenarios")
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/load-<commit>.json)")
+    args = parser.parse_args()
+
+    parameters = dataset_parameters(args)
+    objects = generate_objects(**parameters)
+    dataset = SyntheticDataset(objects)
+    s3_stand_in, fake_anthropic = start_backends(args, objects)
+
+    streamlit.logger.set_log_level("error")
+
+    work_dir = tempfile.mkdtemp(prefix="load-test-")
+    results = {}
+    try:
+        overrides = configure_environment(s3_stand_in, fake_anthropic, work_dir)
+        # The app module is only imported to clear its caches; the sessions run the script itself
+        app = import_app()
+
+        with concurrent_app_tests():
+            for name in args.scenario or list(SCENARIOS):
+                if not args.keep_caches:
+                    reset_caches(app, work_dir)
+                results[name] = run_scenario(name, args.sessions, args.iterations, args.ramp_seconds, args.timeout, dataset, s3_stand_in, fake_anthropic)
+                result = results[name]
+                print(f"{name:24} {result['completed']}/{result['sessions'] * result['iterations']} ok   p50 {result['p50_ms']} ms   p95 {result['p95_ms']} ms   "
+                      f"p99 {result['p99_ms']} ms   {result['reruns_per_second']} reruns/s   peak RSS {result['peak_rss_mb']} MB   "
+                      f"S3 {result['s3']['requests'].get('GetObject', 0)} GETs   LLM {result['llm']['requests'].get('requests', 0)} requests")
+                for error in result["errors"]:
+                    print(f"    {error}")
+    finally:
+        s3_stand_in.stop()
+        fake_anthropic.stop()
+        remove_work_dir(work_dir)
+
+    report = report_header(args, parameters, objects, overrides)
+    report["load"] = {"sessions": args.sessions, "iterations": args.iterations, "ramp_seconds": args.ramp_seconds, "keep_caches": args.keep_caches}
+    report["results"] = results
+    write_report(report, args.output, "load-")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,312 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from unittest import mock
+
+from fake_anthropic import FakeAnthropic
+from s3_stand_in import LatencyModel, S3StandIn
+from synthetic_data import SECTORS, add_arguments, dataset_parameters, generate_objects
+
+# Times each section's data path against the S3 stand-in and the fake LLM.
+#
+# Every target is measured "cold" (process caches and disk caches cleared first, as after a deploy),
+# "warm" (a new session over warm process caches) and "rerun" (a later rerun of the same session, with
+# unchanged inputs). Results are written as JSON named after the current commit, so two commits can be
+# compared with --compare.
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+
+# Settings recorded with the results, so runs with different configurations are not compared by accident
+RECORDED_SETTING_PREFIXES = ("S3_", "LLM_", "OBJECT_CACHE_", "DATASET_CACHE_", "SHARED_CACHE_", "SINGLE_FLIGHT_", "USE_", "BUCKET_", "TRACING_", "PDF_DOWNLOAD_", "ASK_ANYTHING_", "PASSAGE_")
+
+def configure_environment(s3_stand_in, fake_anthropic, work_dir):
+    # Must run before the app is imported, since it reads its settings at import time
+    overrides = {
+        "AWS_ACCESS_KEY_ID": "benchmark",
+        "AWS_SECRET_ACCESS_KEY": "benchmark",
+        "REGION_NAME": "us-east-1",
+        "S3_ENDPOINT_URL": s3_stand_in.endpoint_url,
+        "ANTHROPIC_BASE_URL": fake_anthropic.base_url,
+        "LLM_CACHE_PATH": os.path.join(work_dir, "llm_responses.sqlite3"),
+        "COLUMNAR_CACHE_DIR": os.path.join(work_dir, "columnar"),
+        "PDF_CACHE_DIR": os.path.join(work_dir, "pdf"),
+        "TRACE_LOG_PATH": os.path.join(work_dir, "traces.jsonl"),
+        "TRACE_METRICS_PATH": os.path.join(work_dir, "metrics.prom"),
+        "PROFILE_OUTPUT_DIR": os.path.join(work_dir, "profiles"),
+    }
+    path = shared_cache_path(work_dir)
+    if path:
+        overrides["SHARED_CACHE_PATH"] = path
+    os.environ.update(overrides)
+    return overrides
+
+def shared_cache_path(work_dir):
+    # The disk and shm shared tiers get a directory of their own, so cold runs start empty and an
+    # existing cache (the real app's, or a SHARED_CACHE_PATH from the environment) is never cleared
+    backend = os.environ.get("SHARED_CACHE_BACKEND")
+    if backend == "disk":
+        return os.path.join(work_dir, "shared")
+    if backend == "shm":
+        return os.path.join("/dev/shm", "hedgefund-" + os.path.basename(work_dir))
+    return None
+
+def remove_work_dir(work_dir):
+    path = shared_cache_path(work_dir)
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+def import_app():
+    sys.path.insert(0, REPO_DIR)
+    import testv16_without_API as app
+
+    # Outside `streamlit run` every widget call logs a missing-context warning
+    for name in list(logging.root.manager.loggerDict):
+        if name.startswith("streamlit"):
+            logging.getLogger(name).setLevel(logging.ERROR)
+    return app
+
+def reset_caches(app, work_dir):
+    # A cold start: no process-wide caches, clients, manifests or disk caches
+    app.st.cache_resource.clear()
+    app.st.cache_data.clear()
+    new_session(app)
+    for path in [os.path.join(work_dir, name) for name in ("columnar", "pdf", "llm_responses.sqlite3")] + [shared_cache_path(work_dir)]:
+        if not path:
+            continue
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+
+def new_session(app):
+    # Outside `streamlit run` there is a single session state, shared by every call
+    app.st.session_state.clear()
+
+class BenchmarkContext:
+    # The objects render_page builds on every rerun
+    def __init__(self, app, dataset):
+        app.get_stage_memo().start_rerun()
+        self.app = app
+        self.dataset = dataset
+        self.aws_operations = app.AWSOperations()
+        self.ai_response_generator = app.AIResponseGenerator(app.ANTHROPIC_API_KEY)
+        self.document_fetcher = app.DocumentFetcher(self.aws_operations)
+        self.opportunity_scout = app.OpportunityScout(self.aws_operations, "hedgefunds")
+        self.performance_pulse = app.PerformancePulse(self.aws_operations)
+        self.market_mood_monitor = app.MarketMoodMonitor(self.aws_operations, self.ai_response_generator, "hedgefund_general_insights.json", self.document_fetcher)
+        self.vc_opportunity_scout = app.VCOpportunityScout(self.aws_operations)
+        self.specific_funds_section = app.SpecificFundsSection(self.aws_operations, self.ai_response_generator, self.document_fetcher)
+
+class SyntheticDataset:
+    # Fund names and quarters, read from the generated objects rather than through the app
+    def __init__(self, objects):
+        general = json.loads(objects[("hedgefunds", "hedgefund_general_insights.json")])
+        vc_performance = json.loads(objects[("venturecapitalfunds", "vc_performance_insights.json")])
+        self.hedge_funds = sorted({record["Fund Name"] for record in general})
+        self.vc_funds = sorted({record["Fund Name"] for record in vc_performance})
+        self.quarters = sorted({record["Date"] for record in general})
+        self.formatted_hedge_funds = [fund.lower().replace(" ", "") for fund in self.hedge_funds]
+
+def first_themes(label, options, *args, **kwargs):
+    return list(options)[:3]
+
+def theme_specific(context):
+    # What MarketMoodMonitor.run does around handle_theme_specific, with three themes picked
+    dataset = context.dataset
+    start_quarter, end_quarter = dataset.quarters[0], dataset.quarters[-1]
+    fund_info_data = context.market_mood_monitor.fetch_fund_info_data(context.app.quarters_between(start_quarter, end_quarter))
+    with mock.patch.object(context.app.st, "multiselect", side_effect=first_themes):
+        context.market_mood_monitor.handle_theme_specific(fund_info_data, "Market Commentary", dataset.hedge_funds, start_quarter, end_quarter)
+
+def theme_analysis(context):
+    # The body of the background job that Submit starts, over the latest quarter's letters
+    fund_names_dates = [f"{fund} {context.dataset.quarters[-1]}" for fund in context.dataset.hedge_funds[:5]]
+    job = context.app.Job("benchmark")
+    context.market_mood_monitor.run_analysis(job, "Summarize the inflation views of these funds.", "You are an investment analyst.", fund_names_dates)
+
+def specific_fund(section):
+    def run(context):
+        with mock.patch.object(context.app.st.sidebar, "radio", return_value=section):
+            context.specific_funds_section.run(context.dataset.hedge_funds[0])
+    return run
+
+TARGETS = {
+    "OpportunityScout.aggregate_companies": lambda context: context.opportunity_scout.aggregate_companies(
+        context.dataset.formatted_hedge_funds, SECTORS[:3], context.dataset.quarters[0], context.dataset.quarters[-1], "Position Added", "Long"),
+    "OpportunityScout.get_top_sectors": lambda context: context.opportunity_scout.get_top_sectors(
+        context.dataset.formatted_hedge_funds, context.dataset.quarters[0], context.dataset.quarters[-1]),
+    "MarketMoodMonitor.handle_theme_specific": theme_specific,
+    "MarketMoodMonitor.run_analysis": theme_analysis,
+    "PerformancePulse.run": lambda context: context.performance_pulse.run(context.dataset.hedge_funds),
+    "VCOpportunityScout.run": lambda context: context.vc_opportunity_scout.run("Venture Capital Funds", context.dataset.vc_funds),
+    "SpecificFundsSection.run[Summary]": specific_fund("Summary"),
+    "SpecificFundsSection.run[Performance]": specific_fund("Performance"),
+    "SpecificFundsSection.run[Notable Anomalies]": specific_fund("Notable Anomalies"),
+    "SpecificFundsSection.run[Firm Updates & Events]": specific_fund("Firm Updates & Events"),
+}
+
+def summarize(samples):
+    durations = sorted(sample["seconds"] * 1000 for sample in samples)
+    return {
+        "runs": len(durations),
+        "min_ms": round(durations[0], 3),
+        "median_ms": round(statistics.median(durations), 3),
+        "mean_ms": round(statistics.fmean(durations), 3),
+        "p95_ms": round(durations[min(len(durations) - 1, int(round(0.95 * (len(durations) - 1))))], 3),
+        "max_ms": round(durations[-1], 3),
+        "s3_requests": samples[0]["s3"]["requests"],
+        "s3_bytes": samples[0]["s3"]["bytes_sent"],
+        "llm_requests": samples[0]["llm"]["requests"],
+    }
+
+def measure(target, context, s3_stand_in, fake_anthropic):
+    s3_stand_in.reset_stats()
+    fake_anthropic.reset_stats()
+    start = time.perf_counter()
+    target(context)
+    seconds = time.perf_counter() - start
+    return {"seconds": seconds, "s3": s3_stand_in.stats(), "llm": fake_anthropic.stats()}
+
+def run_target(app, dataset, target, cold_runs, warm_runs, s3_stand_in, fake_anthropic, work_dir):
+    cold = []
+    for _ in range(cold_runs):
+        reset_caches(app, work_dir)
+        cold.append(measure(target, BenchmarkContext(app, dataset), s3_stand_in, fake_anthropic))
+
+    warm = []
+    for _ in range(warm_runs):
+        new_session(app)
+        warm.append(measure(target, BenchmarkContext(app, dataset), s3_stand_in, fake_anthropic))
+
+    rerun = [measure(target, BenchmarkContext(app, dataset), s3_stand_in, fake_anthropic) for _ in range(warm_runs)]
+    return {"cold": summarize(cold), "warm": summarize(warm), "rerun": summarize(rerun)}
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+def add_backend_arguments(parser):
+    parser.add_argument("--s3-latency-ms", type=float, default=20.0, help="Base latency of every S3 request")
+    parser.add_argument("--s3-jitter-ms", type=float, default=10.0)
+    parser.add_argument("--s3-tail-probability", type=float, default=0.02, help="Share of S3 requests that also get the tail latency")
+    parser.add_argument("--s3-tail-ms", type=float, default=300.0)
+    parser.add_argument("--s3-mbps", type=float, default=0, help="Simulated S3 bandwidth in MB/s (0 for unlimited)")
+    parser.add_argument("--llm-first-token-ms", type=float, default=300.0)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=400.0)
+    parser.add_argument("--llm-rate-limit-every", type=int, default=0, help="Reject every n-th LLM request with a 429 (0 to never)")
+
+def start_backends(args, objects):
+    latency = LatencyModel(args.s3_latency_ms / 1000, args.s3_jitter_ms / 1000, args.s3_tail_probability, args.s3_tail_ms / 1000, args.s3_mbps * 1e6, seed=args.seed)
+    s3_stand_in = S3StandIn(latency).start()
+    s3_stand_in.load(objects)
+    fake_anthropic = FakeAnthropic(args.llm_first_token_ms / 1000, args.llm_tokens_per_second, rate_limit_every=args.llm_rate_limit_every, seed=args.seed).start()
+    return s3_stand_in, fake_anthropic
+
+def report_header(args, parameters, objects, overrides):
+    commit, dirty = git_commit()
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "dirty": dirty,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "dataset": dict(parameters, objects=len(objects), bytes=sum(len(body) for body in objects.values())),
+        "backends": {
+            "s3_latency_ms": args.s3_latency_ms, "s3_jitter_ms": args.s3_jitter_ms, "s3_tail_probability": args.s3_tail_probability,
+            "s3_tail_ms": args.s3_tail_ms, "s3_mbps": args.s3_mbps, "llm_first_token_ms": args.llm_first_token_ms,
+            "llm_tokens_per_second": args.llm_tokens_per_second, "llm_rate_limit_every": args.llm_rate_limit_every,
+        },
+        "settings": {name: value for name, value in sorted(os.environ.items()) if name.startswith(RECORDED_SETTING_PREFIXES) and name not in overrides},
+    }
+
+def write_report(report, output, prefix):
+    commit, dirty = report["commit"], report["dirty"]
+    output = output or os.path.join(BENCHMARK_DIR, "results", f"{prefix}{(commit or 'unknown')[:12]}{'-dirty' if dirty else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as output_file:
+        json.dump(report, output_file, indent=2)
+    print(f"Wrote {output}")
+
+def compare(baseline, current):
+    print(f"\nMedian change against {baseline.get('commit') or 'baseline'}:")
+    for name, result in current["results"].items():
+        previous = baseline.get("results", {}).get(name)
+        if previous is None:
+            continue
+        changes = []
+        for mode in ("cold", "warm", "rerun"):
+            if mode not in previous or mode not in result:
+                continue
+            before, after = previous[mode]["median_ms"], result[mode]["median_ms"]
+            change = (after - before) / before * 100 if before else 0.0
+            changes.append(f"{mode} {before:9.2f} -> {after:9.2f} ms ({change:+6.1f}%)")
+        print(f"  {name:48} " + "   ".join(changes))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark each section's data path against a local S3 stand-in and a fake LLM")
+    add_arguments(parser)
+    parser.add_argument("--cold-runs", type=int, default=3, help="Runs per target after clearing every cache")
+    parser.add_argument("--warm-runs", type=int, default=10, help="Runs per target over warm caches, both as new sessions and as reruns")
+    parser.add_argument("--only", action="append", default=[], help="Run only targets whose name contains this text (repeatable)")
+    add_backend_arguments(parser)
+    parser.add_argument("--build-datasets", action="store_true", help="Write the Parquet and quarter-partitioned copies with build_datasets.py first")
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="Earlier results file to compare the medians against")
+    args = parser.parse_args()
+
+    parameters = dataset_parameters(args)
+    objects = generate_objects(**parameters)
+    dataset = SyntheticDataset(objects)
+    print(f"Generated {len(objects)} objects ({sum(len(body) for body in objects.values()) / 1e6:.1f} MB) for {len(dataset.hedge_funds)} hedge funds and {len(dataset.vc_funds)} VC funds")
+
+    s3_stand_in, fake_anthropic = start_backends(args, objects)
+
+    work_dir = tempfile.mkdtemp(prefix="benchmarks-")
+    try:
+        overrides = configure_environment(s3_stand_in, fake_anthropic, work_dir)
+        app = import_app()
+
+        if args.build_datasets:
+            import build_datasets
+            build_datasets.build_hedge_fund_datasets(app.AWSOperations())
+            build_datasets.build_vc_datasets(app.AWSOperations())
+
+        results = {}
+        for name, target in TARGETS.items():
+            if args.only and not any(text in name for text in args.only):
+                continue
+            results[name] = run_target(app, dataset, target, args.cold_runs, args.warm_runs, s3_stand_in, fake_anthropic, work_dir)
+            cold, warm, rerun = results[name]["cold"], results[name]["warm"], results[name]["rerun"]
+            print(f"{name:48} cold {cold['median_ms']:9.2f} ms ({cold['s3_requests'].get('GetObject', 0)} GETs)   warm {warm['median_ms']:9.2f} ms (p95 {warm['p95_ms']:.2f} ms)   rerun {rerun['median_ms']:8.2f} ms")
+    finally:
+        s3_stand_in.stop()
+        fake_anthropic.stop()
+        remove_work_dir(work_dir)
+
+    report = report_header(args, parameters, objects, overrides)
+    report["dataset"]["build_datasets"] = args.build_datasets
+    report["runs"] = {"cold": args.cold_runs, "warm": args.warm_runs}
+    report["results"] = results
+    write_report(report, args.output, "")
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            compare(json.load(baseline_file), report)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+import hashlib
+import http.server
+import random
+import threading
+import time
+from collections import Counter
+from email.utils import formatdate
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+from xml.sax.saxutils import escape
+
+# A small S3-compatible HTTP server for benchmarks and load tests. It supports the calls the app
+# makes (GET/HEAD with If-None-Match, PUT, ListObjectsV2, presigned GETs) with both path-style
+# and virtual-hosted addressing, and can add latency with a slow tail to every request.
+
+class StoredObject:
+    def __init__(self, body, content_encoding=None):
+        self.body = body
+        self.content_encoding = content_encoding
+        self.etag = f'"{hashlib.md5(body).hexdigest()}"'
+        self.last_modified = formatdate(time.time(), usegmt=True)
+
+class LatencyModel:
+    # base + uniform jitter, and with probability tail_probability an extra tail delay
+    def __init__(self, base_seconds=0.0, jitter_seconds=0.0, tail_probability=0.0, tail_seconds=0.0, bytes_per_second=0, seed=1):
+        self.base_seconds = base_seconds
+        self.jitter_seconds = jitter_seconds
+        self.tail_probability = tail_probability
+        self.tail_seconds = tail_seconds
+        self.bytes_per_second = bytes_per_second
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def delay(self, size=0):
+        with self.lock:
+            seconds = self.base_seconds + self.rng.uniform(0, self.jitter_seconds)
+            if self.tail_probability and self.rng.random() < self.tail_probability:
+                seconds += self.tail_seconds
+        if self.bytes_per_second:
+            seconds += size / self.bytes_per_second
+        return seconds
+
+class S3StandIn:
+    def __init__(self, latency=None, host="127.0.0.1", port=0):
+        self.buckets = {}
+        self.latency = latency or LatencyModel()
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.bytes_sent = 0
+
+        stand_in = self
+
+        class Handler(S3RequestHandler):
+            server_stand_in = stand_in
+
+        self.server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def endpoint_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def put(self, bucket_name, key, body, content_encoding=None):
+        with self.lock:
+            self.buckets.setdefault(bucket_name, {})[key] = StoredObject(body, content_encoding)
+
+    def load(self, objects):
+        # objects: {(bucket name, key): bytes}, as returned by synthetic_data.generate_objects
+        for (bucket_name, key), body in objects.items():
+            self.put(bucket_name, key, body)
+
+    def get(self, bucket_name, key):
+        with self.lock:
+            return self.buckets.get(bucket_name, {}).get(key)
+
+    def list_keys(self, bucket_name, prefix, start_after):
+        with self.lock:
+            keys = sorted(key for key in self.buckets.get(bucket_name, {}) if key.startswith(prefix) and key > start_after)
+            return [(key, self.buckets[bucket_name][key]) for key in keys]
+
+    def record(self, operation, sent_bytes=0):
+        with self.lock:
+            self.counts[operation] += 1
+            self.bytes_sent += sent_bytes
+
+    def stats(self):
+        with self.lock:
+            return {"requests": dict(self.counts), "total_requests": sum(self.counts.values()), "bytes_sent": self.bytes_sent}
+
+    def reset_stats(self):
+        with self.lock:
+            self.counts = Counter()
+            self.bytes_sent = 0
+
+class S3RequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_stand_in = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def parse_target(self):
+        # Returns (bucket name, key, query) for path-style and virtual-hosted requests
+        url = urlsplit(self.path)
+        query = {name: values[0] for name, values in parse_qs(url.query, keep_blank_values=True).items()}
+        path = unquote(url.path)
+        host = (self.headers.get("Host") or "").split(":")[0]
+        with self.server_stand_in.lock:
+            bucket_names = list(self.server_stand_in.buckets)
+        for bucket_name in bucket_names:
+            if host.startswith(bucket_name + "."):
+                return bucket_name, path.lstrip("/"), query
+
+        bucket_name, _, key = path.lstrip("/").partition("/")
+        return bucket_name, key, query
+
+    def send(self, status, body=b"", headers=None, include_body=True):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if include_body and body:
+            self.wfile.write(body)
+
+    def send_error_xml(self, status, code, message, resource, include_body=True):
+        body = (f'<?xml version="1.0" encoding="UTF-8"?>\n<Error><Code>{code}</Code><Message>{escape(message)}</Message>'
+                f'<Resource>{escape(resource)}</Resource><RequestId>stand-in</RequestId></Error>').encode()
+        self.send(status, body, {"Content-Type": "application/xml"}, include_body)
+
+    def read_request_body(self):
+        if "chunked" in (self.headers.get("Transfer-Encoding") or ""):
+            body = b""
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    # Trailers (e.g. x-amz-checksum-crc32) end with an empty line
+                    while self.rfile.readline().strip():
+                        pass
+                    return body
+                body += self.rfile.read(size)
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def decode_aws_chunked(self, body):
+        # Streaming uploads wrap the payload as "<hex size>[;chunk-signature=...]\r\n<data>\r\n"
+        decoded = b""
+        position = 0
+        while position < len(body):
+            line_end = body.index(b"\r\n", position)
+            size = int(body[position:line_end].split(b";")[0], 16)
+            if size == 0:
+                break
+            decoded += body[line_end + 2:line_end + 2 + size]
+            position = line_end + 2 + size + 2
+        return decoded
+
+    def wait(self, size=0):
+        seconds = self.server_stand_in.latency.delay(size)
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def do_GET(self):
+        self.handle_read(include_body=True)
+
+    def do_HEAD(self):
+        self.handle_read(include_body=False)
+
+    def handle_read(self, include_body):
+        stand_in = self.server_stand_in
+        bucket_name, key, query = self.parse_target()
+
+        if bucket_name not in stand_in.buckets:
+            self.wait()
+            stand_in.record("NoSuchBucket")
+            return self.send_error_xml(404, "NoSuchBucket", "The specified bucket does not exist", bucket_name, include_body)
+
+        if not key and query.get("list-type") == "2":
+            self.wait()
+            stand_in.record("ListObjectsV2")
+            return self.send_list(bucket_name, query)
+
+        stored = stand_in.get(bucket_name, key)
+        if stored is None:
+            self.wait()
+            stand_in.record("NoSuchKey")
+            return self.send_error_xml(404, "NoSuchKey", "The specified key does not exist.", key, include_body)
+
+        headers = {"ETag": stored.etag, "Last-Modified": stored.last_modified, "Accept-Ranges": "bytes"}
+        if self.headers.get("If-None-Match") == stored.etag:
+            self.wait()
+            stand_in.record("NotModified")
+            self.send_response(304)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            return
+
+        headers["Content-Type"] = "application/octet-stream"
+        if stored.content_encoding:
+            headers["Content-Encoding"] = stored.content_encoding
+
+        self.wait(len(stored.body) if include_body else 0)
+        stand_in.record("GetObject" if include_body else "HeadObject", len(stored.body) if include_body else 0)
+        self.send(200, stored.body, headers, include_body)
+
+    def send_list(self, bucket_name, query):
+        prefix = query.get("prefix", "")
+        max_keys = int(query.get("max-keys") or 1000)
+        start_after = unquote(query.get("continuation-token") or query.get("start-after") or "")
+
+        matches = self.server_stand_in.list_keys(bucket_name, prefix, start_after)
+        page = matches[:max_keys]
+        truncated = len(matches) > max_keys
+
+        contents = "".join(
+            f"<Contents><Key>{escape(key)}</Key><LastModified>{time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime())}</LastModified>"
+            f"<ETag>{escape(stored.etag)}</ETag><Size>{len(stored.body)}</Size><StorageClass>STANDARD</StorageClass></Contents>"
+            for key, stored in page
+        )
+        next_token = f"<NextContinuationToken>{escape(quote(page[-1][0]))}</NextContinuationToken>" if truncated else ""
+        body = (f'<?xml version="1.0" encoding="UTF-8"?>\n<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+                f"<Name>{escape(bucket_name)}</Name><Prefix>{escape(prefix)}</Prefix><KeyCount>{len(page)}</KeyCount>"
+                f"<MaxKeys>{max_keys}</MaxKeys><IsTruncated>{'true' if truncated else 'false'}</IsTruncated>"
+                f"{contents}{next_token}</ListBucketResult>").encode()
+        self.send(200, body, {"Content-Type": "application/xml"})
+
+    def do_PUT(self):
+        stand_in = self.server_stand_in
+        bucket_name, key, _ = self.parse_target()
+        body = self.read_request_body()
+
+        encodings = [encoding.strip() for encoding in (self.headers.get("Content-Encoding") or "").split(",") if encoding.strip()]
+        if "aws-chunked" in encodings or (self.headers.get("x-amz-content-sha256") or "").startswith("STREAMING-"):
+            body = self.decode_aws_chunked(body)
+        encodings = [encoding for encoding in encodings if encoding != "aws-chunked"]
+
+        self.wait(len(body))
+        stand_in.put(bucket_name, key, body, ", ".join(encodings) or None)
+        stand_in.record("PutObject")
+        self.send(200, headers={"ETag": stand_in.get(bucket_name, key).etag})
@@ -0,0 +1,235 @@
+import argparse
+import json
+import os
+import random
+
+# Deterministic synthetic copies of everything the app reads from the hedgefunds and
+# venturecapitalfunds buckets. The same parameters and seed always give the same bytes.
+
+HEDGE_FUND_WORDS = ["Greenlight", "Blue Harbor", "Cedar Ridge", "Silver Birch", "North Peak", "Granite", "Harbor Light", "Iron Gate",
+                    "Juniper", "Kestrel", "Lantern", "Meridian", "Oak Hollow", "Pinecrest", "Quarry", "Redwood"]
+HEDGE_FUND_SUFFIXES = ["Capital", "Partners", "Management", "Investors"]
+VC_FUND_WORDS = ["Aster", "Beacon", "Cobalt", "Driftwood", "Ember", "Foundry", "Glacier", "Horizon", "Indigo", "Jetstream",
+                 "Keystone", "Lumen", "Mosaic", "Nimbus", "Orchard", "Prairie", "Quill", "Ridgeline", "Summit", "Tidal"]
+
+SECTORS = ["Financials", "Energy", "Health Care", "Communication Services", "Industrials", "Information Technology", "Consumer Discretionary", "Real Estate"]
+MACRO_THEMES = ["Inflation", "Interest Rates", "Recession Risk", "Monetary Policy", "Fiscal Policy", "Labor Market", "Energy Prices",
+                "Supply Chains", "Artificial Intelligence", "Deglobalization", "Credit Spreads", "Consumer Spending"]
+ASSET_CLASSES = ["Equities", "Credit", "Rates", "Commodities", "Currencies", "Private Markets", "Volatility"]
+GEOGRAPHIES = ["United States", "Europe", "China", "Japan", "India", "Latin America", "United Kingdom", "Emerging Markets"]
+INVESTMENT_TYPES = ["Seed", "Series A", "Series B", "Series C", "Follow-on"]
+FAIR_VALUES = ["Above Cost", "At Cost", "Below Cost", "Written Off"]
+
+# Vocabulary for letters and commentary; the themes are included so keyword search has something to find
+WORDS = ("the fund portfolio quarter market position returns investors valuation earnings growth risk margin cash flow "
+         "capital allocation management thesis long short exposure hedge volatility pricing demand supply company "
+         "sector outlook guidance balance sheet leverage multiple upside downside catalyst discount premium").split()
+WORDS += [word.lower() for theme in MACRO_THEMES + ASSET_CLASSES for word in theme.split()]
+
+def quarter_labels(quarters, last_year=2024, last_quarter=4):
+    # The last `quarters` quarters up to and including last_year Qlast_quarter, oldest first
+    ordinal = last_year * 4 + last_quarter - 1
+    return [f"{index // 4} Q{index % 4 + 1}" for index in range(ordinal - quarters + 1, ordinal + 1)]
+
+def hedge_fund_names(count, rng):
+    names = [f"{word} {suffix}" for word in HEDGE_FUND_WORDS for suffix in HEDGE_FUND_SUFFIXES]
+    rng.shuffle(names)
+    # Past the word list, numbered copies keep the names (and their folders) unique
+    return [names[index % len(names)] + ("" if index < len(names) else f" {index // len(names) + 1}") for index in range(count)]
+
+def vc_fund_names(count):
+    # VC folders are named after the first word, so the first words must be unique
+    return [VC_FUND_WORDS[index % len(VC_FUND_WORDS)] + ("" if index < len(VC_FUND_WORDS) else str(index // len(VC_FUND_WORDS) + 1)) + " Ventures"
+            for index in range(count)]
+
+def sentence(rng, words=12):
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+def paragraph(rng, sentences=4):
+    return " ".join(sentence(rng, rng.randint(8, 18)) for _ in range(sentences))
+
+def letter_text(rng, fund_name, quarter, words):
+    paragraphs = [f"{fund_name} {quarter} Partner Letter", "Dear Partners,"]
+    written = 0
+    while written < words:
+        count = min(words - written, rng.randint(80, 160))
+        paragraphs.append(" ".join(rng.choice(WORDS) for _ in range(count)))
+        written += count
+    return "\n\n".join(paragraphs)
+
+def summary_markdown(rng, fund_name, quarter):
+    sections = ["Performance", "Market Commentary", "Portfolio Positioning", "Notable Positions"]
+    lines = [f"# {fund_name} {quarter} Summary", ""]
+    for section in sections:
+        lines += [f"## {section}", ""] + [f"- {sentence(rng)}" for _ in range(rng.randint(2, 5))] + [""]
+    return "\n".join(lines)
+
+def pdf_bytes(title):
+    # Smallest well-formed single-page PDF; the app only ever streams it through
+    content = f"BT /F1 12 Tf 72 720 Td ({title}) Tj ET".encode()
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+               b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R >>",
+               b"<< /Length " + str(len(content)).encode() + b" >>\nstream\n" + content + b"\nendstream"]
+    body = b"%PDF-1.4\n"
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(body))
+        body += f"{number} 0 obj\n".encode() + obj + b"\nendobj\n"
+    xref = len(body)
+    body += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    body += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    body += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return body
+
+def percent(rng, low, high):
+    return f"{rng.uniform(low, high):.1f}"
+
+def themes(rng, options, low=1, high=4):
+    return ", ".join(rng.sample(options, rng.randint(low, min(high, len(options)))))
+
+def hedge_fund_objects(rng, fund_names, quarters, equities_per_fund, letter_words):
+    objects = {}
+    general, performance, anomalies, firm_updates = [], [], [], []
+
+    for fund_name in fund_names:
+        prefix = fund_name.lower().replace(" ", "")
+        equities = []
+        for index in range(equities_per_fund):
+            ticker = "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for _ in range(rng.randint(3, 4)))
+            is_open = rng.random() < 0.3
+            equities.append({
+                "Fund": fund_name,
+                "Date": quarters[index % len(quarters)],
+                "Company": f"{ticker.title()} {rng.choice(['Holdings', 'Group', 'Inc.', 'Corp.', 'Technologies'])}",
+                "Ticker": ticker,
+                "Sector": rng.choice(SECTORS),
+                "Thesis": paragraph(rng, 2),
+                "PositionType": "Long" if rng.random() < 0.75 else "Short",
+                "PositionOpen": "1" if is_open else "0",
+                "PositionClose": "1" if not is_open and rng.random() < 0.2 else "0",
+            })
+        objects[("hedgefunds", f"{prefix}/{prefix}_equities.json")] = json.dumps(equities).encode()
+
+        for quarter in quarters:
+            general.append({
+                "Fund Name": fund_name,
+                "Date": quarter,
+                "Macro": themes(rng, MACRO_THEMES),
+                "Asset Classes": themes(rng, ASSET_CLASSES),
+                "Geographies": themes(rng, GEOGRAPHIES),
+            })
+            performance.append({
+                "Fund Name": fund_name,
+                "Date": quarter,
+                "Quarterly Performance Net of Fees": percent(rng, -8, 12),
+                "Year-to-Date Performance Net of Fees": percent(rng, -15, 25),
+                "Inception-to-Date Annualized Performance Net of Fees": percent(rng, 2, 18),
+                "Key Contributors to Performance": paragraph(rng, 2),
+                "Key Detractors from Performance": paragraph(rng, 2),
+                "Investment Landscape": paragraph(rng),
+                "Portfolio Positioning": paragraph(rng),
+            })
+            anomalies.append({"Fund Name": fund_name, "Date": quarter, "Notable Anomalies": paragraph(rng, 3)})
+            firm_updates.append({
+                "Fund Name": fund_name,
+                "Date": quarter,
+                "Business Update": paragraph(rng, 2),
+                "Employee Update": sentence(rng),
+                "Media Update": sentence(rng) if rng.random() < 0.6 else "",
+                "Event Update": sentence(rng) if rng.random() < 0.4 else "",
+                "Additional Business Updates": "",
+            })
+
+            objects[("hedgefunds", f"{prefix}/cleaned/{fund_name} {quarter}.txt")] = letter_text(rng, fund_name, quarter, letter_words).encode()
+            objects[("hedgefunds", f"{prefix}/cleaned/sum_med {fund_name} {quarter}.md")] = summary_markdown(rng, fund_name, quarter).encode()
+            objects[("hedgefunds", f"{fund_name}/{fund_name} {quarter} Summary.pdf")] = pdf_bytes(f"{fund_name} {quarter} Summary")
+
+    objects[("hedgefunds", "hedgefund_general_insights.json")] = json.dumps(general).encode()
+    objects[("hedgefunds", "hedgefund_performance_insights.json")] = json.dumps(performance).encode()
+    objects[("hedgefunds", "hedgefund_anomalies.json")] = json.dumps(anomalies).encode()
+    objects[("hedgefunds", "hedgefund_firm_updates.json")] = json.dumps(firm_updates).encode()
+    return objects
+
+def vc_fund_objects(rng, fund_names, quarters, investments_per_fund, letter_words):
+    objects = {}
+    performance = []
+
+    for fund_name in fund_names:
+        prefix = fund_name.split(" ")[0].lower()
+        investments = []
+        for index in range(investments_per_fund):
+            investments.append({
+                "Fund": fund_name,
+                "Date": quarters[index % len(quarters)],
+                "Company": f"{rng.choice(WORDS).title()}{rng.choice(['ly', 'io', 'Labs', 'AI', 'Works'])}",
+                "Type of Investment": rng.choice(INVESTMENT_TYPES),
+                "Amount Invested": f"{rng.lognormvariate(1, 1):.2f}",
+                "Date invested": f"{rng.randint(2015, 2024)}-{rng.randint(1, 12):02d}",
+                "Fair Value of the Investment": rng.choice(FAIR_VALUES),
+                "Summary": paragraph(rng, 2),
+            })
+        objects[("venturecapitalfunds", f"{prefix}/{prefix}_investments.json")] = json.dumps(investments).encode()
+
+        for quarter in quarters:
+            performance.append({
+                "Fund Name": fund_name,
+                "Date": quarter,
+                "Net IRR": percent(rng, -5, 40),
+                "Percentage Capital Commitments Called": percent(rng, 10, 100),
+                "Commentary on Fund Performance": paragraph(rng),
+                "Key Contributors to Performance": paragraph(rng, 2),
+                "Key Detractors from Performance": paragraph(rng, 2),
+                "Portfolio Positioning and Adjustments": paragraph(rng),
+            })
+            objects[("venturecapitalfunds", f"{prefix}/cleaned/{fund_name} {quarter}.txt")] = letter_text(rng, fund_name, quarter, letter_words).encode()
+
+    objects[("venturecapitalfunds", "vc_performance_insights.json")] = json.dumps(performance).encode()
+    return objects
+
+def generate_objects(funds=20, quarters=8, equities_per_fund=200, letter_words=4000, vc_funds=None, seed=7):
+    # Returns {(bucket name, key): bytes} for both buckets
+    rng = random.Random(seed)
+    quarter_list = quarter_labels(quarters)
+    vc_funds = max(1, funds // 2) if vc_funds is None else vc_funds
+
+    objects = hedge_fund_objects(rng, hedge_fund_names(funds, rng), quarter_list, equities_per_fund, letter_words)
+    objects.update(vc_fund_objects(rng, vc_fund_names(vc_funds), quarter_list, equities_per_fund, letter_words))
+    return objects
+
+def add_arguments(parser):
+    parser.add_argument("--funds", type=int, default=20, help="Number of hedge funds")
+    parser.add_argument("--quarters", type=int, default=8, help="Number of quarters per fund")
+    parser.add_argument("--equities-per-fund", type=int, default=200, help="Equities (and VC investments) per fund")
+    parser.add_argument("--letter-words", type=int, default=4000, help="Words per partner letter")
+    parser.add_argument("--vc-funds", type=int, default=None, help="Number of VC funds (default: half the hedge funds)")
+    parser.add_argument("--seed", type=int, default=7)
+
+def dataset_parameters(args):
+    return {
+        "funds": args.funds,
+        "quarters": args.quarters,
+        "equities_per_fund": args.equities_per_fund,
+        "letter_words": args.letter_words,
+        "vc_funds": args.vc_funds,
+        "seed": args.seed,
+    }
+
+def main():
+    # Writes the buckets as directories, e.g. to upload with `aws s3 sync <output>/hedgefunds s3://...`
+    parser = argparse.ArgumentParser(description="Generate the synthetic hedge fund and VC bucket contents")
+    add_arguments(parser)
+    parser.add_argument("--output", required=True, help="Directory to write one sub-directory per bucket into")
+    args = parser.parse_args()
+
+    objects = generate_objects(**dataset_parameters(args))
+    for (bucket_name, key), body in objects.items():
+        path = os.path.join(args.output, bucket_name, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as output_file:
+            output_file.write(body)
+
+    print(f"Wrote {len(objects)} objects ({sum(len(body) for body in objects.values())} bytes) to {args.output}")
+
+if __name__ == '__main__':
+    main()
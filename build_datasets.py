@@ -0,0 +1,50 @@
+import sys
+from testv16_without_API import AWSOperations, fetch_fund_names, format_fund_names, write_columnar_dataset, write_quarter_partitions
+
+# Insight datasets that the Bird's-Eye View sections read by quarter
+INSIGHT_DATASETS = [
+    "hedgefund_general_insights.json",
+    "hedgefund_performance_insights.json",
+    "hedgefund_firm_updates.json",
+    "hedgefund_anomalies.json",
+]
+
+def build_hedge_fund_datasets(aws_operations, bucket_name="hedgefunds"):
+    for file_name in INSIGHT_DATASETS:
+        manifest = write_quarter_partitions(aws_operations, file_name, bucket_name)
+        print(f"{file_name}: wrote {len(manifest['partitions'])} quarter partitions")
+
+        rows = write_columnar_dataset(aws_operations, file_name, bucket_name, sort_by=["Fund Name", "Date"])
+        print(f"{file_name}: wrote {rows} rows as Parquet")
+
+    fund_names = fetch_fund_names(aws_operations, bucket_name, "hedgefund_general_insights.json")
+    for fund_name in format_fund_names(fund_names, "Hedge Funds"):
+        file_name = f"{fund_name}/{fund_name}_equities.json"
+        try:
+            rows = write_columnar_dataset(aws_operations, file_name, bucket_name, sort_by=["Date"])
+            print(f"{file_name}: wrote {rows} rows as Parquet")
+        except Exception as e:
+            print(f"Skipped {file_name}: {str(e)}")
+
+def build_vc_datasets(aws_operations, bucket_name="venturecapitalfunds"):
+    fund_names = fetch_fund_names(aws_operations, bucket_name, "vc_performance_insights.json")
+    for fund_name in fund_names:
+        prefix = fund_name.split(" ")[0].lower()
+        file_name = f"{prefix}/{prefix}_investments.json"
+        try:
+            rows = write_columnar_dataset(aws_operations, file_name, bucket_name, sort_by=["Date"])
+            print(f"{file_name}: wrote {rows} rows as Parquet")
+        except Exception as e:
+            print(f"Skipped {file_name}: {str(e)}")
+
+def main():
+    aws_operations = AWSOperations()
+    targets = sys.argv[1:] or ["hedgefunds", "venturecapitalfunds"]
+
+    if "hedgefunds" in targets:
+        build_hedge_fund_datasets(aws_operations)
+    if "venturecapitalfunds" in targets:
+        build_vc_datasets(aws_operations)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+import logging
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "benchmarks"))
+
+# The app reads its settings at import time; keep its caches and traces out of the working tree
+WORK_DIR = tempfile.mkdtemp(prefix="tests-")
+for name, value in {
+    "LLM_CACHE_PATH": os.path.join(WORK_DIR, "llm_responses.sqlite3"),
+    "COLUMNAR_CACHE_DIR": os.path.join(WORK_DIR, "columnar"),
+    "PDF_CACHE_DIR": os.path.join(WORK_DIR, "pdf"),
+    "TRACE_LOG_PATH": os.path.join(WORK_DIR, "traces.jsonl"),
+    "TRACE_METRICS_PATH": os.path.join(WORK_DIR, "metrics.prom"),
+    "PROFILE_OUTPUT_DIR": os.path.join(WORK_DIR, "profiles"),
+}.items():
+    os.environ[name] = value
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+@pytest.fixture(scope="session")
+def app():
+    import testv16_without_API as app
+
+    # Outside `streamlit run` every widget call logs a missing-context warning
+    for name in list(logging.root.manager.loggerDict):
+        if name.startswith("streamlit"):
+            logging.getLogger(name).setLevel(logging.ERROR)
+    return app
+
+@pytest.fixture
+def fake_anthropic():
+    from fake_anthropic import FakeAnthropic
+
+    fake = FakeAnthropic(first_token_seconds=0, tokens_per_second=0, answer_words=20).start()
+    yield fake
+    fake.stop()
@@ -0,0 +1,34 @@
+import pytest
+
+CHUNK_SIZES = [1, 2, 3, 5, 7, 11, 64, 4096]
+
+def stream(app, text, chunk_size):
+    parser = app.AnswerStreamParser()
+    visible = [parser.feed(text[i:i + chunk_size]) for i in range(0, len(text), chunk_size)]
+    visible.append(parser.flush())
+    return "".join(visible)
+
+@pytest.mark.parametrize("text, expected", [
+    ("<thinking>Compare the letters.</thinking>\n<answer>\nBoth funds are long energy.\n</answer>", "Both funds are long energy."),
+    ("<thinking>a < b, and </thinking> is plain</thinking><answer>a < b</answer>", "a < b"),
+    ("<answer>Cash is 12% of assets.</answer>\n\nSources: the Q4 letter.", "Cash is 12% of assets."),
+    ("<answer>First</answer> then <answer>second</answer>", "First"),
+    ("Preamble <answer>Kept</answer>", "Kept"),
+    ("<thinking>Still planning when the output ran out", ""),
+    ("Intro <thinking>never closed <answer>hidden</answer>", "Intro"),
+    ("<answer>The answer was never closed", "The answer was never closed"),
+    ("No tags at all, <b>bold</b> <answe", "No tags at all, <b>bold</b> <answe"),
+    ("<thinking>plan</thinking>Untagged answer", "Untagged answer"),
+])
+def test_streamed_text_matches_the_extracted_answer(app, text, expected):
+    assert app.extract_answer(text) == expected
+    for chunk_size in CHUNK_SIZES:
+        assert stream(app, text, chunk_size).strip() == expected, chunk_size
+
+def test_answer_streams_before_the_response_ends(app):
+    parser = app.AnswerStreamParser()
+    assert parser.feed("<thinking>plan</think") == ""
+    assert parser.feed("ing>\n<ans") == ""
+    assert parser.feed("wer>Long ") == "Long "
+    assert parser.feed("energy</answer>\ntrailing") == "energy"
+    assert parser.flush() == ""
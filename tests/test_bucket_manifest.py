@@ -0,0 +1,87 @@
+import boto3
+import botocore.exceptions
+import pytest
+
+class FakeS3:
+    # Lists keys, or raises each queued error in turn before listing
+    def __init__(self, keys, errors=()):
+        self.keys = keys
+        self.errors = list(errors)
+        self.list_calls = 0
+
+    def get_paginator(self, operation):
+        return self
+
+    def paginate(self, Bucket):
+        self.list_calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return [{"Contents": [{"Key": key, "Size": 1, "ETag": '"etag"'} for key in self.keys]}]
+
+def client_error(code):
+    return botocore.exceptions.ClientError({"Error": {"Code": code, "Message": code}}, "ListObjectsV2")
+
+@pytest.fixture
+def clock(app, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(app.time, "monotonic", lambda: now[0])
+    return now
+
+def test_manifest_lists_the_bucket(app, clock):
+    store = app.BucketManifestStore(60)
+    s3 = FakeS3(["fund/2024_q1.json"])
+
+    manifest = store.get(s3, "bucket")
+    assert manifest.exists("fund/2024_q1.json")
+    assert store.get(s3, "bucket") is manifest
+    assert s3.list_calls == 1
+
+@pytest.mark.parametrize("error", [client_error("SlowDown"), client_error("InternalError"), botocore.exceptions.ReadTimeoutError(endpoint_url="http://s3")])
+def test_transient_listing_errors_are_retried_after_the_ttl(app, clock, error):
+    store = app.BucketManifestStore(60)
+    s3 = FakeS3(["fund/2024_q1.json"], [error])
+
+    assert store.get(s3, "bucket") is None
+    clock[0] += 30
+    assert store.get(s3, "bucket") is None
+    assert s3.list_calls == 1
+
+    clock[0] += 31
+    assert store.get(s3, "bucket").exists("fund/2024_q1.json")
+    assert s3.list_calls == 2
+
+def test_access_denied_is_permanent(app, clock):
+    store = app.BucketManifestStore(60)
+    s3 = FakeS3(["fund/2024_q1.json"], [client_error("AccessDenied")])
+
+    assert store.get(s3, "bucket") is None
+    clock[0] += 3600
+    assert store.get(s3, "bucket") is None
+    assert s3.list_calls == 1
+
+def test_object_uploaded_after_the_listing_is_fetched(app, monkeypatch):
+    from s3_stand_in import S3StandIn
+
+    stand_in = S3StandIn().start()
+    try:
+        stand_in.put("bucket", "fund/2024_q1.json", b"listed")
+        store = app.BucketManifestStore(300)
+        monkeypatch.setattr(app, "USE_BUCKET_MANIFEST", True)
+        monkeypatch.setattr(app, "get_bucket_manifest_store", lambda: store)
+        s3 = boto3.client("s3", endpoint_url=stand_in.endpoint_url, region_name="us-east-1", aws_access_key_id="test", aws_secret_access_key="test")
+        aws_operations = app.AWSOperations(object_cache=app.ObjectCache(1024 * 1024, 300), s3_client=s3, shared_cache=None)
+
+        assert aws_operations.object_exists("fund/2024_q1.json", "bucket") is True
+        version = aws_operations.dataset_version("bucket")
+        stand_in.put("bucket", "fund/2024_q2.json", b"uploaded later")
+
+        # The listing does not know the new key yet, so it is not reported missing
+        assert aws_operations.object_exists("fund/2024_q2.json", "bucket") is None
+        assert aws_operations.fetch_object_bytes("fund/2024_q2.json", "bucket") == b"uploaded later"
+        assert aws_operations.object_exists("fund/2024_q2.json", "bucket") is True
+        assert aws_operations.dataset_version("bucket") != version
+        with pytest.raises(botocore.exceptions.ClientError):
+            aws_operations.fetch_object_bytes("fund/missing.json", "bucket")
+        assert stand_in.stats()["requests"]["ListObjectsV2"] == 1
+    finally:
+        stand_in.stop()
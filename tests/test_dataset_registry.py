@@ -0,0 +1,49 @@
+import pandas as pd
+
+def frame(rows):
+    return pd.DataFrame({"Fund Name": ["Fund"] * rows, "Value": range(rows)})
+
+def test_frames_are_reused_for_the_same_version(app):
+    registry = app.DatasetRegistry(10 * 1024 * 1024)
+    reads = []
+
+    def read():
+        reads.append(1)
+        return frame(10)
+
+    first = registry.get_frame(("bucket", "data.json"), "etag-1", read)
+    assert registry.get_frame(("bucket", "data.json"), "etag-1", read) is first
+    assert len(reads) == 1
+
+    # A new object version, or no version at all, is read again
+    registry.get_frame(("bucket", "data.json"), "etag-2", read)
+    registry.get_frame(("bucket", "data.json"), None, read)
+    assert len(reads) == 3
+
+def test_least_recently_used_frames_are_evicted(app):
+    size = app.frame_size(frame(1000))
+    registry = app.DatasetRegistry(int(size * 2.5))
+
+    for name in ("a", "b"):
+        registry.get_frame((name,), "etag", lambda: frame(1000))
+    # Touch "a" so "b" is the least recently used
+    registry.get_frame(("a",), "etag", lambda: frame(1000))
+    registry.get_frame(("c",), "etag", lambda: frame(1000))
+
+    assert [key for key in registry.datasets] == [("a",), ("c",)]
+    stats = registry.stats()
+    assert stats["bytes"] <= stats["max_bytes"]
+    assert stats["evictions"] == 1
+
+def test_frames_larger_than_the_cache_are_not_stored(app):
+    registry = app.DatasetRegistry(100)
+
+    assert len(registry.get_frame(("big",), "etag", lambda: frame(1000))) == 1000
+    assert registry.stats()["entries"] == 0
+
+def test_equal_filters_share_a_key(app):
+    assert app.freeze_filters([("Fund Name", "==", "Fund")]) == app.freeze_filters((("Fund Name", "==", "Fund"),))
+    assert app.freeze_filters([("Quarter", "in", ["2024 Q1", "2024 Q2"])]) == (("Quarter", "in", ("2024 Q1", "2024 Q2")),)
+    assert app.freeze_filters([("Quarter", "in", {"2024 Q2", "2024 Q1"})]) == app.freeze_filters([("Quarter", "in", {"2024 Q1", "2024 Q2"})])
+    hash(app.freeze_filters([[("Fund Name", "==", "Fund")], [("Value", ">", 1)]]))
+    assert app.freeze_filters(None) is None
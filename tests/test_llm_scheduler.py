@@ -0,0 +1,148 @@
+import threading
+import time
+
+import anthropic
+import pytest
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def make_scheduler(app, max_concurrent=8, max_retries=4):
+    # Budgets large enough that only the test's own limits apply
+    return app.LLMScheduler(6000, 10 ** 7, max_concurrent, max_retries, 0.01, 0.05)
+
+def create_call(client):
+    def call():
+        message = client.messages.create(model="fake", max_tokens=10, messages=[{"role": "user", "content": "hello"}])
+        return message.content[0].text, message.usage.input_tokens + message.usage.output_tokens
+    return call
+
+@pytest.fixture
+def client(fake_anthropic):
+    return anthropic.Anthropic(api_key="test", base_url=fake_anthropic.base_url, max_retries=0)
+
+def test_token_bucket_refills_over_time(app, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(app.time, "monotonic", clock)
+    bucket = app.TokenBucket(10, 5)
+
+    bucket.take(10)
+    assert bucket.wait_time(5) == pytest.approx(1.0)
+
+    clock.now += 0.4
+    assert bucket.wait_time(5) == pytest.approx(0.6)
+
+    clock.now += 10
+    # Never above capacity, and requests larger than the bucket only wait for a full bucket
+    assert bucket.wait_time(50) == 0.0
+    assert bucket.tokens == 10
+
+def test_token_bucket_gives_back_unused_tokens(app, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(app.time, "monotonic", clock)
+    bucket = app.TokenBucket(100, 1)
+
+    bucket.take(80)
+    bucket.give_back(50)
+    assert bucket.tokens == 70
+    bucket.give_back(500)
+    assert bucket.tokens == 100
+
+def test_waiting_calls_are_served_by_priority_then_arrival(app):
+    scheduler = make_scheduler(app, max_concurrent=1)
+    scheduler.acquire(app.LLM_PRIORITY_INTERACTIVE, 1)
+    order = []
+
+    def queue(priority, name):
+        scheduler.acquire(priority, 1)
+        order.append(name)
+        scheduler.release(1, 1)
+
+    threads = []
+    for priority, name in [(app.LLM_PRIORITY_BULK, "bulk 1"), (app.LLM_PRIORITY_BULK, "bulk 2"), (app.LLM_PRIORITY_INTERACTIVE, "interactive")]:
+        thread = threading.Thread(target=queue, args=(priority, name))
+        thread.start()
+        threads.append(thread)
+        # Arrival order within a priority is the order the threads queue in
+        while scheduler.stats()["queue_depth"] < len(threads):
+            time.sleep(0.005)
+
+    scheduler.release(1, 1)
+    for thread in threads:
+        thread.join(5)
+
+    assert order == ["interactive", "bulk 1", "bulk 2"]
+    assert scheduler.stats()["max_queue_depth"] == 3
+    assert scheduler.stats()["active"] == 0
+
+def test_request_budget_delays_calls(app):
+    # 120 requests per minute: a burst of 20, then one every half second
+    scheduler = app.LLMScheduler(120, 10 ** 7, 8, 0, 0.01, 0.05)
+    for _ in range(20):
+        scheduler.acquire(app.LLM_PRIORITY_INTERACTIVE, 1)
+        scheduler.release(1, 1)
+
+    started_at = time.monotonic()
+    scheduler.acquire(app.LLM_PRIORITY_INTERACTIVE, 1)
+    scheduler.release(1, 1)
+    assert time.monotonic() - started_at >= 0.4
+
+def test_rate_limited_call_waits_for_retry_after(app, client, fake_anthropic):
+    # Every other request is rejected, starting with the first
+    fake_anthropic.rate_limit_every = 2
+    fake_anthropic.retry_after_seconds = 0.3
+    fake_anthropic.counts["requests"] = 1
+    scheduler = make_scheduler(app)
+    call = create_call(client)
+
+    started_at = time.monotonic()
+    text = scheduler.run(call, 100)
+    elapsed = time.monotonic() - started_at
+
+    assert "<answer>" in text
+    assert elapsed >= 0.3
+    assert fake_anthropic.stats()["requests"] == {"requests": 3, "rate_limited": 1, "completed": 1}
+    stats = scheduler.stats()
+    assert (stats["retries"], stats["rate_limited"], stats["failures"]) == (1, 1, 0)
+
+def test_rate_limited_call_fails_after_max_retries(app, client, fake_anthropic):
+    fake_anthropic.rate_limit_every = 1
+    fake_anthropic.retry_after_seconds = 0.01
+    scheduler = make_scheduler(app, max_retries=2)
+
+    with pytest.raises(anthropic.RateLimitError):
+        scheduler.run(create_call(client), 100)
+
+    assert fake_anthropic.stats()["requests"] == {"requests": 3, "rate_limited": 3}
+    stats = scheduler.stats()
+    assert (stats["retries"], stats["rate_limited"], stats["failures"], stats["active"]) == (2, 3, 1, 0)
+
+def test_complete_retries_rate_limits_and_caches_the_answer(app, fake_anthropic, monkeypatch):
+    # Every other request is rate limited, so the first call needs one retry
+    fake_anthropic.rate_limit_every = 2
+    fake_anthropic.retry_after_seconds = 0.05
+    fake_anthropic.counts["requests"] = 1
+    monkeypatch.setattr(app, "ANTHROPIC_BASE_URL", fake_anthropic.base_url)
+    generator = app.AIResponseGenerator(f"key-{fake_anthropic.base_url}", stream=False)
+
+    answer = generator.complete("system", "user text", [("Fund 2024 Q1", "hash")])
+    assert "<answer>" in answer
+    requests = fake_anthropic.stats()["requests"]
+    assert (requests["requests"], requests["rate_limited"], requests["completed"]) == (3, 1, 1)
+
+    # The same request is answered from the response cache
+    assert generator.complete("system", "user text", [("Fund 2024 Q1", "hash")]) == answer
+    assert fake_anthropic.stats()["requests"]["requests"] == 3
+
+def test_streamed_answer_is_sent_with_its_sampling_settings(app, fake_anthropic, monkeypatch):
+    monkeypatch.setattr(app, "ANTHROPIC_BASE_URL", fake_anthropic.base_url)
+    generator = app.AIResponseGenerator(f"stream-{fake_anthropic.base_url}", stream=True)
+    chunks = []
+
+    answer = generator.complete("system", "streamed text", on_text=chunks.append)
+    assert "".join(chunks) == answer
+    assert fake_anthropic.stats()["requests"] == {"requests": 1, "streamed": 1}
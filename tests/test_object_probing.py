@@ -0,0 +1,47 @@
+import gzip
+import time
+
+import boto3
+import botocore.exceptions
+import pytest
+
+LATENCY_SECONDS = 0.3
+
+@pytest.fixture
+def s3_stand_in():
+    from s3_stand_in import LatencyModel, S3StandIn
+
+    stand_in = S3StandIn(LatencyModel(base_seconds=LATENCY_SECONDS)).start()
+    stand_in.put("bucket", "placeholder", b"")
+    yield stand_in
+    stand_in.stop()
+
+@pytest.fixture
+def aws_operations(app, s3_stand_in, monkeypatch):
+    # Without a bucket listing, so keys are resolved by probing
+    monkeypatch.setattr(app, "USE_BUCKET_MANIFEST", False)
+    s3 = boto3.client("s3", endpoint_url=s3_stand_in.endpoint_url, region_name="us-east-1", aws_access_key_id="test", aws_secret_access_key="test")
+    return app.AWSOperations(object_cache=app.ObjectCache(64 * 1024 * 1024, 300), s3_client=s3)
+
+def test_plain_object_costs_one_request(aws_operations, s3_stand_in):
+    s3_stand_in.put("bucket", "fund/letter.json", b"plain")
+
+    assert aws_operations.fetch_object_bytes("fund/letter.json", "bucket") == b"plain"
+    assert s3_stand_in.stats()["requests"] == {"GetObject": 1}
+
+def test_compressed_copy_is_found(aws_operations, s3_stand_in):
+    s3_stand_in.put("bucket", "fund/letter.json.gz", gzip.compress(b"compressed"))
+
+    assert aws_operations.fetch_object_bytes("fund/letter.json", "bucket") == b"compressed"
+    assert s3_stand_in.stats()["requests"]["GetObject"] == 1
+
+def test_missing_object_probes_compressed_copies_concurrently(app, aws_operations, s3_stand_in):
+    started_at = time.monotonic()
+    with pytest.raises(botocore.exceptions.ClientError) as raised:
+        aws_operations.fetch_object_bytes("fund/missing.json", "bucket")
+    elapsed = time.monotonic() - started_at
+
+    assert raised.value.response["Error"]["Code"] == "NoSuchKey"
+    assert s3_stand_in.stats()["requests"] == {"NoSuchKey": len(app.stored_object_names("fund/missing.json"))}
+    # The plain key, then every compressed name at once: two round trips rather than three
+    assert elapsed < 2.5 * LATENCY_SECONDS
@@ -0,0 +1,49 @@
+import pytest
+
+FILLER = "The fund returned a modest gain over the quarter while markets were volatile."
+LETTER = "\n\n".join([
+    FILLER * 3,
+    "Our largest new position is Vistra, an independent power producer benefiting from data center demand.",
+    FILLER * 3,
+    "We exited Meta after the stock rerated and trimmed our remaining technology exposure.",
+    FILLER * 3,
+])
+
+@pytest.fixture
+def index(app):
+    return app.PassageIndex(LETTER, passage_words=20, overlap_words=5)
+
+def best_match(index, query):
+    return max(index.search(query, top_k=3), key=lambda match: match[3])
+
+def test_passage_with_the_query_terms_ranks_first(index):
+    _, start, end, score = best_match(index, "Why did the fund buy Vistra power?")
+    assert "Vistra" in LETTER[start:end]
+    assert score > 0
+
+    _, start, end, _ = best_match(index, "meta exited")
+    assert "exited Meta" in LETTER[start:end]
+
+def test_offsets_slice_back_to_the_passage_text(index):
+    matches = index.search("data center demand technology", top_k=3)
+    assert [match[0] for match in matches] == sorted(match[0] for match in matches)
+    excerpt = index.build_excerpt("data center demand technology", top_k=3)
+    for passage_id, start, end, _ in matches:
+        assert (start, end) == index.passages[passage_id]
+        assert LETTER[start:end] in excerpt
+        assert f'<passage id="{passage_id}" start="{start}" end="{end}">\n{LETTER[start:end]}\n</passage>' in excerpt
+        # Passages start and end on word boundaries
+        assert not LETTER[start].isspace() and not LETTER[end - 1].isspace()
+        assert start == 0 or LETTER[start - 1].isspace()
+
+@pytest.mark.parametrize("query", ["", "   ", "?!", "zeppelin xylophone"])
+def test_unmatched_query_falls_back_to_the_start_of_the_letter(index, query):
+    matches = index.search(query, top_k=2)
+    assert [match[0] for match in matches] == [0, 1]
+    assert all(score == 0 for _, _, _, score in matches)
+    assert matches[0][1] == 0
+
+def test_empty_letter_has_no_passages(app):
+    index = app.PassageIndex("")
+    assert index.search("Vistra") == []
+    assert index.build_excerpt("Vistra") == ""
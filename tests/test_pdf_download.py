@@ -0,0 +1,51 @@
+import boto3
+import pytest
+
+@pytest.fixture
+def s3_stand_in():
+    from s3_stand_in import S3StandIn
+
+    stand_in = S3StandIn().start()
+    stand_in.put("hedgefunds", "placeholder", b"")
+    yield stand_in
+    stand_in.stop()
+
+@pytest.fixture
+def section(app, s3_stand_in, monkeypatch):
+    # Without a bucket listing, so existence has to be checked with S3
+    monkeypatch.setattr(app, "USE_BUCKET_MANIFEST", False)
+    s3 = boto3.client("s3", endpoint_url=s3_stand_in.endpoint_url, region_name="us-east-1", aws_access_key_id="test", aws_secret_access_key="test")
+    aws_operations = app.AWSOperations(object_cache=app.ObjectCache(1024 * 1024, 300), s3_client=s3, shared_cache=None)
+    return app.SpecificFundsSection(aws_operations, None, None)
+
+def test_mirror_remembers_head_results(app, s3_stand_in, section, tmp_path):
+    mirror = app.LocalObjectMirror(str(tmp_path), 300)
+    s3_stand_in.put("hedgefunds", "fund/present.pdf", b"%PDF")
+
+    assert mirror.exists(section.aws_operations.s3, "fund/present.pdf", "hedgefunds") is True
+    assert mirror.exists(section.aws_operations.s3, "fund/missing.pdf", "hedgefunds") is False
+    assert mirror.exists(section.aws_operations.s3, "fund/present.pdf", "hedgefunds") is True
+    assert mirror.exists(section.aws_operations.s3, "fund/missing.pdf", "hedgefunds") is False
+    # A missing object is not fetched either
+    assert mirror.fetch(section.aws_operations.s3, "fund/missing.pdf", "hedgefunds") == (None, None)
+    assert s3_stand_in.stats()["requests"] == {"HeadObject": 1, "NoSuchKey": 1}
+
+def test_presigned_link_only_for_existing_pdf(s3_stand_in, section):
+    s3_stand_in.put("hedgefunds", "Present Fund/Present Fund 2024 Q1 Summary.pdf", b"%PDF")
+
+    assert "Present%20Fund%202024%20Q1%20Summary.pdf" in section.fetch_pdf_url("Present Fund", "2024 Q1")
+    assert section.fetch_pdf_url("Missing Fund", "2024 Q1") is None
+
+def test_disk_download_reads_the_pdf_only_when_clicked(app, s3_stand_in, section, monkeypatch):
+    s3_stand_in.put("hedgefunds", "Disk Fund/Disk Fund 2024 Q1 Summary.pdf", b"%PDF-disk")
+    monkeypatch.setattr(app, "PDF_DOWNLOAD_MODE", "disk")
+    buttons = []
+    monkeypatch.setattr(app.st, "download_button", lambda **kwargs: buttons.append(kwargs))
+
+    section.display_pdf_download("Disk Fund", "2024 Q1")
+    section.display_pdf_download("Disk Fund", "2024 Q1")
+
+    assert len(buttons) == 2
+    assert "GetObject" not in s3_stand_in.stats()["requests"]
+    assert buttons[0]["data"]() == b"%PDF-disk"
+    assert s3_stand_in.stats()["requests"]["GetObject"] == 1
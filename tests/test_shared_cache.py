@@ -0,0 +1,144 @@
+import os
+import threading
+import time
+
+import pytest
+
+class InMemoryRedisCache:
+    # Stands in for the Redis server: answers the commands RedisSharedCache sends, with PX expiry
+    def __init__(self, app):
+        self.app = app
+        self.values = {}
+        self.expiries = {}
+        self.lock = threading.Lock()
+
+    def live(self, key):
+        expires_at = self.expiries.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self.values.pop(key, None)
+            self.expiries.pop(key, None)
+        return self.values.get(key)
+
+    def execute(self, command, *arguments):
+        arguments = [argument if isinstance(argument, bytes) else str(argument).encode() for argument in arguments]
+        with self.lock:
+            if command == b"GET":
+                return self.live(arguments[0])
+            if command == b"SET":
+                key, value, options = arguments[0], arguments[1], arguments[2:]
+                if b"NX" in options and self.live(key) is not None:
+                    return None
+                self.values[key] = value
+                self.expiries.pop(key, None)
+                if b"PX" in options:
+                    self.expiries[key] = time.monotonic() + int(options[options.index(b"PX") + 1]) / 1000
+                return b"OK"
+            if command == b"EVAL":
+                script, _, key, token = arguments[:4]
+                if self.live(key) != token:
+                    return 0
+                if script == self.app.REDIS_RELEASE_LOCK_SCRIPT.encode():
+                    del self.values[key]
+                    self.expiries.pop(key, None)
+                else:
+                    self.expiries[key] = time.monotonic() + int(arguments[4]) / 1000
+                return 1
+        raise AssertionError(f"Unexpected command {command!r}")
+
+@pytest.fixture(params=["file", "redis"])
+def make_cache(request, app, tmp_path):
+    def make(fill_timeout_seconds=5, lock_ttl_seconds=5):
+        if request.param == "file":
+            cache = app.FileSharedCache(str(tmp_path), 1 << 20, fill_timeout_seconds, lock_ttl_seconds)
+        else:
+            cache = app.RedisSharedCache("redis://localhost:6379", fill_timeout_seconds, lock_ttl_seconds)
+            cache.execute = InMemoryRedisCache(app).execute
+        cache.poll_seconds = 0.01
+        return cache
+    return make
+
+def fill_concurrently(caches, produce, count=8):
+    results = []
+    lock = threading.Lock()
+
+    def fill(cache):
+        value = cache.fill("key", produce)
+        with lock:
+            results.append(value)
+
+    threads = [threading.Thread(target=fill, args=(caches[i % len(caches)],)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    return results
+
+def test_concurrent_fills_produce_once(make_cache):
+    cache = make_cache()
+    calls = []
+
+    def produce():
+        calls.append(1)
+        time.sleep(0.2)
+        return b"value"
+
+    results = fill_concurrently([cache], produce)
+
+    assert results == [b"value"] * 8
+    assert len(calls) == 1
+    assert cache.stats()["fills"] == 1
+    assert cache.stats()["coalesced_waits"] == 7
+
+def test_slow_producer_keeps_the_lock_past_its_ttl(make_cache):
+    # The lock is renewed while produce() runs, so waiters keep waiting instead of producing too
+    cache = make_cache(fill_timeout_seconds=5, lock_ttl_seconds=0.15)
+    calls = []
+
+    def produce():
+        calls.append(1)
+        time.sleep(0.6)
+        return b"value"
+
+    results = fill_concurrently([cache], produce, count=4)
+
+    assert results == [b"value"] * 4
+    assert len(calls) == 1
+
+def test_expired_lock_is_taken_over_and_kept_from_the_old_holder(make_cache):
+    # A holder that stopped renewing loses the lock; its late release leaves the new owner's lock alone
+    cache = make_cache(lock_ttl_seconds=0.1)
+    assert cache.acquire_fill_lock("key", "crashed", 0.1)
+    time.sleep(0.25)
+
+    acquired = False
+    for _ in range(10):
+        acquired = cache.acquire_fill_lock("key", "new-owner", 0.1)
+        if acquired:
+            break
+    assert acquired
+
+    cache.release_fill_lock("key", "crashed")
+    assert not cache.acquire_fill_lock("key", "someone-else", 0.1)
+    assert not cache.refresh_fill_lock("key", "crashed", 5)
+    assert cache.refresh_fill_lock("key", "new-owner", 5)
+
+    cache.release_fill_lock("key", "new-owner")
+    assert cache.acquire_fill_lock("key", "someone-else", 5)
+
+def test_waiters_produce_their_own_copy_after_the_fill_timeout(make_cache):
+    cache = make_cache(fill_timeout_seconds=0.2)
+    assert cache.acquire_fill_lock("key", "stuck", 5)
+
+    start = time.monotonic()
+    assert cache.fill("key", lambda: b"value") == b"value"
+    assert 0.2 <= time.monotonic() - start < 2
+    assert cache.get("key") is None
+
+def test_file_lock_holds_its_owner_token(app, tmp_path):
+    cache = app.FileSharedCache(str(tmp_path), 1 << 20, 5, 5)
+    assert cache.acquire_fill_lock("key", "owner", 5)
+    lock_path = cache.path("key") + ".lock"
+    assert cache.read_lock_owner(lock_path) == "owner"
+
+    cache.release_fill_lock("key", "owner")
+    assert not os.path.exists(lock_path)
@@ -0,0 +1,128 @@
+import threading
+
+import pytest
+from streamlit.runtime.scriptrunner_utils.exceptions import StopException
+
+def start_waiters(single_flight, key, function, count):
+    # Threads that join a call already in flight; their results (or exceptions) land in outcomes
+    outcomes = []
+    lock = threading.Lock()
+
+    def wait():
+        try:
+            value = single_flight.do(key, function, timeout_seconds=5)
+            outcome = ("value", value)
+        except Exception as e:
+            outcome = ("error", e)
+        with lock:
+            outcomes.append(outcome)
+
+    threads = [threading.Thread(target=wait) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, outcomes
+
+def wait_for_waiters(single_flight, count):
+    # Until count callers have joined the call in flight
+    for _ in range(500):
+        if single_flight.stats()["shared"] >= count:
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError("Waiters did not join the call in flight")
+
+def run_with_waiters(single_flight, leader_function, waiter_function, count=3):
+    # The leader blocks until every waiter has joined, then finishes with leader_function
+    release = threading.Event()
+
+    def leader():
+        release.wait(5)
+        return leader_function()
+
+    leader_outcome = []
+
+    def lead():
+        try:
+            leader_outcome.append(("value", single_flight.do("key", leader)))
+        except BaseException as e:
+            leader_outcome.append(("error", e))
+
+    leader_thread = threading.Thread(target=lead)
+    leader_thread.start()
+    for _ in range(500):
+        if single_flight.stats()["in_flight"]:
+            break
+        threading.Event().wait(0.01)
+
+    threads, outcomes = start_waiters(single_flight, "key", waiter_function, count)
+    wait_for_waiters(single_flight, count)
+    release.set()
+    for thread in [leader_thread] + threads:
+        thread.join(5)
+    return leader_outcome[0], outcomes
+
+def test_waiters_share_the_leaders_result(app):
+    single_flight = app.SingleFlight()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return "value"
+
+    leader, waiters = run_with_waiters(single_flight, compute, compute)
+
+    assert leader == ("value", "value")
+    assert waiters == [("value", "value")] * 3
+    assert len(calls) == 1
+    assert single_flight.stats()["executions"] == 1
+    assert single_flight.stats()["in_flight"] == 0
+
+def test_waiters_reraise_the_leaders_exception(app):
+    single_flight = app.SingleFlight()
+
+    def fail():
+        raise ValueError("S3 read failed")
+
+    leader, waiters = run_with_waiters(single_flight, fail, lambda: "unused")
+
+    assert leader[0] == "error" and isinstance(leader[1], ValueError)
+    assert len(waiters) == 3
+    assert all(kind == "error" and isinstance(error, ValueError) for kind, error in waiters)
+    assert single_flight.stats()["in_flight"] == 0
+
+def test_waiters_retry_when_the_leader_is_interrupted(app):
+    single_flight = app.SingleFlight()
+    calls = []
+
+    def stopped():
+        raise StopException()
+
+    def compute():
+        calls.append(1)
+        return "value"
+
+    leader, waiters = run_with_waiters(single_flight, stopped, compute)
+
+    # The interruption reaches only the leader; the waiters take over instead of returning None
+    assert leader[0] == "error" and isinstance(leader[1], StopException)
+    assert waiters == [("value", "value")] * 3
+    assert 1 <= len(calls) <= 3
+    stats = single_flight.stats()
+    assert stats["executions"] == 1 + len(calls)
+    assert stats["retries"] >= 3
+    assert stats["in_flight"] == 0
+
+def test_waiter_times_out(app):
+    single_flight = app.SingleFlight()
+    release = threading.Event()
+    leader = threading.Thread(target=single_flight.do, args=("key", lambda: release.wait(5)))
+    leader.start()
+    for _ in range(500):
+        if single_flight.stats()["in_flight"]:
+            break
+        threading.Event().wait(0.01)
+
+    with pytest.raises(TimeoutError):
+        single_flight.do("key", lambda: "unused", timeout_seconds=0.05)
+    release.set()
+    leader.join(5)
+    assert single_flight.stats()["timeouts"] == 1
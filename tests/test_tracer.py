@@ -0,0 +1,33 @@
+import json
+import os
+
+def run_traces(tracer, count):
+    for number in range(count):
+        with tracer.span("rerun", number=number):
+            pass
+
+def read_numbers(path):
+    with open(path) as log_file:
+        return [json.loads(line)["attributes"]["number"] for line in log_file]
+
+def test_trace_log_is_rotated_by_size(app, tmp_path):
+    log_path = str(tmp_path / "traces.jsonl")
+    tracer = app.Tracer(True, log_path, "", 10, log_max_bytes=600, log_backup_count=2)
+
+    run_traces(tracer, 10)
+
+    assert sorted(os.listdir(tmp_path)) == ["traces.jsonl", "traces.jsonl.1", "traces.jsonl.2"]
+    for path in (log_path, log_path + ".1", log_path + ".2"):
+        assert os.path.getsize(path) <= 600
+    # The newest traces are in the log itself, older ones in numbered backups
+    assert read_numbers(log_path)[-1] == 9
+    assert read_numbers(log_path + ".2")[-1] < read_numbers(log_path + ".1")[0]
+
+def test_trace_log_without_backups_starts_over(app, tmp_path):
+    log_path = str(tmp_path / "traces.jsonl")
+    tracer = app.Tracer(True, log_path, "", 10, log_max_bytes=300, log_backup_count=0)
+
+    run_traces(tracer, 20)
+
+    assert os.listdir(tmp_path) == ["traces.jsonl"]
+    assert os.path.getsize(log_path) <= 300
@@ -5,13 +5,49 @@ from streamlit_echarts import st_echarts
 import pandas as pd
 import boto3
 import botocore
+import botocore.config
 import os
 import anthropic
+import weakref
 from datetime import datetime, timedelta
 import json
 import numpy as np
 import re
 import json
+import threading
+import time
+import hashlib
+import sqlite3
+import functools
+import contextlib
+import contextvars
+import uuid
+import heapq
+import itertools
+import random
+import gzip
+import zlib
+import socket
+import struct
+import urllib.parse
+import sys
+from collections import OrderedDict, Counter, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from types import MappingProxyType
+
+# Columnar datasets are optional; without pyarrow every reader falls back to JSON
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# zstd-compressed objects are optional as well; gzip works with the standard library
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 # Set AWS credentials and region
 os.environ["AWS_ACCESS_KEY_ID"] = "API"
@@ -28,103 +64,3001 @@ NEWSAPI_KEY = "API"
 CLAUDE_HAIKU = "claude-3-haiku-20240307"
 CLAUDE_SONNET = "claude-3-sonnet-20240229"
 
-class AWSOperations:
+# Object cache settings (shared by every session in this process)
+OBJECT_CACHE_MAX_BYTES = int(os.getenv("OBJECT_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+OBJECT_CACHE_TTL_SECONDS = float(os.getenv("OBJECT_CACHE_TTL_SECONDS", 300))
+# Parsed datasets and DataFrame views built from the cached objects
+DATASET_CACHE_MAX_BYTES = int(os.getenv("DATASET_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+S3_FETCH_MAX_WORKERS = int(os.getenv("S3_FETCH_MAX_WORKERS", 8))
+
+# Render LLM answers token by token as they arrive
+LLM_STREAMING = os.getenv("LLM_STREAMING", "1") == "1"
+
+# Persistent LLM response cache
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(".cache", "llm_responses.sqlite3"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+
+# Letter sets above this size are analyzed with map-reduce instead of one large prompt
+LLM_CONTEXT_TOKEN_BUDGET = int(os.getenv("LLM_CONTEXT_TOKEN_BUDGET", 150000))
+LLM_MAP_BATCH_TOKENS = int(os.getenv("LLM_MAP_BATCH_TOKENS", 50000))
+LLM_MAP_CONCURRENCY = int(os.getenv("LLM_MAP_CONCURRENCY", 4))
+
+# Process-wide LLM scheduler: rate limits, concurrency, retries. ANTHROPIC_BASE_URL can point at a local fake API.
+ANTHROPIC_BASE_URL = os.getenv("ANTHROPIC_BASE_URL") or None
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", 50))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", 100000))
+LLM_MAX_CONCURRENT_REQUESTS = int(os.getenv("LLM_MAX_CONCURRENT_REQUESTS", 8))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 4))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", 1.0))
+LLM_RETRY_MAX_SECONDS = float(os.getenv("LLM_RETRY_MAX_SECONDS", 30.0))
+
+# Long analyses run as background jobs so reruns do not throw them away
+JOB_MAX_WORKERS = int(os.getenv("JOB_MAX_WORKERS", 4))
+JOB_RESULT_TTL_SECONDS = float(os.getenv("JOB_RESULT_TTL_SECONDS", 3600))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", 1.0))
+
+# Scheduler priorities: lower runs first
+LLM_PRIORITY_INTERACTIVE = 0
+LLM_PRIORITY_BULK = 1
+
+# Ask Anything sends only the most relevant passages of a letter
+ASK_ANYTHING_TOP_K = int(os.getenv("ASK_ANYTHING_TOP_K", 8))
+PASSAGE_WORDS = int(os.getenv("PASSAGE_WORDS", 200))
+PASSAGE_OVERLAP_WORDS = int(os.getenv("PASSAGE_OVERLAP_WORDS", 50))
+
+# Local copies of Parquet datasets, memory-mapped when read
+COLUMNAR_CACHE_DIR = os.getenv("COLUMNAR_CACHE_DIR", os.path.join(".cache", "columnar"))
+COLUMNAR_CACHE_MAX_BYTES = int(os.getenv("COLUMNAR_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+
+# Second-level cache shared by all server processes: "" (off), "disk", "shm" or "redis"
+SHARED_CACHE_BACKEND = os.getenv("SHARED_CACHE_BACKEND", "")
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", "")
+SHARED_CACHE_URL = os.getenv("SHARED_CACHE_URL", "redis://localhost:6379/0")
+SHARED_CACHE_MAX_BYTES = int(os.getenv("SHARED_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+SHARED_CACHE_OBJECT_TTL_SECONDS = float(os.getenv("SHARED_CACHE_OBJECT_TTL_SECONDS", 24 * 3600))
+SHARED_CACHE_LLM_TTL_SECONDS = float(os.getenv("SHARED_CACHE_LLM_TTL_SECONDS", 7 * 24 * 3600))
+SHARED_CACHE_FILL_TIMEOUT_SECONDS = float(os.getenv("SHARED_CACHE_FILL_TIMEOUT_SECONDS", 60))
+# The fill lock is renewed every third of its TTL while the value is produced, so it only expires
+# (and another process takes over) when the holder is gone; waiters give up after the fill timeout
+SHARED_CACHE_LOCK_TTL_SECONDS = float(os.getenv("SHARED_CACHE_LOCK_TTL_SECONDS", 15))
+
+# How long a request waits for an identical in-flight S3 fetch or LLM call before giving up
+SINGLE_FLIGHT_S3_TIMEOUT_SECONDS = float(os.getenv("SINGLE_FLIGHT_S3_TIMEOUT_SECONDS", 60))
+SINGLE_FLIGHT_LLM_TIMEOUT_SECONDS = float(os.getenv("SINGLE_FLIGHT_LLM_TIMEOUT_SECONDS", 300))
+
+# Summary PDFs are downloaded straight from S3 through a short-lived presigned URL ("presigned"),
+# or served from a size-bounded local disk copy ("disk") when presigned URLs cannot be used
+PDF_DOWNLOAD_MODE = os.getenv("PDF_DOWNLOAD_MODE", "presigned")
+PDF_PRESIGNED_URL_SECONDS = int(os.getenv("PDF_PRESIGNED_URL_SECONDS", 300))
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", os.path.join(".cache", "pdf"))
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+
+# New JSON datasets are stored compressed ("gzip", "zstd" or "" for plain objects)
+S3_UPLOAD_COMPRESSION = os.getenv("S3_UPLOAD_COMPRESSION", "gzip")
+
+# Bucket listings used to resolve keys locally; refreshed in the background once stale
+USE_BUCKET_MANIFEST = os.getenv("USE_BUCKET_MANIFEST", "1") == "1"
+BUCKET_MANIFEST_TTL_SECONDS = float(os.getenv("BUCKET_MANIFEST_TTL_SECONDS", 300))
+
+# Quarters offered by the date sliders when no partition manifest is available
+DEFAULT_QUARTER_RANGE = ("2022 Q3", "2024 Q1")
+
+# Timing spans per rerun: shown in the sidebar panel, appended to a JSON-lines log and exported as a
+# Prometheus textfile (for the node_exporter textfile collector); empty paths disable an export
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "1") == "1"
+TRACE_PANEL = os.getenv("TRACE_PANEL", "0") == "1"
+TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH", os.path.join(".cache", "traces.jsonl"))
+# The log is rotated like logging's RotatingFileHandler: traces.jsonl.1 ... traces.jsonl.<backup count>
+TRACE_LOG_MAX_BYTES = int(os.getenv("TRACE_LOG_MAX_BYTES", 50 * 1024 * 1024))
+TRACE_LOG_BACKUP_COUNT = int(os.getenv("TRACE_LOG_BACKUP_COUNT", 3))
+TRACE_METRICS_PATH = os.getenv("TRACE_METRICS_PATH", os.path.join(".cache", "metrics.prom"))
+TRACE_METRICS_INTERVAL_SECONDS = float(os.getenv("TRACE_METRICS_INTERVAL_SECONDS", 10))
+
+# Section stages (equities frames, top sectors, Deep Dive lookups) keep their last result in the session and
+# are only recomputed when their inputs or the bucket they read change. With RERUN_MEMO_ENABLED=0 a result
+# is only reused within the rerun that computed it.
+RERUN_MEMO_ENABLED = os.getenv("RERUN_MEMO_ENABLED", "1") == "1"
+
+# Admin-only sampling profiler for single reruns: add ?profile=<PROFILER_ADMIN_TOKEN> to the URL,
+# or set PROFILE_RERUNS=1 to profile every rerun. Nothing is sampled unless one of them is set.
+PROFILER_ADMIN_TOKEN = os.getenv("PROFILER_ADMIN_TOKEN", "")
+PROFILE_RERUNS = os.getenv("PROFILE_RERUNS", "0") == "1"
+PROFILE_INTERVAL_SECONDS = float(os.getenv("PROFILE_INTERVAL_SECONDS", 0.005))
+PROFILE_OUTPUT_DIR = os.getenv("PROFILE_OUTPUT_DIR", os.path.join(".cache", "profiles"))
+
+# Long-lived client connection pools, sized for our fetch and LLM concurrency
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None
+S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", 32))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 16))
+LLM_KEEPALIVE_SECONDS = float(os.getenv("LLM_KEEPALIVE_SECONDS", 120))
+
+# S3 read timeouts and retries; the deadline bounds a whole object read including retries and hedges
+S3_CONNECT_TIMEOUT_SECONDS = float(os.getenv("S3_CONNECT_TIMEOUT_SECONDS", 3))
+S3_READ_TIMEOUT_SECONDS = float(os.getenv("S3_READ_TIMEOUT_SECONDS", 10))
+S3_MAX_ATTEMPTS = int(os.getenv("S3_MAX_ATTEMPTS", 3))
+S3_REQUEST_DEADLINE_SECONDS = float(os.getenv("S3_REQUEST_DEADLINE_SECONDS", 20))
+
+# Hedged reads: a duplicate GET is sent once a read runs longer than the prefix's p95 latency
+S3_HEDGED_READS = os.getenv("S3_HEDGED_READS", "0") == "1"
+S3_HEDGE_PERCENTILE = float(os.getenv("S3_HEDGE_PERCENTILE", 95))
+S3_HEDGE_MIN_SAMPLES = int(os.getenv("S3_HEDGE_MIN_SAMPLES", 20))
+S3_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("S3_HEDGE_MIN_DELAY_SECONDS", 0.02))
+
+class ConnectionStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clients_created = Counter()
+        self.requests = Counter()
+        self.connections_opened = Counter()
+        self.seen_connections = {}
+
+    def record_client(self, name):
+        with self.lock:
+            self.clients_created[name] += 1
+
+    def record_request(self, name, connection):
+        # A request on a connection we have not seen before paid for a new TCP/TLS handshake
+        with self.lock:
+            self.requests[name] += 1
+            if connection is None:
+                return
+            seen = self.seen_connections.setdefault(name, weakref.WeakSet())
+            if connection not in seen:
+                seen.add(connection)
+                self.connections_opened[name] += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                name: {
+                    "clients_created": self.clients_created[name],
+                    "requests": self.requests[name],
+                    "connections_opened": self.connections_opened[name],
+                    "reused_requests": max(0, self.requests[name] - self.connections_opened[name]),
+                }
+                for name in set(self.clients_created) | set(self.requests)
+            }
+
+class ClientProvider:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.s3_client = None
+        self.anthropic_clients = {}
+        self.connection_stats = ConnectionStats()
+
+    def get_s3(self):
+        with self.lock:
+            if self.s3_client is None:
+                # Adaptive retries back off (and rate limit the client) when S3 throttles
+                config = botocore.config.Config(
+                    max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+                    tcp_keepalive=True,
+                    connect_timeout=S3_CONNECT_TIMEOUT_SECONDS,
+                    read_timeout=S3_READ_TIMEOUT_SECONDS,
+                    retries={'mode': 'adaptive', 'max_attempts': S3_MAX_ATTEMPTS}
+                )
+                self.s3_client = boto3.client('s3', endpoint_url=S3_ENDPOINT_URL, config=config)
+                self.s3_client.meta.events.register('response-received.s3', self.on_s3_response)
+                self.connection_stats.record_client("s3")
+            return self.s3_client
+
+    def on_s3_response(self, response_dict=None, **kwargs):
+        # Streaming bodies still hold their pooled urllib3 connection when the response arrives
+        body = (response_dict or {}).get('body')
+        connection = getattr(body, 'connection', None) or getattr(body, '_connection', None)
+        self.connection_stats.record_request("s3", connection)
+
+    def get_anthropic(self, api_key):
+        with self.lock:
+            client = self.anthropic_clients.get(api_key)
+            if client is None:
+                # The SDK's own HTTP client class, so it accepts it whichever httpx build it uses;
+                # the SDK exports no Limits, so the class is taken from its default limits
+                limits = type(anthropic.DEFAULT_CONNECTION_LIMITS)(
+                    max_connections=LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_MAX_CONNECTIONS,
+                    keepalive_expiry=LLM_KEEPALIVE_SECONDS
+                )
+                http_client = anthropic.DefaultHttpxClient(
+                    limits=limits,
+                    timeout=anthropic.Timeout(600.0, connect=10.0),
+                    event_hooks={"response": [self.on_anthropic_response]}
+                )
+                # Retries are done by the LLM scheduler, which knows about the rate limits
+                client = anthropic.Anthropic(api_key=api_key, base_url=ANTHROPIC_BASE_URL, http_client=http_client, max_retries=0)
+                self.anthropic_clients[api_key] = client
+                self.connection_stats.record_client("anthropic")
+            return client
+
+    def on_anthropic_response(self, response):
+        self.connection_stats.record_request("anthropic", response.extensions.get("network_stream"))
+
+@st.cache_resource
+def get_client_provider():
+    # Clients and their connection pools live for the whole server process
+    return ClientProvider()
+
+class LatencyHistogram:
+    # Log-spaced buckets from 1ms to about 2 minutes; percentiles are read from bucket upper bounds
+    BOUNDS = [0.001 * 1.5 ** i for i in range(30)]
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.total = 0
+        self.sum = 0.0
+
+    def record(self, seconds):
+        index = 0
+        while index < len(self.BOUNDS) and seconds > self.BOUNDS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.total += 1
+        self.sum += seconds
+
+    def percentile(self, percent):
+        if not self.total:
+            return None
+        threshold = self.total * percent / 100
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= threshold:
+                return self.BOUNDS[min(index, len(self.BOUNDS) - 1)]
+        return self.BOUNDS[-1]
+
+class S3LatencyStats:
+    # Read latencies per "bucket/first-path-segment", plus hedging and deadline counters
+    def __init__(self):
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.deadlines_exceeded = 0
+
+    def record(self, prefix, seconds):
+        with self.lock:
+            self.histograms.setdefault(prefix, LatencyHistogram()).record(seconds)
+
+    def hedge_delay(self, prefix):
+        # None until the prefix has enough samples for a meaningful percentile
+        with self.lock:
+            histogram = self.histograms.get(prefix)
+            if histogram is None or histogram.total < S3_HEDGE_MIN_SAMPLES:
+                return None
+            return max(S3_HEDGE_MIN_DELAY_SECONDS, histogram.percentile(S3_HEDGE_PERCENTILE))
+
+    def record_hedge(self, won):
+        with self.lock:
+            self.hedges += 1
+            self.hedge_wins += won
+
+    def record_deadline_exceeded(self):
+        with self.lock:
+            self.deadlines_exceeded += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                "prefixes": {
+                    prefix: {
+                        "reads": histogram.total,
+                        "mean_seconds": histogram.sum / histogram.total,
+                        "p50_seconds": histogram.percentile(50),
+                        "p95_seconds": histogram.percentile(95),
+                        "p99_seconds": histogram.percentile(99),
+                    }
+                    for prefix, histogram in self.histograms.items()
+                },
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "deadlines_exceeded": self.deadlines_exceeded,
+            }
+
+@st.cache_resource
+def get_s3_latency_stats():
+    return S3LatencyStats()
+
+@st.cache_resource
+def get_s3_read_executor():
+    # Reads run here so the caller can stop waiting at the deadline; abandoned reads finish in the background
+    return ThreadPoolExecutor(max_workers=S3_MAX_POOL_CONNECTIONS, thread_name_prefix="s3-read")
+
+CURRENT_SPAN = contextvars.ContextVar("current_span", default=None)
+
+class Span:
+    def __init__(self, name, parent, attributes):
+        self.name = name
+        self.parent = parent
+        self.attributes = dict(attributes)
+        self.children = []
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.duration = None
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_seconds": self.duration,
+            "attributes": self.attributes,
+            "error": self.error,
+            "children": [child.to_dict() for child in list(self.children)],
+        }
+
+class NullSpan:
+    def set(self, **attributes):
+        pass
+
+class Tracer:
+    # Nested timing spans. The outermost span of a thread (a rerun, a job) is a trace: when it ends it is
+    # written to the JSON-lines log, and every span feeds the per-name histograms behind the Prometheus export.
+    def __init__(self, enabled, log_path, metrics_path, metrics_interval_seconds, log_max_bytes=0, log_backup_count=0):
+        self.enabled = enabled
+        self.log_path = log_path
+        self.log_max_bytes = log_max_bytes
+        self.log_backup_count = log_backup_count
+        self.metrics_path = metrics_path
+        self.metrics_interval_seconds = metrics_interval_seconds
+        self.histograms = {}
+        self.totals = {}
+        self.errors = Counter()
+        self.metrics_written_at = 0.0
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def span(self, name, **attributes):
+        if not self.enabled:
+            yield NullSpan()
+            return
+
+        parent = CURRENT_SPAN.get()
+        span = Span(name, parent, attributes)
+        if parent is not None:
+            parent.children.append(span)
+        token = CURRENT_SPAN.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            span.duration = time.perf_counter() - span.start
+            CURRENT_SPAN.reset(token)
+            self.record(span)
+            if parent is None:
+                self.export(span)
+
+    def record(self, span):
+        with self.lock:
+            self.histograms.setdefault(span.name, LatencyHistogram()).record(span.duration)
+            totals = self.totals.setdefault(span.name, Counter())
+            for attribute, value in span.attributes.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    totals[attribute] += value
+            if span.error is not None:
+                self.errors[span.name] += 1
+
+    def export(self, trace):
+        try:
+            if self.log_path:
+                line = json.dumps(trace.to_dict(), default=str)
+                with self.lock:
+                    self.rotate_log(len(line) + 1)
+                    with open(self.log_path, 'a') as log_file:
+                        log_file.write(line + "\n")
+
+            with self.lock:
+                write_metrics = self.metrics_path and time.monotonic() - self.metrics_written_at > self.metrics_interval_seconds
+                if write_metrics:
+                    self.metrics_written_at = time.monotonic()
+            if write_metrics:
+                self.write_metrics()
+        except OSError as e:
+            print(f"Could not export trace: {str(e)}")
+
+    def rotate_log(self, incoming_bytes):
+        # Called with the lock held; without a size limit the log grows without bound
+        if not self.log_max_bytes:
+            return
+        try:
+            if os.path.getsize(self.log_path) + incoming_bytes <= self.log_max_bytes:
+                return
+        except FileNotFoundError:
+            return
+        if self.log_backup_count <= 0:
+            os.remove(self.log_path)
+            return
+        for number in range(self.log_backup_count - 1, 0, -1):
+            if os.path.exists(f"{self.log_path}.{number}"):
+                os.replace(f"{self.log_path}.{number}", f"{self.log_path}.{number + 1}")
+        os.replace(self.log_path, f"{self.log_path}.1")
+
+    def prometheus_text(self):
+        lines = [
+            "# HELP hedgefund_span_duration_seconds Time spent in traced spans.",
+            "# TYPE hedgefund_span_duration_seconds histogram",
+        ]
+        with self.lock:
+            for name, histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(LatencyHistogram.BOUNDS, histogram.counts):
+                    cumulative += count
+                    lines.append(f'hedgefund_span_duration_seconds_bucket{{span="{name}",le="{bound:.6g}"}} {cumulative}')
+                lines.append(f'hedgefund_span_duration_seconds_bucket{{span="{name}",le="+Inf"}} {histogram.total}')
+                lines.append(f'hedgefund_span_duration_seconds_sum{{span="{name}"}} {histogram.sum:.6f}')
+                lines.append(f'hedgefund_span_duration_seconds_count{{span="{name}"}} {histogram.total}')
+
+            attributes = sorted(set(attribute for totals in self.totals.values() for attribute in totals))
+            for attribute in attributes:
+                lines.append(f"# HELP hedgefund_span_{attribute}_total Sum of the {attribute} recorded on traced spans.")
+                lines.append(f"# TYPE hedgefund_span_{attribute}_total counter")
+                for name, totals in sorted(self.totals.items()):
+                    if attribute in totals:
+                        lines.append(f'hedgefund_span_{attribute}_total{{span="{name}"}} {totals[attribute]:g}')
+
+            lines.append("# HELP hedgefund_span_errors_total Traced spans that ended with an exception.")
+            lines.append("# TYPE hedgefund_span_errors_total counter")
+            for name, count in sorted(self.errors.items()):
+                lines.append(f'hedgefund_span_errors_total{{span="{name}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def write_metrics(self):
+        # Written atomically so a scraper never reads a half-written file
+        temporary_path = f"{self.metrics_path}.{os.getpid()}.tmp"
+        with open(temporary_path, 'w') as metrics_file:
+            metrics_file.write(self.prometheus_text())
+        os.replace(temporary_path, self.metrics_path)
+
+@st.cache_resource
+def get_tracer():
+    for path in (TRACE_LOG_PATH, TRACE_METRICS_PATH):
+        if path and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+    return Tracer(TRACING_ENABLED, TRACE_LOG_PATH, TRACE_METRICS_PATH, TRACE_METRICS_INTERVAL_SECONDS, TRACE_LOG_MAX_BYTES, TRACE_LOG_BACKUP_COUNT)
+
+def traced(name, measure=None):
+    # Decorator form of Tracer.span; measure(result) returns attributes such as rows or bytes
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with get_tracer().span(name) as span:
+                result = function(*args, **kwargs)
+                if measure is not None:
+                    span.set(**measure(result))
+                return result
+        return wrapper
+    return decorate
+
+def in_current_span(function):
+    # Lets work handed to a thread pool nest its spans under the caller's span
+    parent = CURRENT_SPAN.get()
+
+    def run(*args, **kwargs):
+        token = CURRENT_SPAN.set(parent)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            CURRENT_SPAN.reset(token)
+    return run
+
+class SamplingProfiler:
+    # Samples the call stack of one thread from a background thread every interval_seconds.
+    # The profiled code is not instrumented, so the overhead is one stack walk per sample.
+    def __init__(self, thread_id, interval_seconds):
+        self.thread_id = thread_id
+        self.interval_seconds = interval_seconds
+        self.samples = Counter()
+        self.weights = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.sample, name="sampling-profiler", daemon=True)
+        self.started_at = None
+        self.duration = None
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.duration = time.perf_counter() - self.started_at
+        return self
+
+    def sample(self):
+        last_sample = time.perf_counter()
+        while not self.stopped.wait(self.interval_seconds):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append((frame.f_code.co_filename, frame.f_code.co_name, frame.f_lineno))
+                frame = frame.f_back
+            # Outermost frame first, as in collapsed stacks
+            stack = tuple(reversed(stack))
+            self.samples[stack] += 1
+            self.weights[stack] += now - last_sample
+            last_sample = now
+
+    def collapsed(self):
+        # Brendan Gregg's collapsed format, readable by flamegraph.pl and speedscope
+        lines = []
+        for stack, count in self.samples.most_common():
+            names = [f"{function} ({os.path.basename(file_name)}:{line})" for file_name, function, line in stack]
+            lines.append(f"{';'.join(names)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self, name):
+        frames = []
+        frame_index = {}
+        samples = []
+        weights = []
+        for stack, count in self.samples.items():
+            indexes = []
+            for frame in stack:
+                if frame not in frame_index:
+                    frame_index[frame] = len(frames)
+                    frames.append({"name": frame[1], "file": frame[0], "line": frame[2]})
+                indexes.append(frame_index[frame])
+            samples.append(indexes)
+            weights.append(self.weights[stack])
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "hedgefund-insights sampling profiler",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            }],
+        }
+
+    def hotspots(self, file_name, top=15):
+        # Lines of file_name that were executing (themselves or through calls into libraries), by share of samples
+        total = sum(self.samples.values())
+        lines = Counter()
+        for stack, count in self.samples.items():
+            own_frames = [frame for frame in stack if frame[0] == file_name]
+            if own_frames:
+                lines[own_frames[-1]] += count
+        return [
+            {"Line": f"{function}:{line}", "Samples": count, "Share": f"{100 * count / total:.1f}%"}
+            for (_, function, line), count in lines.most_common(top)
+        ]
+
+    def write(self, directory, name):
+        os.makedirs(directory, exist_ok=True)
+        base_name = os.path.join(directory, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}")
+        with open(f"{base_name}.collapsed", 'w') as collapsed_file:
+            collapsed_file.write(self.collapsed())
+        with open(f"{base_name}.speedscope.json", 'w') as speedscope_file:
+            json.dump(self.speedscope(name), speedscope_file)
+        return base_name
+
+def profiling_requested():
+    if PROFILE_RERUNS:
+        return True
+    if not PROFILER_ADMIN_TOKEN:
+        return False
+    # st.query_params replaced st.experimental_get_query_params in newer Streamlit releases
+    if hasattr(st, "query_params"):
+        value = st.query_params.get("profile")
+    else:
+        value = (st.experimental_get_query_params().get("profile") or [None])[0]
+    return value == PROFILER_ADMIN_TOKEN
+
+class S3DeadlineExceeded(TimeoutError):
+    pass
+
+def latency_prefix(bucket_name, key):
+    return f"{bucket_name}/{key.split('/', 1)[0]}" if "/" in key else bucket_name
+
+@functools.total_ordering
+class Quarter:
+    def __init__(self, year, number):
+        self.year = int(year)
+        self.number = int(number)
+
+    @classmethod
+    def parse(cls, text):
+        # "2023 Q1" -> Quarter(2023, 1)
+        year, quarter_num = str(text).split(' ')
+        return cls(year, quarter_num[1])
+
+    @classmethod
+    def from_ordinal(cls, ordinal):
+        return cls(ordinal // 4, ordinal % 4 + 1)
+
+    @classmethod
+    def range(cls, start, end):
+        # Every quarter from start to end, inclusive
+        return [cls.from_ordinal(ordinal) for ordinal in range(start.ordinal, end.ordinal + 1)]
+
+    @property
+    def ordinal(self):
+        return self.year * 4 + self.number - 1
+
+    def __str__(self):
+        return f"{self.year} Q{self.number}"
+
+    def __repr__(self):
+        return f"Quarter('{self}')"
+
+    def __eq__(self, other):
+        return isinstance(other, Quarter) and self.ordinal == other.ordinal
+
+    def __lt__(self, other):
+        return self.ordinal < other.ordinal
+
+    def __hash__(self):
+        return hash(self.ordinal)
+
+def quarter_options(quarters):
+    # Contiguous, ascending slider options covering the given quarters
+    if not quarters:
+        quarters = DEFAULT_QUARTER_RANGE
+    parsed = [Quarter.parse(quarter) for quarter in quarters]
+    return [str(quarter) for quarter in Quarter.range(min(parsed), max(parsed))]
+
+def quarters_between(start_quarter, end_quarter):
+    return [str(quarter) for quarter in Quarter.range(Quarter.parse(start_quarter), Quarter.parse(end_quarter))]
+
+def partition_prefix(file_name):
+    # "hedgefund_performance_insights.json" -> "hedgefund_performance_insights"
+    return os.path.splitext(file_name)[0]
+
+def partition_manifest_name(file_name):
+    return f"{partition_prefix(file_name)}/manifest.json"
+
+def columnar_name(file_name):
+    # "fund/fund_equities.json" -> "fund/fund_equities.parquet"
+    return f"{os.path.splitext(file_name)[0]}.parquet"
+
+def apply_frame_filters(df, filters):
+    # Same (column, operator, value) filters that pyarrow pushes down, applied in pandas
+    for column, operator, value in filters or []:
+        series = df[column]
+        if operator in ("=", "=="):
+            mask = series == value
+        elif operator == "!=":
+            mask = series != value
+        elif operator == "in":
+            mask = series.isin(value)
+        elif operator == "not in":
+            mask = ~series.isin(value)
+        elif operator == "<":
+            mask = series < value
+        elif operator == "<=":
+            mask = series <= value
+        elif operator == ">":
+            mask = series > value
+        elif operator == ">=":
+            mask = series >= value
+        else:
+            raise ValueError(f"Unsupported filter operator: {operator}")
+        df = df[mask.to_numpy()]
+    return df
+
+def build_columnar_table(records, sort_by=None):
+    df = pd.DataFrame(records)
+
+    # Parquet columns need one type; the JSON mixes e.g. 0 and "0" in the same field
+    for column in df.columns:
+        if df[column].dtype == object and len(set(type(value) for value in df[column].dropna())) > 1:
+            df[column] = df[column].map(lambda value: value if value is None or pd.isna(value) else str(value))
+
+    if sort_by:
+        # Sorted row groups let readers skip whole groups using the column statistics
+        df = df.sort_values(sort_by, kind='stable')
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+def write_columnar_dataset(aws_operations, file_name, bucket_name, sort_by=None):
+    # Build step: store a JSON dataset as Parquet next to the original
+    records = json.loads(aws_operations.fetch_object(file_name, bucket_name))
+    table = build_columnar_table(records, sort_by)
+
+    sink = pa.BufferOutputStream()
+    pq.write_table(table, sink, row_group_size=10000, compression='zstd')
+    aws_operations.upload_object(sink.getvalue().to_pybytes(), columnar_name(file_name), bucket_name)
+    return table.num_rows
+
+class LocalObjectMirror:
+    # Keeps local copies of S3 objects (revalidated by ETag) so they can be memory-mapped or streamed.
+    # With max_bytes set, the least recently used files are deleted once the copies outgrow it.
+    def __init__(self, directory, ttl_seconds, max_bytes=None):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.entries = {}
+        # (bucket name, key) -> when a HEAD found an object that has no local copy yet
+        self.confirmed = {}
+        self.sizes = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def exists(self, s3, file_name, bucket_name):
+        # True/False from a local copy or a recent lookup, else from one HEAD request
+        key = (bucket_name, file_name)
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            confirmed_at = self.confirmed.get(key)
+        if entry is not None and now - entry[2] < self.ttl_seconds:
+            return entry[0] is not None
+        if confirmed_at is not None and now - confirmed_at < self.ttl_seconds:
+            return True
+
+        try:
+            s3.head_object(Bucket=bucket_name, Key=file_name)
+        except botocore.exceptions.ClientError as e:
+            if e.response['Error']['Code'] not in ('NoSuchKey', '404', 'NotFound'):
+                raise e
+            # Remembered like a failed GET, so fetch() does not ask again either
+            with self.lock:
+                self.entries[key] = (None, None, time.monotonic())
+            return False
+
+        with self.lock:
+            if len(self.confirmed) >= 1024:
+                self.confirmed = {checked_key: checked_at for checked_key, checked_at in self.confirmed.items() if now - checked_at < self.ttl_seconds}
+            self.confirmed[key] = time.monotonic()
+        return True
+
+    def fetch(self, s3, file_name, bucket_name):
+        # Returns (local path, ETag), or (None, None) when the object does not exist
+        key = (bucket_name, file_name)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] is not None and entry[0] in self.sizes:
+                self.sizes.move_to_end(entry[0])
+        if entry is not None and time.monotonic() - entry[2] < self.ttl_seconds:
+            return entry[0], entry[1]
+
+        kwargs = {}
+        if entry is not None and entry[1] is not None:
+            kwargs['IfNoneMatch'] = entry[1]
+
+        try:
+            obj = s3.get_object(Bucket=bucket_name, Key=file_name, **kwargs)
+        except botocore.exceptions.ClientError as e:
+            code = e.response['Error']['Code']
+            if code in ('304', 'NotModified'):
+                entry = (entry[0], entry[1], time.monotonic())
+            elif code in ('NoSuchKey', '404'):
+                entry = (None, None, time.monotonic())
+            else:
+                raise e
+            with self.lock:
+                self.entries[key] = entry
+            return entry[0], entry[1]
+
+        path = os.path.join(self.directory, hashlib.sha256(f"{bucket_name}/{file_name}".encode('utf-8')).hexdigest() + os.path.splitext(file_name)[1])
+        temporary_path = f"{path}.{threading.get_ident()}.tmp"
+
+        # Stream the body to disk in chunks instead of holding the whole object in memory
+        with open(temporary_path, 'wb') as local_file:
+            for chunk in iter(lambda: obj['Body'].read(1024 * 1024), b""):
+                local_file.write(chunk)
+        os.replace(temporary_path, path)
+
+        with self.lock:
+            self.entries[key] = (path, obj.get('ETag'), time.monotonic())
+            self.total_bytes += os.path.getsize(path) - self.sizes.pop(path, 0)
+            self.sizes[path] = os.path.getsize(path)
+            self.evict(keep=path)
+        return path, obj.get('ETag')
+
+    def evict(self, keep):
+        # Called with the lock held
+        if self.max_bytes is None:
+            return
+        while self.total_bytes > self.max_bytes and len(self.sizes) > 1:
+            path, size = next(iter(self.sizes.items()))
+            if path == keep:
+                self.sizes.move_to_end(path)
+                continue
+            del self.sizes[path]
+            self.total_bytes -= size
+            for key in [key for key, entry in self.entries.items() if entry[0] == path]:
+                del self.entries[key]
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f"Could not remove cached file {path}: {str(e)}")
+
+@st.cache_resource
+def get_local_object_mirror():
+    return LocalObjectMirror(COLUMNAR_CACHE_DIR, OBJECT_CACHE_TTL_SECONDS, COLUMNAR_CACHE_MAX_BYTES)
+
+@st.cache_resource
+def get_pdf_mirror():
+    return LocalObjectMirror(PDF_CACHE_DIR, OBJECT_CACHE_TTL_SECONDS, PDF_CACHE_MAX_BYTES)
+
+# Key suffix used for each Content-Encoding
+COMPRESSION_SUFFIXES = {"zstd": ".zst", "gzip": ".gz"}
+DECOMPRESS_CHUNK_BYTES = 1024 * 1024
+
+def object_encoding(file_name, content_encoding=None):
+    if content_encoding in COMPRESSION_SUFFIXES:
+        return content_encoding
+    for encoding, suffix in COMPRESSION_SUFFIXES.items():
+        if file_name.endswith(suffix):
+            return encoding
+    return None
+
+def stored_object_names(file_name):
+    # Keys a logical object may be stored under, compressed copies first
+    if object_encoding(file_name) is not None:
+        return [file_name]
+    names = []
+    for encoding, suffix in COMPRESSION_SUFFIXES.items():
+        if encoding != "zstd" or zstandard is not None:
+            names.append(file_name + suffix)
+    names.append(file_name)
+    return names
+
+def read_object_body(body, encoding):
+    # Decompress chunk by chunk while reading, so the whole compressed body is never held as well
+    if encoding is None:
+        return body.read()
+    if encoding == "gzip":
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    elif zstandard is not None:
+        decompressor = zstandard.ZstdDecompressor().decompressobj()
+    else:
+        raise RuntimeError("The zstandard package is required to read zstd-compressed objects")
+
+    chunks = []
+    while True:
+        chunk = body.read(DECOMPRESS_CHUNK_BYTES)
+        if not chunk:
+            break
+        chunks.append(decompressor.decompress(chunk))
+    chunks.append(decompressor.flush())
+    return b"".join(chunks)
+
+def compress_body(data, encoding):
+    if encoding == "gzip":
+        # mtime=0 keeps the output (and so the ETag) identical for identical data
+        return gzip.compress(data, compresslevel=6, mtime=0)
+    if encoding == "zstd":
+        if zstandard is None:
+            raise RuntimeError("The zstandard package is required to write zstd-compressed objects")
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    raise ValueError(f"Unsupported compression: {encoding}")
+
+def canonical_fund_name(fund_name):
+    # "Greenlight Capital, LP" -> "greenlightcapital"
+    return re.sub(r"[^a-z0-9]", "", fund_name.replace(", LP", "").lower())
+
+def default_fund_prefix(fund_name, bucket_name):
+    # Folder naming used when uploading to each bucket
+    if bucket_name == "venturecapitalfunds":
+        return fund_name.split(" ")[0].lower()
+    return fund_name.lower().replace(" ", "")
+
+class ManifestEntry:
+    def __init__(self, key, size, etag, last_modified):
+        self.key = key
+        self.size = size
+        self.etag = etag
+        self.last_modified = last_modified
+
+class BucketManifest:
+    def __init__(self, bucket_name, ttl_seconds):
+        self.bucket_name = bucket_name
+        self.ttl_seconds = ttl_seconds
+        self.entries = {}
+        self.fund_prefixes = {}
+        # Bumped on every change; the id tells versions of a manifest rebuilt after a cache clear apart
+        self.manifest_id = uuid.uuid4().hex
+        self.version = 0
+        self.refreshed_at = None
+        self.refreshing = False
+        self.lock = threading.Lock()
+
+    def is_fresh(self):
+        return self.refreshed_at is not None and time.monotonic() - self.refreshed_at < self.ttl_seconds
+
+    def refresh(self, s3):
+        listed = {}
+        paginator = s3.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket_name):
+            for obj in page.get('Contents', []):
+                listed[obj['Key']] = ManifestEntry(obj['Key'], obj['Size'], obj.get('ETag'), obj.get('LastModified'))
+
+        with self.lock:
+            # Apply only the differences so unchanged entries (and the version) are kept
+            changed = False
+            for key in list(self.entries):
+                if key not in listed:
+                    del self.entries[key]
+                    changed = True
+            for key, entry in listed.items():
+                current = self.entries.get(key)
+                if current is None or current.etag != entry.etag:
+                    self.entries[key] = entry
+                    changed = True
+
+            if changed or self.refreshed_at is None:
+                self.version += 1
+                self.fund_prefixes = {}
+                for key in self.entries:
+                    self.add_prefix(key)
+            self.refreshed_at = time.monotonic()
+            self.refreshing = False
+
+    def ensure_fresh(self, s3):
+        # The first listing is synchronous; later refreshes run in the background and serve the stale listing meanwhile
+        if self.refreshed_at is None:
+            self.refresh(s3)
+            return
+        if self.is_fresh():
+            return
+        with self.lock:
+            if self.refreshing:
+                return
+            self.refreshing = True
+
+        def refresh_in_background():
+            try:
+                self.refresh(s3)
+            except Exception as e:
+                print(f"Could not refresh the {self.bucket_name} manifest: {str(e)}")
+                with self.lock:
+                    self.refreshing = False
+
+        threading.Thread(target=refresh_in_background, daemon=True).start()
+
+    def add_prefix(self, key):
+        # Called with the lock held; lowercase folders win over "Fund Name/" ones holding summary PDFs
+        if "/" not in key:
+            return
+        prefix = key.split("/", 1)[0]
+        canonical = canonical_fund_name(prefix)
+        current = self.fund_prefixes.get(canonical)
+        if current is None or (current != current.lower() and prefix == prefix.lower()):
+            self.fund_prefixes[canonical] = prefix
+
+    def get(self, key):
+        with self.lock:
+            return self.entries.get(key)
+
+    def exists(self, key):
+        return self.get(key) is not None
+
+    def record_put(self, key, size, etag):
+        with self.lock:
+            self.entries[key] = ManifestEntry(key, size, etag, None)
+            self.add_prefix(key)
+            self.version += 1
+
+    def fund_prefix(self, fund_name):
+        # Folder holding a fund's files, matched on the canonical name or its first word
+        with self.lock:
+            prefix = self.fund_prefixes.get(canonical_fund_name(fund_name))
+            if prefix is None and fund_name.split():
+                prefix = self.fund_prefixes.get(canonical_fund_name(fund_name.split()[0]))
+            return prefix
+
+class BucketManifestStore:
+    def __init__(self, ttl_seconds):
+        self.ttl_seconds = ttl_seconds
+        self.manifests = {}
+        # bucket name -> when to try listing it again, or None when listing is denied
+        self.unavailable = {}
+        self.lock = threading.Lock()
+
+    def get(self, s3, bucket_name):
+        # Returns None when the bucket cannot be listed; callers then fall back to plain GETs
+        with self.lock:
+            if bucket_name in self.unavailable:
+                retry_at = self.unavailable[bucket_name]
+                if retry_at is None or time.monotonic() < retry_at:
+                    return None
+                del self.unavailable[bucket_name]
+            manifest = self.manifests.setdefault(bucket_name, BucketManifest(bucket_name, self.ttl_seconds))
+
+        try:
+            manifest.ensure_fresh(s3)
+        except (botocore.exceptions.ClientError, botocore.exceptions.BotoCoreError) as e:
+            # Only a missing list permission is permanent; throttling, server errors and timeouts
+            # are retried once the manifest would have expired
+            denied = isinstance(e, botocore.exceptions.ClientError) and e.response['Error']['Code'] == 'AccessDenied'
+            print(f"Could not list the {bucket_name} bucket, resolving keys with S3 requests instead{'' if denied else f' for {self.ttl_seconds:.0f}s'}: {str(e)}")
+            with self.lock:
+                self.unavailable[bucket_name] = None if denied else time.monotonic() + self.ttl_seconds
+                self.manifests.pop(bucket_name, None)
+            return None
+        return manifest
+
+@st.cache_resource
+def get_bucket_manifest_store():
+    return BucketManifestStore(BUCKET_MANIFEST_TTL_SECONDS)
+
+class SharedCache:
+    # Common fill logic; subclasses provide get/set and a cross-process fill lock that is only
+    # renewed or released by the holder of its token
+    def __init__(self, fill_timeout_seconds, lock_ttl_seconds=SHARED_CACHE_LOCK_TTL_SECONDS, poll_seconds=0.05):
+        self.fill_timeout_seconds = fill_timeout_seconds
+        self.lock_ttl_seconds = lock_ttl_seconds
+        self.poll_seconds = poll_seconds
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.fills = 0
+        self.waits = 0
+
+    def fill(self, key, produce, ttl_seconds=None, is_valid=None):
+        # Returns the cached value, or produces it while holding the fill lock so that only one
+        # process (and thread) computes a given key; the others wait for the value to appear
+        deadline = time.monotonic() + self.fill_timeout_seconds
+        waited = False
+        while True:
+            value = self.get(key)
+            if value is not None and (is_valid is None or is_valid(value)):
+                with self.lock:
+                    self.hits += 1
+                    self.waits += waited
+                return value
+
+            token = uuid.uuid4().hex
+            if self.acquire_fill_lock(key, token, self.lock_ttl_seconds):
+                stopped = threading.Event()
+                threading.Thread(target=self.keep_fill_lock, args=(key, token, stopped), daemon=True).start()
+                try:
+                    # Another process may have filled the key while we were acquiring the lock
+                    value = self.get(key)
+                    if value is not None and (is_valid is None or is_valid(value)):
+                        with self.lock:
+                            self.hits += 1
+                        return value
+                    value = produce()
+                    self.set(key, value, ttl_seconds)
+                    with self.lock:
+                        self.misses += 1
+                        self.fills += 1
+                    return value
+                finally:
+                    stopped.set()
+                    self.release_fill_lock(key, token)
+
+            if time.monotonic() >= deadline:
+                # The holder is still producing after the fill timeout, so compute our own copy
+                with self.lock:
+                    self.misses += 1
+                return produce()
+            waited = True
+            time.sleep(self.poll_seconds)
+
+    def keep_fill_lock(self, key, token, stopped):
+        # Renews the lock while produce() runs, so a slow producer is not mistaken for a dead one
+        while not stopped.wait(self.lock_ttl_seconds / 3):
+            if not self.refresh_fill_lock(key, token, self.lock_ttl_seconds):
+                return
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": type(self).__name__,
+                "hits": self.hits,
+                "misses": self.misses,
+                "fills": self.fills,
+                "coalesced_waits": self.waits,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+class FileSharedCache(SharedCache):
+    # One file per key in a directory every process can see; on /dev/shm this is a shared-memory store.
+    # Each file starts with its expiry time; the oldest files are removed once max_bytes is exceeded.
+    def __init__(self, directory, max_bytes, fill_timeout_seconds, lock_ttl_seconds=SHARED_CACHE_LOCK_TTL_SECONDS):
+        super().__init__(fill_timeout_seconds, lock_ttl_seconds)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.written_bytes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self.path(key), 'rb') as cache_file:
+                expires_at, = struct.unpack("d", cache_file.read(8))
+                if expires_at and expires_at < time.time():
+                    return None
+                return cache_file.read()
+        except (OSError, struct.error):
+            return None
+
+    def set(self, key, value, ttl_seconds=None):
+        path = self.path(key)
+        temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        expires_at = time.time() + ttl_seconds if ttl_seconds else 0.0
+        try:
+            with open(temporary_path, 'wb') as cache_file:
+                cache_file.write(struct.pack("d", expires_at))
+                cache_file.write(value)
+            os.replace(temporary_path, path)
+        except OSError as e:
+            print(f"Could not write to the shared cache: {str(e)}")
+            return
+
+        with self.lock:
+            self.written_bytes += len(value)
+            should_evict = self.written_bytes > self.max_bytes // 10
+            if should_evict:
+                self.written_bytes = 0
+        if should_evict:
+            self.evict()
+
+    def evict(self):
+        # Scanning the directory is only done after a tenth of max_bytes has been written
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.endswith((".tmp", ".lock")):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total_bytes = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total_bytes -= size
+            except OSError:
+                pass
+
+    def acquire_fill_lock(self, key, token, ttl_seconds):
+        # The lock file holds its owner's token; its mtime is renewed by the owner while it fills
+        lock_path = self.path(key) + ".lock"
+        try:
+            descriptor = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            # A lock whose owner stopped renewing it (a crashed process) is removed, then taken on a later try
+            try:
+                if time.time() - os.path.getmtime(lock_path) > ttl_seconds:
+                    self.remove_lock_file(lock_path, self.read_lock_owner(lock_path))
+            except OSError:
+                pass
+            return False
+        except OSError as e:
+            print(f"Could not lock the shared cache, filling without coalescing: {str(e)}")
+            return True
+        with os.fdopen(descriptor, 'w') as lock_file:
+            lock_file.write(token)
+        return True
+
+    def read_lock_owner(self, lock_path):
+        try:
+            with open(lock_path) as lock_file:
+                return lock_file.read()
+        except OSError:
+            return None
+
+    def remove_lock_file(self, lock_path, token):
+        # Only removes the lock while it still belongs to token, never a lock taken over since
+        if token and self.read_lock_owner(lock_path) == token:
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass
+
+    def refresh_fill_lock(self, key, token, ttl_seconds):
+        lock_path = self.path(key) + ".lock"
+        if self.read_lock_owner(lock_path) != token:
+            return False
+        try:
+            os.utime(lock_path)
+            return True
+        except OSError:
+            return False
+
+    def release_fill_lock(self, key, token):
+        self.remove_lock_file(self.path(key) + ".lock", token)
+
+class RedisError(Exception):
+    pass
+
+# Compare-and-delete / compare-and-expire: a lock is only released or renewed by the token that holds it
+REDIS_RELEASE_LOCK_SCRIPT = "if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) else return 0 end"
+REDIS_REFRESH_LOCK_SCRIPT = "if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('PEXPIRE', KEYS[1], ARGV[2]) else return 0 end"
+
+class RedisSharedCache(SharedCache):
+    # Minimal RESP client (GET, SET with PX/NX, EVAL), so any Redis-compatible server or local stand-in works.
+    # Connection failures degrade to cache misses instead of failing the page.
+    def __init__(self, url, fill_timeout_seconds, lock_ttl_seconds=SHARED_CACHE_LOCK_TTL_SECONDS, socket_timeout=5.0):
+        super().__init__(fill_timeout_seconds, lock_ttl_seconds)
+        parsed = urllib.parse.urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.socket_timeout = socket_timeout
+        self.local = threading.local()
+
+    def connect(self):
+        connection = socket.create_connection((self.host, self.port), timeout=self.socket_timeout)
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.local.connection = connection
+        self.local.reader = connection.makefile('rb')
+        if self.password:
+            self.execute(b"AUTH", self.password.encode('utf-8'))
+        if self.db:
+            self.execute(b"SELECT", str(self.db).encode('utf-8'))
+
+    def disconnect(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is not None:
+            try:
+                connection.close()
+            except OSError:
+                pass
+        self.local.connection = None
+
+    def execute(self, *parts):
+        # One connection per thread, reused across commands
+        if getattr(self.local, "connection", None) is None:
+            self.connect()
+        command = [b"*%d\r\n" % len(parts)]
+        for part in parts:
+            part = part if isinstance(part, bytes) else str(part).encode('utf-8')
+            command.append(b"$%d\r\n%s\r\n" % (len(part), part))
+        try:
+            self.local.connection.sendall(b"".join(command))
+            return self.read_reply()
+        except OSError:
+            self.disconnect()
+            raise
+
+    def read_reply(self):
+        line = self.local.reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by the cache server")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload
+        if kind == b"-":
+            raise RedisError(payload.decode('utf-8', 'replace'))
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self.local.reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            length = int(payload)
+            return None if length < 0 else [self.read_reply() for _ in range(length)]
+        raise RedisError(f"Unexpected reply from the cache server: {line!r}")
+
+    def get(self, key):
+        try:
+            return self.execute(b"GET", key)
+        except (OSError, RedisError) as e:
+            print(f"Shared cache GET failed: {str(e)}")
+            return None
+
+    def set(self, key, value, ttl_seconds=None):
+        try:
+            if ttl_seconds:
+                self.execute(b"SET", key, value, b"PX", int(ttl_seconds * 1000))
+            else:
+                self.execute(b"SET", key, value)
+        except (OSError, RedisError) as e:
+            print(f"Shared cache SET failed: {str(e)}")
+
+    def acquire_fill_lock(self, key, token, ttl_seconds):
+        try:
+            return self.execute(b"SET", f"lock:{key}", token, b"NX", b"PX", int(ttl_seconds * 1000)) is not None
+        except (OSError, RedisError) as e:
+            print(f"Could not lock the shared cache, filling without coalescing: {str(e)}")
+            return True
+
+    def refresh_fill_lock(self, key, token, ttl_seconds):
+        try:
+            return self.execute(b"EVAL", REDIS_REFRESH_LOCK_SCRIPT, 1, f"lock:{key}", token, int(ttl_seconds * 1000)) == 1
+        except (OSError, RedisError):
+            return False
+
+    def release_fill_lock(self, key, token):
+        try:
+            self.execute(b"EVAL", REDIS_RELEASE_LOCK_SCRIPT, 1, f"lock:{key}", token)
+        except (OSError, RedisError):
+            pass
+
+def create_shared_cache(backend, path, url, max_bytes, fill_timeout_seconds, lock_ttl_seconds=SHARED_CACHE_LOCK_TTL_SECONDS):
+    if backend == "disk":
+        return FileSharedCache(path or os.path.join(".cache", "shared"), max_bytes, fill_timeout_seconds, lock_ttl_seconds)
+    if backend == "shm":
+        return FileSharedCache(path or "/dev/shm/hedgefund-cache", max_bytes, fill_timeout_seconds, lock_ttl_seconds)
+    if backend == "redis":
+        return RedisSharedCache(url, fill_timeout_seconds, lock_ttl_seconds)
+    if backend:
+        print(f"Unknown shared cache backend '{backend}', running without one")
+    return None
+
+@st.cache_resource
+def get_shared_cache():
+    # None when no shared tier is configured
+    return create_shared_cache(SHARED_CACHE_BACKEND, SHARED_CACHE_PATH, SHARED_CACHE_URL, SHARED_CACHE_MAX_BYTES, SHARED_CACHE_FILL_TIMEOUT_SECONDS, SHARED_CACHE_LOCK_TTL_SECONDS)
+
+# Stored as a call's error when its leader was stopped before finishing (e.g. by Streamlit's
+# StopException or RerunException, which are not Exceptions): waiters retry instead of using it
+LEADER_INTERRUPTED = object()
+
+class SingleFlightCall:
     def __init__(self):
-        self.s3 = boto3.client('s3')
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+class SingleFlight:
+    # Concurrent calls with the same key share one execution: the first caller runs the function,
+    # the others wait for its result (or its exception) instead of repeating the work
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+        self.executions = 0
+        self.shared = 0
+        self.timeouts = 0
+        self.retries = 0
+
+    def do(self, key, function, timeout_seconds=None):
+        deadline = None if timeout_seconds is None else time.monotonic() + timeout_seconds
+        while True:
+            with self.lock:
+                call = self.calls.get(key)
+                leader = call is None
+                if leader:
+                    call = SingleFlightCall()
+                    self.calls[key] = call
+                    self.executions += 1
+                else:
+                    self.shared += 1
+
+            if leader:
+                try:
+                    call.value = function()
+                except Exception as e:
+                    call.error = e
+                    raise
+                except BaseException:
+                    call.error = LEADER_INTERRUPTED
+                    raise
+                finally:
+                    with self.lock:
+                        del self.calls[key]
+                    call.done.set()
+                return call.value
+
+            remaining = None if deadline is None else max(0, deadline - time.monotonic())
+            if not call.done.wait(remaining):
+                with self.lock:
+                    self.timeouts += 1
+                raise TimeoutError(f"Timed out after {timeout_seconds}s waiting for an identical request in flight: {key}")
+            if call.error is LEADER_INTERRUPTED:
+                # The next waiter to get here becomes the leader
+                with self.lock:
+                    self.retries += 1
+                continue
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+    def stats(self):
+        with self.lock:
+            return {
+                "executions": self.executions,
+                "shared": self.shared,
+                "timeouts": self.timeouts,
+                "retries": self.retries,
+                "in_flight": len(self.calls),
+            }
+
+@st.cache_resource
+def get_single_flight():
+    # One per server process, so identical requests from different sessions are coalesced
+    return SingleFlight()
+
+def pack_shared_object(body, etag):
+    # ETag and body in one value: 4-byte ETag length, ETag, body
+    etag = (etag or "").encode('utf-8')
+    return struct.pack(">I", len(etag)) + etag + body
+
+def unpack_shared_object(value):
+    etag_length, = struct.unpack(">I", value[:4])
+    return value[4 + etag_length:], value[4:4 + etag_length].decode('utf-8') or None
+
+class CachedObject:
+    def __init__(self, body, etag):
+        self.body = body
+        self.etag = etag
+        self.size = len(body)
+        self.validated_at = time.monotonic()
+
+    def is_fresh(self, ttl_seconds):
+        return time.monotonic() - self.validated_at < ttl_seconds
+
+class ObjectCache:
+    def __init__(self, max_bytes, ttl_seconds):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()
+        self.current_bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+
+    def get(self, bucket_name, file_name):
+        with self.lock:
+            entry = self.entries.get((bucket_name, file_name))
+            if entry is not None:
+                self.entries.move_to_end((bucket_name, file_name))
+            return entry
+
+    def put(self, bucket_name, file_name, body, etag):
+        entry = CachedObject(body, etag)
+        with self.lock:
+            old_entry = self.entries.pop((bucket_name, file_name), None)
+            if old_entry is not None:
+                self.current_bytes -= old_entry.size
+
+            # Objects larger than the whole cache are served but never stored
+            if entry.size > self.max_bytes:
+                return entry
+
+            self.entries[(bucket_name, file_name)] = entry
+            self.current_bytes += entry.size
+
+            # Evict the least recently used objects until we are back under budget
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.current_bytes -= evicted.size
+        return entry
+
+    def mark_revalidated(self, entry):
+        with self.lock:
+            entry.validated_at = time.monotonic()
+            self.revalidations += 1
+
+    def record_hit(self):
+        with self.lock:
+            self.hits += 1
+
+    def record_miss(self):
+        with self.lock:
+            self.misses += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidations": self.revalidations,
+                "objects": len(self.entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+class FetchResult:
+    def __init__(self, name, file_name, content=None, error=None):
+        self.name = name
+        self.file_name = file_name
+        self.content = content
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+@st.cache_resource
+def get_object_cache():
+    # One cache per server process, shared across reruns and sessions
+    return ObjectCache(OBJECT_CACHE_MAX_BYTES, OBJECT_CACHE_TTL_SECONDS)
+
+class AWSOperations:
+    def __init__(self, object_cache=None, s3_client=None, shared_cache=None):
+        self.s3 = s3_client if s3_client is not None else get_client_provider().get_s3()
+        self.object_cache = object_cache if object_cache is not None else get_object_cache()
+        self.shared_cache = shared_cache if shared_cache is not None else get_shared_cache()
 
     def fetch_object(self, file_name, bucket_name):
-        obj = self.s3.get_object(Bucket=bucket_name, Key=file_name)
-        return obj['Body'].read().decode('utf-8')
+        return self.fetch_object_bytes(file_name, bucket_name).decode('utf-8')
+
+    def fetch_object_bytes(self, file_name, bucket_name):
+        # Binary objects such as PDFs must not be decoded as text
+        body, _ = self.fetch_object_body(file_name, bucket_name)
+        return body
+
+    def presigned_url(self, file_name, bucket_name, expires_in=PDF_PRESIGNED_URL_SECONDS):
+        # Lets the browser download the object from S3 directly; None when the client cannot sign
+        try:
+            return self.s3.generate_presigned_url('get_object', Params={'Bucket': bucket_name, 'Key': file_name}, ExpiresIn=expires_in)
+        except (botocore.exceptions.BotoCoreError, botocore.exceptions.ClientError) as e:
+            print(f"Could not presign {file_name}: {str(e)}")
+            return None
+
+    def fetch_object_file(self, file_name, bucket_name, mirror=None):
+        # Streams the object to local disk instead of memory; returns the path, or None when it does not exist
+        mirror = mirror if mirror is not None else get_local_object_mirror()
+        if self.object_exists(file_name, bucket_name) is False:
+            return None
+        path, _ = mirror.fetch(self.s3, file_name, bucket_name)
+        return path
+
+    def bucket_manifest(self, bucket_name):
+        if not USE_BUCKET_MANIFEST:
+            return None
+        return get_bucket_manifest_store().get(self.s3, bucket_name)
+
+    def dataset_version(self, bucket_name):
+        # Changes whenever an object in the bucket is added, replaced or removed; None without a manifest
+        manifest = self.bucket_manifest(bucket_name)
+        if manifest is None:
+            return None
+        return (manifest.manifest_id, manifest.version)
+
+    def object_exists(self, file_name, bucket_name):
+        # True when the bucket manifest lists the object, else None: it may have been uploaded since the
+        # listing, so only a request to S3 can tell that it is missing
+        manifest = self.bucket_manifest(bucket_name)
+        if manifest is None or not any(manifest.exists(name) for name in stored_object_names(file_name)):
+            return None
+        return True
+
+    def fund_prefix(self, fund_name, bucket_name):
+        # Fund name -> folder in the bucket, resolved once here instead of by each section
+        manifest = self.bucket_manifest(bucket_name)
+        prefix = manifest.fund_prefix(fund_name) if manifest is not None else None
+        return prefix or default_fund_prefix(fund_name, bucket_name)
+
+    def resolve_key(self, candidates, bucket_name):
+        # First candidate key that exists according to the manifest (or simply the first one without a manifest)
+        manifest = self.bucket_manifest(bucket_name)
+        if manifest is not None:
+            for candidate in candidates:
+                if any(manifest.exists(name) for name in stored_object_names(candidate)):
+                    return candidate
+        return candidates[0]
+
+    def fetch_object_body(self, file_name, bucket_name):
+        with get_tracer().span("fetch_object", key=file_name) as span:
+            body, etag = self.load_object_body(file_name, bucket_name)
+            span.set(bytes=len(body))
+            return body, etag
+
+    def load_object_body(self, file_name, bucket_name):
+        # Returns the decompressed bytes and ETag; "<key>.gz" / "<key>.zst" copies are used in place of "<key>"
+        stored_names = stored_object_names(file_name)
+        manifest = self.bucket_manifest(bucket_name)
+        if manifest is not None:
+            stored_name = next((name for name in stored_names if manifest.exists(name)), None)
+            if stored_name is not None:
+                return self.fetch_stored_body(stored_name, bucket_name, file_name)
+
+        # Without a listing, or when the object was uploaded after it, probe the plain key first since most objects
+        # are still stored uncompressed, then every compressed copy at once, so a missing key costs two round trips
+        def probe(stored_name):
+            try:
+                return self.fetch_stored_body(stored_name, bucket_name, file_name)
+            except botocore.exceptions.ClientError as e:
+                if e.response['Error']['Code'] != 'NoSuchKey':
+                    raise e
+                return e
+
+        result = probe(file_name)
+        encoded_names = [name for name in stored_names if name != file_name]
+        if isinstance(result, botocore.exceptions.ClientError) and encoded_names:
+            with ThreadPoolExecutor(max_workers=len(encoded_names)) as executor:
+                results = list(executor.map(in_current_span(probe), encoded_names))
+            # Same preference as with a listing: the first stored name that exists
+            result = next((found for found in results if not isinstance(found, botocore.exceptions.ClientError)), result)
+        if isinstance(result, botocore.exceptions.ClientError):
+            raise result
+        return result
+
+    def fetch_stored_body(self, stored_name, bucket_name, file_name):
+        # Served from the process-wide cache whenever possible; the cache holds decompressed bytes
+        entry = self.object_cache.get(bucket_name, stored_name)
+
+        if entry is not None and entry.is_fresh(self.object_cache.ttl_seconds):
+            self.object_cache.record_hit()
+            return entry.body, entry.etag
+
+        # Sessions asking for the same object at the same time share one download
+        return get_single_flight().do(
+            ("s3", bucket_name, stored_name),
+            lambda: self.load_stored_body(stored_name, bucket_name, file_name),
+            SINGLE_FLIGHT_S3_TIMEOUT_SECONDS
+        )
+
+    def load_stored_body(self, stored_name, bucket_name, file_name):
+        entry = self.object_cache.get(bucket_name, stored_name)
+        if entry is not None and entry.is_fresh(self.object_cache.ttl_seconds):
+            # Refreshed by a call that finished just before this one started
+            self.object_cache.record_hit()
+            return entry.body, entry.etag
+
+        manifest = self.bucket_manifest(bucket_name)
+        manifest_entry = None
+        if manifest is not None:
+            manifest_entry = manifest.get(stored_name)
+            if manifest_entry is not None and entry is not None and manifest_entry.etag == entry.etag:
+                # The listing already tells us our copy is current
+                self.object_cache.mark_revalidated(entry)
+                return entry.body, entry.etag
+
+        if entry is None and self.shared_cache is not None:
+            # Cold in this process: take the body from the shared tier, where one process fills each key
+            downloaded = []
+
+            def download():
+                downloaded.append(True)
+                return pack_shared_object(*self.read_object(stored_name, bucket_name))
+
+            value = self.shared_cache.fill(
+                f"s3:{bucket_name}/{stored_name}",
+                download,
+                SHARED_CACHE_OBJECT_TTL_SECONDS,
+                is_valid=lambda value: manifest_entry is None or unpack_shared_object(value)[1] == manifest_entry.etag
+            )
+            body, etag = unpack_shared_object(value)
+            if downloaded:
+                self.object_cache.record_miss()
+            entry = self.object_cache.put(bucket_name, stored_name, body, etag)
+            if downloaded and manifest is not None and manifest_entry is None:
+                manifest.record_put(stored_name, len(body), entry.etag)
+            if downloaded or manifest_entry is not None:
+                return entry.body, entry.etag
+            # Without a listing, the shared copy is confirmed with a conditional GET below
+
+        if entry is not None:
+            # The TTL has expired, so ask S3 whether our copy is still current
+            try:
+                body, etag = self.read_object(stored_name, bucket_name, IfNoneMatch=entry.etag)
+            except botocore.exceptions.ClientError as e:
+                if e.response['Error']['Code'] in ('304', 'NotModified'):
+                    self.object_cache.mark_revalidated(entry)
+                    return entry.body, entry.etag
+                raise e
+        else:
+            body, etag = self.read_object(stored_name, bucket_name)
+
+        self.object_cache.record_miss()
+        if entry is not None and "/cleaned/" in file_name:
+            # A letter changed under us, so answers generated from the old text are stale
+            get_response_cache().invalidate_letter(file_name)
+        entry = self.object_cache.put(bucket_name, stored_name, body, etag)
+        if manifest is not None and manifest_entry is None:
+            # Uploaded after the last listing; later lookups find it without waiting for the next one
+            manifest.record_put(stored_name, len(body), entry.etag)
+        if self.shared_cache is not None:
+            self.shared_cache.set(f"s3:{bucket_name}/{stored_name}", pack_shared_object(body, entry.etag), SHARED_CACHE_OBJECT_TTL_SECONDS)
+        return entry.body, entry.etag
+
+    def read_object(self, stored_name, bucket_name, **kwargs):
+        # GET and read one object within S3_REQUEST_DEADLINE_SECONDS; returns (decompressed body, ETag).
+        # With hedging on, a second GET is sent once the first one outlives the prefix's p95 and the first to finish wins.
+        latency_stats = get_s3_latency_stats()
+        prefix = latency_prefix(bucket_name, stored_name)
+
+        def attempt():
+            started_at = time.perf_counter()
+            obj = self.s3.get_object(Bucket=bucket_name, Key=stored_name, **kwargs)
+            body = read_object_body(obj['Body'], object_encoding(stored_name, obj.get('ContentEncoding')))
+            latency_stats.record(prefix, time.perf_counter() - started_at)
+            return body, obj.get('ETag')
+
+        executor = get_s3_read_executor()
+        deadline = time.monotonic() + S3_REQUEST_DEADLINE_SECONDS
+        futures = [executor.submit(attempt)]
+        hedge_delay = latency_stats.hedge_delay(prefix) if S3_HEDGED_READS else None
+        if hedge_delay is not None:
+            done, _ = wait(futures, timeout=min(hedge_delay, S3_REQUEST_DEADLINE_SECONDS))
+            if not done:
+                futures.append(executor.submit(attempt))
+
+        pending = set(futures)
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    if len(futures) > 1:
+                        latency_stats.record_hedge(won=future is futures[1])
+                    return future.result()
+                if isinstance(future.exception(), botocore.exceptions.ClientError):
+                    # S3 answered (missing key, not modified, ...), which a second copy would not change
+                    raise future.exception()
+                # Keep waiting for the other copy; the first error is raised if both fail
+                error = error or future.exception()
+
+        if error is not None and not pending:
+            if len(futures) > 1:
+                latency_stats.record_hedge(won=False)
+            raise error
+        latency_stats.record_deadline_exceeded()
+        raise S3DeadlineExceeded(f"Reading {bucket_name}/{stored_name} took longer than {S3_REQUEST_DEADLINE_SECONDS}s")
+
+    def fetch_objects(self, file_names, bucket_name, names=None, max_workers=S3_FETCH_MAX_WORKERS):
+        # Fetch several objects concurrently; results keep the input order and
+        # failures are reported per object instead of being dropped
+        names = names if names is not None else file_names
+
+        def fetch(name_and_file):
+            name, file_name = name_and_file
+            try:
+                return FetchResult(name, file_name, content=self.fetch_object(file_name, bucket_name))
+            except Exception as e:
+                return FetchResult(name, file_name, error=e)
+
+        if not file_names:
+            return []
+
+        workers = max(1, min(max_workers, len(file_names)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(in_current_span(fetch), zip(names, file_names)))
+
+    def fetch_dataset(self, file_name, bucket_name, loader=None, quarters=None):
+        # Parsed, shared view of a JSON dataset (parsed once per object version).
+        # With quarters given, only the matching partitions are downloaded when the dataset is partitioned.
+        registry = get_dataset_registry()
+        if quarters is None:
+            return registry.get(self, file_name, bucket_name, loader or Dataset)
+        return registry.get_partitions(self, file_name, bucket_name, quarters, loader or Dataset)
+
+    def fetch_frame(self, file_name, bucket_name, columns=None, filters=None, builder=None):
+        # DataFrame view of a dataset. Reads the Parquet copy when there is one, pushing the
+        # column projection and filters down to pyarrow; otherwise falls back to the JSON file.
+        registry = get_dataset_registry()
+        builder_name = builder.__name__ if builder is not None else None
+        options = (tuple(columns) if columns else None, freeze_filters(filters), builder_name)
+
+        if pq is not None and self.object_exists(columnar_name(file_name), bucket_name) is not False:
+            path, etag = get_local_object_mirror().fetch(self.s3, columnar_name(file_name), bucket_name)
+            if path is not None:
+                def read_table(path):
+                    available = set(pq.read_schema(path).names)
+                    projected = [column for column in columns if column in available] if columns else None
+                    return pq.read_table(path, columns=projected, filters=filters or None, memory_map=True).to_pandas()
+
+                def read_parquet():
+                    with get_tracer().span("read_parquet", key=columnar_name(file_name)) as span:
+                        try:
+                            frame = read_table(path)
+                        except FileNotFoundError:
+                            # Evicted from the size-bounded mirror after the fetch above; copy it down again
+                            frame = read_table(get_local_object_mirror().fetch(self.s3, columnar_name(file_name), bucket_name)[0])
+                        span.set(rows=len(frame))
+                    return builder(frame) if builder is not None else frame
+                return registry.get_frame((bucket_name, columnar_name(file_name)) + options, etag, read_parquet)
+
+        body, etag = self.fetch_object_body(file_name, bucket_name)
+
+        def parse_json():
+            with get_tracer().span("parse_json_frame", key=file_name) as span:
+                frame = pd.DataFrame(json.loads(body))
+                span.set(bytes=len(body), rows=len(frame))
+                return frame
+
+        def read_json():
+            # The JSON is parsed once per version; each projection/filter combination is derived from it
+            frame = registry.get_frame((bucket_name, file_name), etag, parse_json)
+            frame = apply_frame_filters(frame, filters)
+            if columns:
+                frame = frame.reindex(columns=columns)
+            return builder(frame) if builder is not None else frame
+        return registry.get_frame((bucket_name, file_name) + options, etag, read_json)
+
+    def fetch_dataset_quarters(self, file_name, bucket_name):
+        # Quarters available in a dataset, read from its partition manifest when there is one
+        manifest = get_dataset_registry().get_partition_manifest(self, file_name, bucket_name)
+        if manifest is not None:
+            return [partition['quarter'] for partition in manifest['partitions']]
+        return self.fetch_dataset(file_name, bucket_name).dates()
+
+    def upload_object(self, data, file_name, bucket_name="hedgefunds", compression=None):
+        # With compression set, the object is stored as "<key>.gz" / "<key>.zst" and read back transparently
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+
+        if compression:
+            stored_name = file_name + COMPRESSION_SUFFIXES[compression]
+            stored_body = compress_body(data, compression)
+            response = self.s3.put_object(Bucket=bucket_name, Key=stored_name, Body=stored_body, ContentEncoding=compression)
+        else:
+            stored_name = file_name
+            stored_body = data
+            response = self.s3.put_object(Bucket=bucket_name, Key=stored_name, Body=stored_body)
+
+        self.object_cache.put(bucket_name, stored_name, data, response.get('ETag'))
+        if self.shared_cache is not None:
+            self.shared_cache.set(f"s3:{bucket_name}/{stored_name}", pack_shared_object(data, response.get('ETag')), SHARED_CACHE_OBJECT_TTL_SECONDS)
+        manifest = self.bucket_manifest(bucket_name)
+        if manifest is not None:
+            manifest.record_put(stored_name, len(stored_body), response.get('ETag'))
+        get_dataset_registry().forget_missing(bucket_name, file_name)
+
+    def upload_compressed_object(self, data, file_name, bucket_name="hedgefunds"):
+        return self.upload_object(data, file_name, bucket_name, compression=S3_UPLOAD_COMPRESSION or None)
+
+class Dataset:
+    def __init__(self, records):
+        # Records are wrapped read-only because every session shares this object
+        self.records = tuple(MappingProxyType(dict(obj)) for obj in records)
+
+        index = {}
+        fund_index = {}
+        for record in self.records:
+            index.setdefault((record.get('Fund Name'), record.get('Date')), []).append(record)
+            fund_index.setdefault(record.get('Fund Name'), []).append(record)
+        self.index = {key: tuple(value) for key, value in index.items()}
+        self.fund_index = {key: tuple(value) for key, value in fund_index.items()}
+        self._theme_index = None
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __len__(self):
+        return len(self.records)
+
+    def lookup(self, fund_name, date):
+        return self.index.get((fund_name, date), ())
+
+    def get(self, fund_name, date):
+        records = self.lookup(fund_name, date)
+        return records[0] if records else None
+
+    def records_for_fund(self, fund_name):
+        return self.fund_index.get(fund_name, ())
+
+    def fund_names(self):
+        return [fund_name for fund_name in self.fund_index if fund_name is not None]
+
+    def dates(self):
+        return list(set(record['Date'] for record in self.records if 'Date' in record))
+
+    def theme_index(self):
+        # Built on first use and shared with every session that holds this dataset
+        if self._theme_index is None:
+            self._theme_index = ThemeIndex(self)
+        return self._theme_index
+
+class ThemeIndex:
+    theme_fields = ('Macro', 'Asset Classes', 'Geographies')
+
+    def __init__(self, dataset):
+        self.records = dataset.records
+
+        postings = {field: {} for field in self.theme_fields}
+        date_postings = {}
+        fund_postings = {}
+        for record_id, record in enumerate(self.records):
+            for field in self.theme_fields:
+                if field in record:
+                    for theme in record[field].split(", "):
+                        theme = theme.strip()
+                        if theme:
+                            postings[field].setdefault(theme, []).append(record_id)
+            date_postings.setdefault(record.get('Date'), []).append(record_id)
+            fund_postings.setdefault(record.get('Fund Name'), []).append(record_id)
+
+        # Record ids are appended in increasing order, so every posting list is already sorted
+        self.postings = {
+            field: {theme: np.unique(ids) for theme, ids in themes.items()}
+            for field, themes in postings.items()
+        }
+        self.date_postings = {date: np.array(ids) for date, ids in date_postings.items()}
+        self.fund_postings = {fund: np.array(ids) for fund, ids in fund_postings.items()}
+
+    def themes(self, field):
+        return sorted(self.postings.get(field, {}))
+
+    def union(self, posting_lists):
+        posting_lists = [ids for ids in posting_lists if ids is not None]
+        if not posting_lists:
+            return np.array([], dtype=int)
+        return np.unique(np.concatenate(posting_lists))
+
+    def match(self, field, themes, start_quarter, end_quarter, funds=None):
+        # Records tagged with any of the themes, within the quarter range and (optionally) the funds
+        field_postings = self.postings.get(field, {})
+        record_ids = self.union(field_postings.get(theme) for theme in themes)
+
+        start_ordinal = Quarter.parse(start_quarter).ordinal
+        end_ordinal = Quarter.parse(end_quarter).ordinal
+        date_ids = self.union(
+            ids for date, ids in self.date_postings.items()
+            if date and start_ordinal <= Quarter.parse(date).ordinal <= end_ordinal
+        )
+        record_ids = np.intersect1d(record_ids, date_ids, assume_unique=True)
+
+        if funds:
+            fund_ids = self.union(self.fund_postings.get(fund) for fund in funds)
+            record_ids = np.intersect1d(record_ids, fund_ids, assume_unique=True)
+
+        return [self.records[record_id] for record_id in record_ids]
+
+def frame_size(frame):
+    # Bytes held by a cached frame, including the Python objects in its object columns
+    if isinstance(frame, (pd.DataFrame, pd.Series)):
+        return int(np.sum(frame.memory_usage(deep=True)))
+    return sys.getsizeof(frame)
+
+def freeze_filters(filters):
+    # Hashable form of (column, operator, value) filters, so equal filters share one cached frame
+    if isinstance(filters, (list, tuple)):
+        return tuple(freeze_filters(item) for item in filters)
+    if isinstance(filters, (set, frozenset)):
+        return tuple(sorted(filters, key=repr))
+    return filters
+
+class DatasetRegistry:
+    # Parsed datasets and frames keyed by what they were built from, each with the version of its
+    # source object; least recently used entries are evicted once they hold more than max_bytes
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.datasets = OrderedDict()
+        self.current_bytes = 0
+        self.missing_manifests = {}
+        self.lock = threading.Lock()
+        self.parses = 0
+        self.evictions = 0
+
+    def lookup(self, key, version):
+        # (version, value, size) when the cached value was built from this version, else None
+        with self.lock:
+            cached = self.datasets.get(key)
+            if cached is None or version is None or cached[0] != version:
+                return None
+            self.datasets.move_to_end(key)
+            return cached
+
+    def store(self, key, version, value, size):
+        with self.lock:
+            old_entry = self.datasets.pop(key, None)
+            if old_entry is not None:
+                self.current_bytes -= old_entry[2]
+
+            # Values larger than the whole cache are returned but never stored
+            if size > self.max_bytes:
+                return
+            self.datasets[key] = (version, value, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self.datasets.popitem(last=False)
+                self.current_bytes -= evicted[2]
+                self.evictions += 1
+
+    def get(self, aws_operations, file_name, bucket_name, loader):
+        return self.load(aws_operations, file_name, bucket_name, loader)[1]
+
+    def load(self, aws_operations, file_name, bucket_name, loader):
+        # Returns (version, parsed dataset, size)
+        body, etag = aws_operations.fetch_object_body(file_name, bucket_name)
+        # Keyed by loader name, since Streamlit redefines the classes on every rerun
+        key = (bucket_name, file_name, loader.__name__)
+
+        cached = self.lookup(key, etag)
+        if cached is not None:
+            return cached
+
+        # New object version: parse it once and share the result
+        with get_tracer().span("parse_dataset", key=file_name) as span:
+            dataset = loader(json.loads(body))
+            span.set(bytes=len(body), rows=len(dataset))
+        # Sized by the JSON it was parsed from; measuring the parsed records would cost as much as parsing
+        self.store(key, etag, dataset, len(body))
+        with self.lock:
+            self.parses += 1
+        return etag, dataset, len(body)
+
+    def get_partition_manifest(self, aws_operations, file_name, bucket_name):
+        manifest_name = partition_manifest_name(file_name)
+        key = (bucket_name, manifest_name)
+
+        # Remember datasets without a manifest so unpartitioned datasets do not pay a failed GET every rerun
+        with self.lock:
+            missing_until = self.missing_manifests.get(key)
+        if missing_until is not None and missing_until > time.monotonic():
+            return None
+
+        try:
+            return self.get(aws_operations, manifest_name, bucket_name, dict)
+        except botocore.exceptions.ClientError as e:
+            if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+                with self.lock:
+                    self.missing_manifests[key] = time.monotonic() + OBJECT_CACHE_TTL_SECONDS
+                return None
+            raise e
+
+    def get_frame(self, key, version, read):
+        # Frames are shared between sessions like datasets, so callers must not modify them
+        cached = self.lookup(key, version)
+        if cached is not None:
+            return cached[1]
+
+        frame = read()
+        self.store(key, version, frame, frame_size(frame))
+        with self.lock:
+            self.parses += 1
+        return frame
+
+    def forget_missing(self, bucket_name, file_name):
+        with self.lock:
+            self.missing_manifests.pop((bucket_name, file_name), None)
+
+    def get_partitions(self, aws_operations, file_name, bucket_name, quarters, loader):
+        manifest = self.get_partition_manifest(aws_operations, file_name, bucket_name)
+        if manifest is None:
+            return self.get(aws_operations, file_name, bucket_name, loader)
+
+        # Partition pruning: only the quarters that were asked for are downloaded
+        wanted = set(str(Quarter.parse(quarter)) for quarter in quarters)
+        partition_names = [partition['key'] for partition in manifest['partitions'] if partition['quarter'] in wanted]
+
+        workers = max(1, min(S3_FETCH_MAX_WORKERS, len(partition_names)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            partitions = list(executor.map(in_current_span(lambda partition_name: self.load(aws_operations, partition_name, bucket_name, tuple)), partition_names))
+
+        # The combined view is cached per set of partition versions
+        key = (bucket_name, file_name, tuple(partition_names), loader.__name__)
+        version = tuple(etag for etag, _, _ in partitions)
+        if None in version:
+            version = None
+        cached = self.lookup(key, version)
+        if cached is not None:
+            return cached[1]
+
+        dataset = loader([record for _, records, _ in partitions for record in records])
+        self.store(key, version, dataset, sum(size for _, _, size in partitions))
+        return dataset
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.datasets),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "parses": self.parses,
+                "evictions": self.evictions,
+            }
+
+def write_quarter_partitions(aws_operations, file_name, bucket_name):
+    # Build step: split a dataset into one object per quarter plus a manifest
+    records = json.loads(aws_operations.fetch_object(file_name, bucket_name))
+
+    records_by_quarter = {}
+    for record in records:
+        records_by_quarter.setdefault(str(Quarter.parse(record['Date'])), []).append(record)
+
+    partitions = []
+    for quarter in sorted(records_by_quarter, key=Quarter.parse):
+        partition_name = f"{partition_prefix(file_name)}/{quarter}.json"
+        aws_operations.upload_compressed_object(json.dumps(records_by_quarter[quarter]), partition_name, bucket_name)
+        partitions.append({"quarter": quarter, "key": partition_name, "records": len(records_by_quarter[quarter])})
+
+    # The manifest is written last so readers never see it point at a missing partition
+    manifest = {"dataset": file_name, "partitions": partitions}
+    aws_operations.upload_compressed_object(json.dumps(manifest), partition_manifest_name(file_name), bucket_name)
+    return manifest
+
+@st.cache_resource
+def get_dataset_registry():
+    return DatasetRegistry(DATASET_CACHE_MAX_BYTES)
+
+def extract_answer(text):
+    # Extract the content within <answer></answer> tags if present; the same parser renders streamed
+    # answers, so the streamed text always ends up equal to this
+    parser = AnswerStreamParser()
+    return (parser.feed(text) + parser.flush()).strip()
+
+class AnswerStreamParser:
+    # Incrementally hides <thinking> blocks and keeps only the <answer> content of streamed text.
+    # Text outside <answer> is held back until the end: it is only shown when no answer tag ever comes.
+    tags = ("<thinking>", "</thinking>", "<answer>", "</answer>")
+
+    def __init__(self):
+        self.buffer = ""
+        self.in_thinking = False
+        self.in_answer = False
+        self.answered = False
+        self.held_back = []
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        visible = []
+
+        while self.buffer:
+            if self.in_thinking:
+                end = self.buffer.find("</thinking>")
+                if end == -1:
+                    # Keep just enough text to recognise a closing tag split across chunks
+                    self.buffer = self.buffer[-(len("</thinking>") - 1):]
+                    break
+                self.buffer = self.buffer[end + len("</thinking>"):]
+                self.in_thinking = False
+                continue
+
+            start = self.buffer.find("<")
+            if start == -1:
+                self.emit(self.buffer, visible)
+                self.buffer = ""
+                break
+
+            self.emit(self.buffer[:start], visible)
+            self.buffer = self.buffer[start:]
+
+            tag = next((tag for tag in self.tags if self.buffer.startswith(tag)), None)
+            if tag is not None:
+                self.buffer = self.buffer[len(tag):]
+                self.enter(tag)
+            elif any(tag.startswith(self.buffer) for tag in self.tags):
+                # Possibly the start of a tag; wait for the next chunk
+                break
+            else:
+                self.emit("<", visible)
+                self.buffer = self.buffer[1:]
+
+        return "".join(visible)
+
+    def enter(self, tag):
+        if tag == "<thinking>":
+            self.in_thinking = True
+        elif tag == "<answer>" and not self.answered:
+            self.in_answer = True
+            self.answered = True
+            self.held_back = []
+        elif tag == "</answer>" and self.in_answer:
+            self.in_answer = False
+
+    def emit(self, text, visible):
+        if self.in_answer:
+            visible.append(text)
+        elif not self.answered:
+            self.held_back.append(text)
+
+    def flush(self):
+        # A partial tag left at the end is plain text after all; held-back text is shown if no answer came
+        remaining = []
+        if not self.in_thinking:
+            self.emit(self.buffer, remaining)
+        self.buffer = ""
+        if not self.answered:
+            remaining = self.held_back
+            self.held_back = []
+        return "".join(remaining)
+
+class LLMLatencyStats:
+    def __init__(self, max_samples=500):
+        self.samples = deque(maxlen=max_samples)
+        self.lock = threading.Lock()
+
+    def record(self, mode, time_to_first_token, total_latency):
+        with self.lock:
+            self.samples.append({
+                "mode": mode,
+                "time_to_first_token": time_to_first_token,
+                "total_latency": total_latency,
+            })
+
+    def summary(self):
+        with self.lock:
+            samples = list(self.samples)
+        summary = {}
+        for mode in set(sample["mode"] for sample in samples):
+            mode_samples = [sample for sample in samples if sample["mode"] == mode]
+            summary[mode] = {
+                "calls": len(mode_samples),
+                "median_time_to_first_token": float(np.median([sample["time_to_first_token"] for sample in mode_samples])),
+                "median_total_latency": float(np.median([sample["total_latency"] for sample in mode_samples])),
+            }
+        return summary
+
+@st.cache_resource
+def get_llm_latency_stats():
+    return LLMLatencyStats()
+
+class TokenBucket:
+    # Holds up to capacity tokens, refilled continuously at rate tokens per second
+    def __init__(self, capacity, rate):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount):
+        # Seconds until amount tokens are available; requests larger than the bucket wait for a full bucket
+        self.refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount):
+        self.refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def give_back(self, amount):
+        self.refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+def is_retryable_llm_error(error):
+    if isinstance(error, (anthropic.RateLimitError, anthropic.APIConnectionError)):
+        return True
+    return isinstance(error, anthropic.APIStatusError) and error.status_code in (408, 429, 500, 502, 503, 504, 529)
+
+def retry_after_seconds(error):
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+class LLMScheduler:
+    # Every LLM call waits here for a concurrency slot and for request and token budget.
+    # Waiting calls are served strictly by priority, then arrival order.
+    def __init__(self, requests_per_minute, tokens_per_minute, max_concurrent, max_retries, retry_base_seconds, retry_max_seconds):
+        self.request_bucket = TokenBucket(max(1.0, requests_per_minute / 6), requests_per_minute / 60)
+        self.token_bucket = TokenBucket(tokens_per_minute, tokens_per_minute / 60)
+        self.max_concurrent = max_concurrent
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.condition = threading.Condition()
+        self.queue = []
+        self.sequence = itertools.count()
+        self.active = 0
+        self.max_queue_depth = 0
+        self.waits = {}
+        self.retries = 0
+        self.rate_limited = 0
+        self.failures = 0
+
+    def acquire(self, priority, tokens):
+        ticket = (priority, next(self.sequence))
+        enqueued_at = time.monotonic()
+        with self.condition:
+            heapq.heappush(self.queue, ticket)
+            self.max_queue_depth = max(self.max_queue_depth, len(self.queue))
+            while True:
+                if self.queue[0] == ticket and self.active < self.max_concurrent:
+                    wait_seconds = max(self.request_bucket.wait_time(1), self.token_bucket.wait_time(tokens))
+                    if wait_seconds == 0:
+                        heapq.heappop(self.queue)
+                        self.request_bucket.take(1)
+                        self.token_bucket.take(tokens)
+                        self.active += 1
+                        self.record_wait(priority, time.monotonic() - enqueued_at)
+                        self.condition.notify_all()
+                        return
+                    self.condition.wait(wait_seconds)
+                else:
+                    self.condition.wait()
+
+    def release(self, reserved_tokens, used_tokens):
+        with self.condition:
+            self.active -= 1
+            if used_tokens is not None and used_tokens < reserved_tokens:
+                # The reservation used max_tokens for the answer; return what was not used
+                self.token_bucket.give_back(reserved_tokens - used_tokens)
+            self.condition.notify_all()
+
+    def record_wait(self, priority, seconds):
+        # Called with the lock held
+        count, total, longest = self.waits.get(priority, (0, 0.0, 0.0))
+        self.waits[priority] = (count + 1, total + seconds, max(longest, seconds))
+
+    def run(self, call, tokens, priority=LLM_PRIORITY_INTERACTIVE, can_retry=None):
+        # call() returns (result, used_tokens); retryable API errors are retried with jittered exponential backoff
+        attempt = 0
+        while True:
+            self.acquire(priority, tokens)
+            used_tokens = None
+            try:
+                result, used_tokens = call()
+                return result
+            except Exception as e:
+                retryable = is_retryable_llm_error(e) and attempt < self.max_retries and (can_retry is None or can_retry())
+                with self.condition:
+                    self.rate_limited += isinstance(e, anthropic.RateLimitError)
+                    if retryable:
+                        self.retries += 1
+                    else:
+                        self.failures += 1
+                if not retryable:
+                    raise e
+                delay = retry_after_seconds(e)
+                if delay is None:
+                    delay = random.uniform(0, min(self.retry_max_seconds, self.retry_base_seconds * 2 ** attempt))
+                print(f"LLM call failed ({type(e).__name__}), retrying in {delay:.1f}s")
+                attempt += 1
+            finally:
+                self.release(tokens, used_tokens)
+            time.sleep(delay)
+
+    def stats(self):
+        with self.condition:
+            return {
+                "queue_depth": len(self.queue),
+                "max_queue_depth": self.max_queue_depth,
+                "active": self.active,
+                "retries": self.retries,
+                "rate_limited": self.rate_limited,
+                "failures": self.failures,
+                "waits": {
+                    priority: {"calls": count, "mean_seconds": total / count, "max_seconds": longest}
+                    for priority, (count, total, longest) in self.waits.items()
+                },
+            }
+
+@st.cache_resource
+def get_llm_scheduler():
+    # Shared by every session in the process so the limits hold for the whole server
+    return LLMScheduler(LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE, LLM_MAX_CONCURRENT_REQUESTS, LLM_MAX_RETRIES, LLM_RETRY_BASE_SECONDS, LLM_RETRY_MAX_SECONDS)
+
+def sdk_arguments(request):
+    # Newer SDKs no longer take temperature as a keyword, so it is sent in the request body as is
+    arguments = {name: value for name, value in request.items() if name != "temperature"}
+    if "temperature" in request:
+        arguments["extra_body"] = {"temperature": request["temperature"]}
+    return arguments
+
+def request_tokens(request):
+    # Budget reserved for a request: estimated prompt tokens plus the longest possible answer
+    prompt_text = request["system"] + "".join(block["text"] for message in request["messages"] for block in message["content"])
+    return estimate_tokens(prompt_text) + request["max_tokens"]
+
+def content_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def estimate_tokens(text):
+    # Roughly four characters per token for English prose; good enough for budgeting
+    return len(text) // 4 + 1
+
+class ResponseCache:
+    def __init__(self, path, max_bytes):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS response_documents ("
+            "key TEXT NOT NULL, document TEXT NOT NULL, content_hash TEXT NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS response_documents_document ON response_documents (document)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS response_documents_key ON response_documents (key)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+
+    def make_key(self, request, documents):
+        # documents are (name, content hash) pairs for every letter included in the prompt
+        payload = {
+            "model": request["model"],
+            "system": request["system"],
+            "messages": request["messages"],
+            "temperature": request["temperature"],
+            "max_tokens": request["max_tokens"],
+            "documents": [list(document) for document in documents],
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            row = self.connection.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.connection.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, response, documents):
+        now = time.time()
+        with self.lock:
+            self.connection.execute("BEGIN")
+            try:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (key, response, len(response.encode('utf-8')), now, now)
+                )
+                self.connection.execute("DELETE FROM response_documents WHERE key = ?", (key,))
+                self.connection.executemany(
+                    "INSERT INTO response_documents (key, document, content_hash) VALUES (?, ?, ?)",
+                    [(key, name, document_hash) for name, document_hash in documents]
+                )
+                self.connection.execute("COMMIT")
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.evict()
+
+    def evict(self):
+        # Drop the least recently used responses until the cache is back under its size budget
+        total_bytes = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        while total_bytes > self.max_bytes:
+            rows = self.connection.execute("SELECT key, size FROM responses ORDER BY last_access LIMIT 100").fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self.delete(key)
+                total_bytes -= size
+                if total_bytes <= self.max_bytes:
+                    break
+
+    def delete(self, key):
+        self.connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+        self.connection.execute("DELETE FROM response_documents WHERE key = ?", (key,))
+
+    def invalidate_document(self, document):
+        # Remove every cached response that was generated from the named letter
+        with self.lock:
+            keys = [row[0] for row in self.connection.execute("SELECT DISTINCT key FROM response_documents WHERE document = ?", (document,))]
+            for key in keys:
+                self.delete(key)
+        return len(keys)
+
+    def invalidate_letter(self, file_name):
+        # "fund/cleaned/Fund Name 2023 Q4.txt" -> "Fund Name 2023 Q4"
+        return self.invalidate_document(os.path.splitext(os.path.basename(file_name))[0])
+
+    def stats(self):
+        with self.lock:
+            entries, total_bytes = self.connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entries,
+                "bytes": total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+@st.cache_resource
+def get_response_cache():
+    return ResponseCache(LLM_CACHE_PATH, LLM_CACHE_MAX_BYTES)
+
+class Job:
+    def __init__(self, label):
+        self.id = uuid.uuid4().hex
+        self.label = label
+        self.status = "queued"
+        self.progress = "Waiting for a worker"
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+
+    @property
+    def done(self):
+        return self.status in ("done", "failed")
+
+    @contextlib.contextmanager
+    def stage(self, progress):
+        # Same shape as st.spinner, so code shared with the UI path can report progress either way
+        self.progress = progress
+        yield
+
+class JobManager:
+    # Runs work on a process-wide worker pool; sessions keep only job ids, so results survive reruns
+    def __init__(self, max_workers, result_ttl_seconds):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analysis-job")
+        self.result_ttl_seconds = result_ttl_seconds
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def submit(self, label, function):
+        # function(job) returns the job's result; it must not call Streamlit, which only works in the script thread
+        job = Job(label)
+        with self.lock:
+            self.expire()
+            self.jobs[job.id] = job
+        self.executor.submit(self.run, job, function)
+        return job.id
+
+    def run(self, job, function):
+        job.status = "running"
+        job.progress = "Starting"
+        try:
+            with get_tracer().span("job", label=job.label):
+                job.result = function(job)
+            job.status = "done"
+        except Exception as e:
+            print(f"Job '{job.label}' failed: {str(e)}")
+            job.error = str(e)
+            job.status = "failed"
+        job.finished_at = time.time()
+
+    def expire(self):
+        # Called with the lock held; finished jobs are kept for result_ttl_seconds
+        now = time.time()
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.done and now - job.finished_at > self.result_ttl_seconds]:
+            del self.jobs[job_id]
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def stats(self):
+        with self.lock:
+            return dict(Counter(job.status for job in self.jobs.values()))
+
+@st.cache_resource
+def get_job_manager():
+    return JobManager(JOB_MAX_WORKERS, JOB_RESULT_TTL_SECONDS)
+
+def run_periodically(function, seconds):
+    # Reruns only this part of the page every few seconds (st.fragment, or st.experimental_fragment on older
+    # releases); without fragment support the content is refreshed on the next full rerun instead
+    fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+    if fragment is None:
+        function()
+        return
+    fragment(run_every=seconds)(function)()
 
 class AIResponseGenerator:
-    def __init__(self, api_key):
+    def __init__(self, api_key, stream=LLM_STREAMING):
         self.api_key = api_key
+        self.stream = stream
 
-    def generate_response(self, prompt, system_prompt, partner_letters, fund_names_dates):
-        client = anthropic.Anthropic(api_key=self.api_key)
-        
+    def tag_letter(self, letter, fund_name_date):
+        # Create XML tags for the document
+        fund_name, date = fund_name_date.lower().split(" ", 1)
+        fund_name = fund_name.replace(" ", "")
+        quarter = date.split(" ")[0].lower()
+        year = date.split(" ")[1]
+        tag = f"<{fund_name}_{year}_{quarter}>"
+        return f"{tag}\n{letter}\n</{fund_name}_{year}_{quarter}>"
+
+    def generate_response(self, prompt, system_prompt, partner_letters, fund_names_dates, priority=LLM_PRIORITY_INTERACTIVE):
+        user_text, documents = self.prepare_response(prompt, partner_letters, fund_names_dates, priority, st.spinner)
+        self.render_completion(system_prompt, user_text, documents, priority)
+
+    def compute_response(self, prompt, system_prompt, partner_letters, fund_names_dates, priority=LLM_PRIORITY_INTERACTIVE, stage=contextlib.nullcontext):
+        # Same answer as generate_response, returned instead of rendered, so it can run outside the script thread
+        user_text, documents = self.prepare_response(prompt, partner_letters, fund_names_dates, priority, stage)
+        with stage("Writing the analysis"):
+            return extract_answer(self.complete(system_prompt, user_text, documents, priority=priority))
+
+    def prepare_response(self, prompt, partner_letters, fund_names_dates, priority, stage):
+        # Returns the user message and its documents; stage(message) wraps the slow map step (e.g. st.spinner)
         # Create XML tags for each document
         tagged_letters = []
+        documents = []
         for letter, fund_name_date in zip(partner_letters, fund_names_dates):
-            fund_name, date = fund_name_date.lower().split(" ", 1)
-            fund_name = fund_name.replace(" ", "")
-            quarter = date.split(" ")[0].lower()
-            year = date.split(" ")[1]
-            tag = f"<{fund_name}_{year}_{quarter}>"
-            tagged_letter = f"{tag}\n{letter}\n</{fund_name}_{year}_{quarter}>"
-            tagged_letters.append(tagged_letter)
+            documents.append((fund_name_date, content_hash(letter)))
+            tagged_letters.append(self.tag_letter(letter, fund_name_date))
+
+        # Too many letters for a single call: extract per batch in parallel, then combine
+        if sum(estimate_tokens(tagged_letter) for tagged_letter in tagged_letters) > LLM_CONTEXT_TOKEN_BUDGET:
+            return self.prepare_map_reduce_response(prompt, partner_letters, fund_names_dates, documents, priority, stage), documents
         
         combined_letters = "\n\n".join(tagged_letters)
-        
-        message = client.messages.create(
-            model=CLAUDE_HAIKU,
-            max_tokens=2000,
-            temperature=0.2,
-            system=system_prompt,
-            messages=[
+
+        return f"{combined_letters}\n\n{prompt}", documents
+
+    def build_map_batches(self, partner_letters, fund_names_dates, documents):
+        # Pack letters into batches under LLM_MAP_BATCH_TOKENS; letters that are too long on their own are split
+        max_chars = LLM_MAP_BATCH_TOKENS * 4
+        pieces = []
+        for letter, fund_name_date, document in zip(partner_letters, fund_names_dates, documents):
+            parts = [letter[start:start + max_chars] for start in range(0, len(letter), max_chars)] or [""]
+            for part_number, part in enumerate(parts, start=1):
+                if len(parts) > 1:
+                    part = f"(Part {part_number} of {len(parts)})\n{part}"
+                pieces.append((fund_name_date, self.tag_letter(part, fund_name_date), document))
+
+        batches = []
+        batch = []
+        batch_tokens = 0
+        for fund_name_date, tagged_letter, document in pieces:
+            tokens = estimate_tokens(tagged_letter)
+            if batch and batch_tokens + tokens > LLM_MAP_BATCH_TOKENS:
+                batches.append(batch)
+                batch = []
+                batch_tokens = 0
+            batch.append((fund_name_date, tagged_letter, document))
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def extract_batch_notes(self, prompt, batch, priority=LLM_PRIORITY_INTERACTIVE):
+        # Map step: pull the commentary relevant to the task out of one batch of letters
+        titles = list(dict.fromkeys(fund_name_date for fund_name_date, _, _ in batch))
+        system_prompt = "You are an experienced investment analyst. You will receive hedge fund partner letters, each identified by XML tags at the top and bottom of the letter. \
+            Extract every piece of commentary from these letters that is relevant to the task given after the letters. Quote or closely paraphrase the letters and do not add your own analysis. \
+                End every note with the title of the letter it came from in brackets, for example [Greenlight Capital 2023 Q4]. Output only the notes within <answer> </answer> XML tags."
+        combined_letters = "\n\n".join(tagged_letter for _, tagged_letter, _ in batch)
+        user_text = f"{combined_letters}\n\nThe titles of the letters above are: {', '.join(titles)}. Use exactly these titles in your citations.\n\nTask:\n{prompt}"
+        documents = list(dict.fromkeys(document for _, _, document in batch))
+        return extract_answer(self.complete(system_prompt, user_text, documents, priority=priority))
+
+    def prepare_map_reduce_response(self, prompt, partner_letters, fund_names_dates, documents, priority, stage):
+        batches = self.build_map_batches(partner_letters, fund_names_dates, documents)
+
+        with stage(f"Analyzing {len(partner_letters)} letters in {len(batches)} batches..."):
+            with ThreadPoolExecutor(max_workers=max(1, min(LLM_MAP_CONCURRENCY, len(batches)))) as executor:
+                batch_notes = list(executor.map(in_current_span(lambda batch: self.extract_batch_notes(prompt, batch, priority)), batches))
+
+        # Reduce step: compare and contrast the extracted notes, keeping their citations
+        combined_notes = "\n\n".join(batch_notes)
+        user_text = f"<extracted_notes>\n{combined_notes}\n</extracted_notes>\n\nThe partner letters were too long to attach in full, so the notes above were extracted from them. \
+Each note ends with the title of the letter it came from in brackets. Treat these notes as the content of the letters and keep their bracketed citations in your answer.\n\n{prompt}"
+
+        return user_text
+
+    def create_client(self):
+        return get_client_provider().get_anthropic(self.api_key)
+
+    def build_request(self, system_prompt, user_text):
+        return {
+            "model": CLAUDE_HAIKU,
+            "max_tokens": 2000,
+            "temperature": 0.2,
+            "system": system_prompt,
+            "messages": [
                 {
                     "role": "user",
                     "content": [
                         {
                             "type": "text",
-                            "text": f"{combined_letters}\n\n{prompt}"
+                            "text": user_text
                         }
                     ]
                 }
             ]
-        )
-        
-        raw_text = message.content
-        answer = raw_text[0].text
-        
-        # Extract the content within <answer></answer> tags if present
-        answer_match = re.search(r'<answer>(.*?)</answer>', answer, re.DOTALL)
-        if answer_match:
-            answer = answer_match.group(1).strip()
-        
-        st.write(answer)
+        }
+
+    def complete(self, system_prompt, user_text, documents=(), on_text=None, priority=LLM_PRIORITY_INTERACTIVE):
+        # Returns the raw answer text, from the response cache when the same request was seen before
+        request = self.build_request(system_prompt, user_text)
+        response_cache = get_response_cache()
+        key = response_cache.make_key(request, documents)
+
+        raw_text = response_cache.get(key)
+        if raw_text is not None:
+            return raw_text
+
+        def generate():
+            generated.append(True)
+            if on_text is not None:
+                return self.stream_completion(request, on_text, priority).encode('utf-8')
+            return self.create_completion(request, priority).encode('utf-8')
+
+        def generate_shared():
+            shared_cache = get_shared_cache()
+            if shared_cache is not None:
+                # The key covers the documents' content hashes, so shared answers never outlive a changed letter
+                return shared_cache.fill(f"llm:{key}", generate, SHARED_CACHE_LLM_TTL_SECONDS)
+            return generate()
+
+        # Identical prompts from concurrent sessions wait for one call instead of each calling the API
+        generated = []
+        raw_text = get_single_flight().do(("llm", key), generate_shared, SINGLE_FLIGHT_LLM_TIMEOUT_SECONDS).decode('utf-8')
+        if on_text is not None and not generated:
+            # Produced by another session or process, so there was nothing to stream
+            on_text(raw_text)
+
+        response_cache.put(key, raw_text, documents)
+        return raw_text
+
+    def create_completion(self, request, priority=LLM_PRIORITY_INTERACTIVE):
+        # Blocking call; returns the full raw text once the answer is complete
+        client = self.create_client()
+
+        def call():
+            with get_tracer().span("messages.create", model=request["model"]) as span:
+                started_at = time.perf_counter()
+                message = client.messages.create(**sdk_arguments(request))
+                total_latency = time.perf_counter() - started_at
+                span.set(input_tokens=message.usage.input_tokens, output_tokens=message.usage.output_tokens)
+            get_llm_latency_stats().record("blocking", total_latency, total_latency)
+            return message.content[0].text, message.usage.input_tokens + message.usage.output_tokens
+
+        return get_llm_scheduler().run(call, request_tokens(request), priority)
+
+    def stream_completion(self, request, on_text, priority=LLM_PRIORITY_INTERACTIVE):
+        # Streaming call; on_text receives each text delta as it arrives
+        client = self.create_client()
+        chunks = []
+
+        def call():
+            started_at = time.perf_counter()
+            time_to_first_token = None
+            with get_tracer().span("messages.stream", model=request["model"]) as span, client.messages.stream(**sdk_arguments(request)) as stream:
+                for text in stream.text_stream:
+                    if time_to_first_token is None:
+                        time_to_first_token = time.perf_counter() - started_at
+                    chunks.append(text)
+                    on_text(text)
+                usage = stream.get_final_message().usage
+                span.set(input_tokens=usage.input_tokens, output_tokens=usage.output_tokens, time_to_first_token_seconds=time_to_first_token)
+
+            total_latency = time.perf_counter() - started_at
+            get_llm_latency_stats().record("streaming", time_to_first_token if time_to_first_token is not None else total_latency, total_latency)
+            return "".join(chunks), usage.input_tokens + usage.output_tokens
+
+        # Once text has been shown, a retry would repeat it, so only failures before the first token are retried
+        return get_llm_scheduler().run(call, request_tokens(request), priority, can_retry=lambda: not chunks)
+
+    def render_completion(self, system_prompt, user_text, documents=(), priority=LLM_PRIORITY_INTERACTIVE):
+        if not self.stream:
+            st.write(extract_answer(self.complete(system_prompt, user_text, documents, priority=priority)))
+            return
+
+        placeholder = st.empty()
+        parser = AnswerStreamParser()
+        visible_text = []
+        last_render = [0.0]
+
+        def on_text(chunk):
+            visible = parser.feed(chunk)
+            if not visible:
+                return
+            visible_text.append(visible)
+            # Limit re-renders so long answers do not flood the frontend
+            now = time.perf_counter()
+            if now - last_render[0] > 0.05:
+                placeholder.write("".join(visible_text).strip() + " ▌")
+                last_render[0] = now
+
+        raw_text = self.complete(system_prompt, user_text, documents, on_text=on_text, priority=priority)
+
+        # The final render uses the complete text so it matches the non-streaming answer exactly
+        placeholder.write(extract_answer(raw_text))
 
 class DocumentFetcher:
     def __init__(self, aws_operations):
         self.aws_operations = aws_operations
 
+    @traced("fetch_partner_letters", measure=lambda results: {"letters": len(results), "bytes": sum(len(result.content) for result in results if result.ok)})
     def fetch_partner_letters(self, fund_names_dates):
-        partner_letters = []
+        # Returns one FetchResult per requested letter, in the same order
+        file_names = []
         for fund_name_date in fund_names_dates:
             parts = fund_name_date.split()
-            fund_name = " ".join(parts[:-2]).lower().replace(" ", "")
-            date = " ".join(parts[-2:])
-            file_name = f"{fund_name}/cleaned/{fund_name_date}.txt"
-            try:
-                letter_content = self.aws_operations.fetch_object(file_name, "hedgefunds")
-                partner_letters.append(letter_content)
-            except Exception as e:
-                print(f"File not found: {file_name}")
-                print(f"Error: {str(e)}")
-        return partner_letters
+            fund_prefix = self.aws_operations.fund_prefix(" ".join(parts[:-2]), "hedgefunds")
+            file_names.append(f"{fund_prefix}/cleaned/{fund_name_date}.txt")
+
+        results = self.aws_operations.fetch_objects(file_names, "hedgefunds", names=fund_names_dates)
+        for result in results:
+            if not result.ok:
+                print(f"File not found: {result.file_name}")
+                print(f"Error: {str(result.error)}")
+        return results
+
+def tokenize(text):
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+class PassageIndex:
+    def __init__(self, text, passage_words=PASSAGE_WORDS, overlap_words=PASSAGE_OVERLAP_WORDS, k1=1.5, b=0.75):
+        self.text = text
+        self.k1 = k1
+        self.b = b
+
+        # Split the letter into overlapping word windows, keeping character offsets for citations
+        words = [match.span() for match in re.finditer(r"\S+", text)]
+        step = max(1, passage_words - overlap_words)
+        self.passages = []
+        for first_word in range(0, len(words), step):
+            window = words[first_word:first_word + passage_words]
+            self.passages.append((window[0][0], window[-1][1]))
+            if first_word + passage_words >= len(words):
+                break
+
+        # Term -> passage postings in CSR layout: passages[indptr[t]:indptr[t + 1]] contain term t
+        self.vocabulary = {}
+        term_ids = []
+        passage_ids = []
+        frequencies = []
+        lengths = []
+        for passage_id, (start, end) in enumerate(self.passages):
+            counts = Counter(tokenize(text[start:end]))
+            lengths.append(sum(counts.values()))
+            for term, count in counts.items():
+                term_ids.append(self.vocabulary.setdefault(term, len(self.vocabulary)))
+                passage_ids.append(passage_id)
+                frequencies.append(count)
+
+        order = np.argsort(np.array(term_ids, dtype=np.int64), kind='stable')
+        self.posting_passages = np.array(passage_ids, dtype=np.int64)[order]
+        self.posting_frequencies = np.array(frequencies, dtype=np.float64)[order]
+        self.indptr = np.zeros(len(self.vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(np.array(term_ids, dtype=np.int64), minlength=len(self.vocabulary)), out=self.indptr[1:])
+
+        self.lengths = np.array(lengths, dtype=np.float64)
+        self.average_length = self.lengths.mean() if len(self.lengths) else 0.0
+        document_frequencies = np.diff(self.indptr)
+        self.idf = np.log(1 + (len(self.passages) - document_frequencies + 0.5) / (document_frequencies + 0.5))
+
+    def search(self, query, top_k=ASK_ANYTHING_TOP_K):
+        # Returns (passage id, start, end, score) for the best BM25 matches, in letter order
+        if not self.passages:
+            return []
+
+        scores = np.zeros(len(self.passages))
+        length_norm = self.k1 * (1 - self.b + self.b * self.lengths / max(self.average_length, 1.0))
+        for term in set(tokenize(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            postings = slice(self.indptr[term_id], self.indptr[term_id + 1])
+            passage_ids = self.posting_passages[postings]
+            frequencies = self.posting_frequencies[postings]
+            scores[passage_ids] += self.idf[term_id] * frequencies * (self.k1 + 1) / (frequencies + length_norm[passage_ids])
+
+        ranked = np.argsort(-scores, kind='stable')[:top_k]
+        ranked = ranked[scores[ranked] > 0]
+        if not len(ranked):
+            # Nothing matched the question; fall back to the start of the letter
+            ranked = np.arange(min(top_k, len(self.passages)))
+
+        return [
+            (int(passage_id), self.passages[passage_id][0], self.passages[passage_id][1], float(scores[passage_id]))
+            for passage_id in sorted(ranked)
+        ]
+
+    def build_excerpt(self, query, top_k=ASK_ANYTHING_TOP_K):
+        # Retrieved passages wrapped in tags that carry their id and character offsets
+        return "\n\n".join(
+            f'<passage id="{passage_id}" start="{start}" end="{end}">\n{self.text[start:end]}\n</passage>'
+            for passage_id, start, end, _ in self.search(query, top_k)
+        )
+
+class PassageIndexCache:
+    def __init__(self, max_letters=256):
+        self.max_letters = max_letters
+        self.indexes = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, letter):
+        key = content_hash(letter)
+        with self.lock:
+            index = self.indexes.get(key)
+            if index is not None:
+                self.indexes.move_to_end(key)
+                return index
+
+        index = PassageIndex(letter)
+        with self.lock:
+            self.indexes[key] = index
+            while len(self.indexes) > self.max_letters:
+                self.indexes.popitem(last=False)
+        return index
+
+@st.cache_resource
+def get_passage_index_cache():
+    return PassageIndexCache()
 
 def fetch_fund_names(aws_operations, bucket_name, fund_info_path):
-    # Fetch the JSON file from S3
-    json_data = aws_operations.fetch_object(fund_info_path, bucket_name)
-    fund_info_data = json.loads(json_data)
+    # Fetch the shared, parsed dataset
+    fund_info_data = aws_operations.fetch_dataset(fund_info_path, bucket_name)
 
     # Get unique fund names
-    fund_names = set(obj['Fund Name'].replace(", LP", "") for obj in fund_info_data)
+    fund_names = set(fund_name.replace(", LP", "") for fund_name in fund_info_data.fund_names())
 
     return list(fund_names)
 
+class StageMemo:
+    # Last result of each section stage in one session, with the inputs and bucket version it was computed from
+    def __init__(self):
+        self.entries = {}
+        self.rerun = 0
+        self.reused = []
+        self.computed = []
+
+    def start_rerun(self):
+        self.rerun += 1
+        self.reused = []
+        self.computed = []
+
+    def get(self, stage, inputs, version, compute):
+        with get_tracer().span(f"stage.{stage}") as span:
+            entry = self.entries.get(stage)
+            # Without a bucket version a result cannot be checked for staleness, so it only lives for its rerun
+            if entry is not None and entry[0] == inputs and entry[1] == version and (entry[2] == self.rerun or (RERUN_MEMO_ENABLED and version is not None)):
+                self.reused.append(stage)
+                span.set(reused=1)
+                return entry[3]
+
+            value = compute()
+            self.entries[stage] = (inputs, version, self.rerun, value)
+            self.computed.append(stage)
+            span.set(reused=0)
+            return value
+
+    def stats(self):
+        return {"stages": len(self.entries), "reused": list(self.reused), "computed": list(self.computed)}
+
+def get_stage_memo():
+    # One memo per browser session
+    if "stage_memo" not in st.session_state:
+        st.session_state["stage_memo"] = StageMemo()
+    return st.session_state["stage_memo"]
+
+def memoized_stage(bucket_name=None):
+    # Decorator for section methods: the result is reused on later reruns of the session while the
+    # arguments and the version of bucket_name (default: the section's bucket_name) are unchanged.
+    # Results are shared with later reruns, so callers must not modify them.
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(self, *args):
+            inputs = tuple(tuple(arg) if isinstance(arg, list) else arg for arg in args)
+            version = self.aws_operations.dataset_version(bucket_name or self.bucket_name)
+            return get_stage_memo().get(function.__qualname__, inputs, version, lambda: function(self, *args))
+        return wrapper
+    return decorate
+
+EQUITY_COLUMNS = ["Fund", "Date", "Company", "Ticker", "Sector", "Thesis", "PositionType", "PositionOpen", "PositionClose"]
+INVESTMENT_COLUMNS = ["Fund", "Date", "Company", "Type of Investment", "Amount Invested", "Date invested", "Fair Value of the Investment", "Summary"]
+
+@traced("build_equities_frame", measure=lambda frame: {"rows": len(frame)})
+def build_equities_frame(records):
+    # Typed, columnar view of a fund's equities
+    df = pd.DataFrame(records)
+    if df.empty:
+        return df
+
+    df['Sector'] = df['Sector'].astype('category')
+    df['PositionType'] = df['PositionType'].astype('category')
+
+    # Convert each distinct quarter once instead of once per row
+    quarter_ordinals = {quarter: Quarter.parse(quarter).ordinal for quarter in df['Date'].unique()}
+    df['QuarterOrdinal'] = df['Date'].map(quarter_ordinals).astype('int32')
+
+    df['IsPositionOpen'] = df['PositionOpen'].astype(str) != '0'
+    df['IsPositionClose'] = df['PositionClose'].astype(str) != '0'
+    return df
+
 class OpportunityScout:
     def __init__(self, aws_operations, bucket_name):
         self.aws_operations = aws_operations
         self.bucket_name = bucket_name
 
-    def fetch_json_data(self, formatted_fund_name):
-        json_file_path = f"{formatted_fund_name}/{formatted_fund_name}_equities.json"
+    def fetch_equities_frame(self, formatted_fund_name):
+        fund_prefix = self.aws_operations.fund_prefix(formatted_fund_name, self.bucket_name)
+        json_file_path = f"{fund_prefix}/{fund_prefix}_equities.json"
 
         try:
-            json_data = self.aws_operations.fetch_object(json_file_path, self.bucket_name)
-            json_data = json.loads(json_data)
-            return json_data
+            return self.aws_operations.fetch_frame(json_file_path, self.bucket_name, columns=EQUITY_COLUMNS, builder=build_equities_frame)
         except botocore.exceptions.ClientError as e:
             if e.response['Error']['Code'] == 'NoSuchKey':
                 print(f"JSON file not found for fund: {formatted_fund_name}")
@@ -132,47 +3066,58 @@ class OpportunityScout:
             else:
                 raise e
 
-    def filter_companies(self, json_data, sectors, start_quarter, end_quarter, position_status, position_type):
-        filtered_companies = []
-
-        for company in json_data:
-            if sectors and company['Sector'] not in sectors:
-                continue
+    @memoized_stage()
+    def load_equities_frame(self, selected_funds):
+        # Each fund's equities are loaded once and concatenated into a single frame
+        workers = max(1, min(S3_FETCH_MAX_WORKERS, len(selected_funds)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            frames = [frame for frame in executor.map(in_current_span(self.fetch_equities_frame), selected_funds) if frame is not None and not frame.empty]
+
+        if frames:
+            df = pd.concat(frames, ignore_index=True)
+            # Concatenating frames with different categories falls back to object dtype
+            df['Sector'] = df['Sector'].astype('category')
+            df['PositionType'] = df['PositionType'].astype('category')
+        else:
+            df = pd.DataFrame()
 
-            pitch_quarter = company['Date']
+        return df
 
-            if start_quarter and end_quarter:
-                if pitch_quarter < start_quarter or pitch_quarter > end_quarter:
-                    continue
+    @traced("OpportunityScout.filter_companies", measure=lambda frame: {"rows": len(frame)})
+    def filter_companies(self, equities_frame, sectors, start_quarter, end_quarter, position_status, position_type):
+        if equities_frame.empty:
+            return equities_frame
 
-            if position_status == "Position Added" and str(company['PositionOpen']) == '0':
-                continue
-            if position_status == "Position Exited" and str(company['PositionClose']) == '0':
-                continue
+        mask = np.ones(len(equities_frame), dtype=bool)
 
-            if position_type != "Both" and company['PositionType'] != position_type:
-                continue
+        if sectors:
+            mask &= equities_frame['Sector'].isin(sectors).to_numpy()
 
-            filtered_companies.append(company)
+        if start_quarter and end_quarter:
+            quarter_ordinals = equities_frame['QuarterOrdinal'].to_numpy()
+            mask &= (quarter_ordinals >= Quarter.parse(start_quarter).ordinal) & (quarter_ordinals <= Quarter.parse(end_quarter).ordinal)
 
-        return filtered_companies
+        if position_status == "Position Added":
+            mask &= equities_frame['IsPositionOpen'].to_numpy()
+        if position_status == "Position Exited":
+            mask &= equities_frame['IsPositionClose'].to_numpy()
 
-    def aggregate_companies(self, selected_funds, sectors, start_quarter, end_quarter, position_status, position_type):
-        aggregated_companies = []
+        if position_type != "Both":
+            mask &= (equities_frame['PositionType'] == position_type).to_numpy()
 
-        for fund_name in selected_funds:
-            json_data = self.fetch_json_data(fund_name)
-            filtered_companies = self.filter_companies(json_data, sectors, start_quarter, end_quarter, position_status, position_type)
-            aggregated_companies.extend(filtered_companies)
+        return equities_frame[mask]
 
-        return aggregated_companies
+    @memoized_stage()
+    def aggregate_companies(self, selected_funds, sectors, start_quarter, end_quarter, position_status, position_type):
+        equities_frame = self.load_equities_frame(selected_funds)
+        return self.filter_companies(equities_frame, sectors, start_quarter, end_quarter, position_status, position_type)
 
     def display_companies(self, aggregated_companies):
-        if not aggregated_companies:
+        if aggregated_companies.empty:
             st.write("No companies found matching the selected criteria.")
             return
 
-        df = pd.DataFrame(aggregated_companies)
+        df = aggregated_companies
         
         # Rename the columns
         df = df.rename(columns={
@@ -190,31 +3135,26 @@ class OpportunityScout:
         
         st.dataframe(df)
 
+    @memoized_stage()
     def get_top_sectors(self, selected_funds, start_quarter, end_quarter):
-        sector_counts = {}
+        equities_frame = self.load_equities_frame(selected_funds)
+        filtered_companies = self.filter_companies(equities_frame, None, start_quarter, end_quarter, "Both", "Both")
+        if filtered_companies.empty:
+            return []
 
-        for fund_name in selected_funds:
-            json_data = self.fetch_json_data(fund_name)
-            filtered_companies = self.filter_companies(json_data, None, start_quarter, end_quarter, "Both", "Both")
-
-            for company in filtered_companies:
-                sector = company['Sector']
-                if sector in sector_counts:
-                    sector_counts[sector] += 1
-                else:
-                    sector_counts[sector] = 1
-
-        sorted_sectors = sorted(sector_counts.items(), key=lambda x: x[1], reverse=True)
-        top_sectors = sorted_sectors[:3]
+        sector_counts = filtered_companies.groupby('Sector', observed=True).size()
+        sector_counts = sector_counts.sort_values(ascending=False, kind='stable')
+        top_sectors = [(sector, int(count)) for sector, count in sector_counts.head(3).items()]
 
         return top_sectors
     
+    @traced("OpportunityScout.run")
     def run(self, fund_type, selected_funds):
         if not selected_funds:
             st.write("**Please Select At Least One Fund In The Side Bar**")
             return
 
-        quarters = ["2022 Q3", "2022 Q4", "2023 Q1", "2023 Q2", "2023 Q3", "2023 Q4", "2024 Q1"]
+        quarters = quarter_options(self.aws_operations.fetch_dataset_quarters("hedgefund_general_insights.json", "hedgefunds"))
         start_quarter, end_quarter = st.sidebar.select_slider("Select Date Range", options=quarters, value=(quarters[0], quarters[-1]))
 
         if selected_funds:
@@ -248,15 +3188,15 @@ class PerformancePulse:
     def __init__(self, aws_operations):
         self.aws_operations = aws_operations
 
+    @memoized_stage("hedgefunds")
     def fetch_performance_data(self, selected_funds, selected_quarter):
-        # Fetch the performance data from the JSON file in the S3 bucket
-        performance_data = self.aws_operations.fetch_object("hedgefund_performance_insights.json", "hedgefunds")
-        performance_data = json.loads(performance_data)
+        # Fetch the performance data for the selected quarter from the S3 bucket
+        performance_data = self.aws_operations.fetch_dataset("hedgefund_performance_insights.json", "hedgefunds", quarters=[selected_quarter])
 
-        # Filter the performance data based on the selected funds and quarter
+        # Look up the records for the selected funds and quarter
         filtered_data = [
-            obj for obj in performance_data
-            if obj['Fund Name'] in selected_funds and obj['Date'] == selected_quarter
+            obj for fund in selected_funds
+            for obj in performance_data.lookup(fund, selected_quarter)
         ]
 
         return filtered_data
@@ -285,26 +3225,26 @@ class PerformancePulse:
         except (ValueError, TypeError):
             return value
 
+    @traced("PerformancePulse.run")
     def run(self, selected_funds):
         if not selected_funds:
             st.write("**Please select at least one fund to view performance data.**")
             return
 
-        # Fetch the performance insights data from the JSON file in the S3 bucket
-        performance_insights_data = self.aws_operations.fetch_object("hedgefund_performance_insights.json", "hedgefunds")
-        performance_insights_data = json.loads(performance_insights_data)
-
-        # Extract unique quarters from the performance insights data
-        quarters = list(set(obj['Date'] for obj in performance_insights_data))
-        quarters.sort(reverse=True)
+        # Extract the available quarters of the performance insights data
+        quarters = self.aws_operations.fetch_dataset_quarters("hedgefund_performance_insights.json", "hedgefunds")
+        quarters.sort(key=Quarter.parse, reverse=True)
 
         selected_quarter = st.selectbox("Select a quarter", options=quarters)
 
+        # Fetch only the selected quarter of the performance insights data
+        performance_insights_data = self.aws_operations.fetch_dataset("hedgefund_performance_insights.json", "hedgefunds", quarters=[selected_quarter])
+
         if selected_funds:
             # Check if "All" is selected
             if "All" in selected_funds:
                 # Get all unique fund names from the performance insights data
-                selected_funds = list(set(obj['Fund Name'] for obj in performance_insights_data))
+                selected_funds = performance_insights_data.fund_names()
 
             filtered_data = self.fetch_performance_data(selected_funds, selected_quarter)
 
@@ -319,7 +3259,7 @@ class PerformancePulse:
                 if st.button("Submit"):
                     # Display the selected commentary for each fund
                     for fund in selected_funds:
-                        fund_data = next((obj for obj in performance_insights_data if obj['Fund Name'] == fund and obj['Date'] == selected_quarter), None)
+                        fund_data = performance_insights_data.get(fund, selected_quarter)
 
                         if fund_data:
                             st.markdown(f"**{fund}**")
@@ -353,25 +3293,21 @@ class MarketMoodMonitor:
         self.fund_info_path = fund_info_path
         self.document_fetcher = document_fetcher
 
-    def fetch_fund_info_data(self):
-        fund_info_data = self.aws_operations.fetch_object(self.fund_info_path, "hedgefunds")
-        fund_info_data = json.loads(fund_info_data)
+    def fetch_fund_info_data(self, quarters=None):
+        fund_info_data = self.aws_operations.fetch_dataset(self.fund_info_path, "hedgefunds", quarters=quarters)
         return fund_info_data
     
     def get_unique_values(self, fund_info_data, key):
-        values = set()
-        for obj in fund_info_data:
-            if key in obj:
-                values.update(obj[key].split(", "))
-        return list(values)
+        return fund_info_data.theme_index().themes(key)
 
     def handle_theme_specific(self, fund_info_data, analysis_type, selected_funds, start_quarter, end_quarter):
         if analysis_type == 'Market Commentary':
-            themes = self.get_unique_values(fund_info_data, 'Macro')
+            theme_field = 'Macro'
         elif analysis_type == 'Asset Class':
-            themes = self.get_unique_values(fund_info_data, 'Asset Classes')
+            theme_field = 'Asset Classes'
         elif analysis_type == 'Geography':
-            themes = self.get_unique_values(fund_info_data, 'Geographies')
+            theme_field = 'Geographies'
+        themes = self.get_unique_values(fund_info_data, theme_field)
 
         selected_themes = st.multiselect(f'Select {analysis_type.lower()} themes:', themes)
 
@@ -379,22 +3315,8 @@ class MarketMoodMonitor:
             # Add text to inform users about uploading documents
             st.write("**You can upload a maximum of 5 documents to filter in the sidebar.**")
 
-            # Filter the fund_info_data based on the selected themes
-            filtered_funds_data = []
-            for obj in fund_info_data:
-                if analysis_type == 'Market Commentary' and any(theme in obj.get('Macro', '') for theme in selected_themes):
-                    filtered_funds_data.append(obj)
-                elif analysis_type == 'Asset Class' and any(theme in obj.get('Asset Classes', '') for theme in selected_themes):
-                    filtered_funds_data.append(obj)
-                elif analysis_type == 'Geography' and any(theme in obj.get('Geographies', '') for theme in selected_themes):
-                    filtered_funds_data.append(obj)
-
-            # Filter the filtered_funds_data based on the selected date range
-            filtered_funds_data = [obj for obj in filtered_funds_data if start_quarter <= obj['Date'] <= end_quarter]
-
-            # Filter the filtered_funds_data based on the selected funds
-            if selected_funds:
-                filtered_funds_data = [obj for obj in filtered_funds_data if obj['Fund Name'] in selected_funds]
+            # Intersect the theme, date range and fund posting lists
+            filtered_funds_data = fund_info_data.theme_index().match(theme_field, selected_themes, start_quarter, end_quarter, selected_funds)
 
             if filtered_funds_data:
                 # Get the fund names and dates from the filtered data
@@ -411,64 +3333,120 @@ class MarketMoodMonitor:
                         macroeconomic views, and rationale for adding specific equity positions to their fund. Please carefully read through the entire document and identify the most relevant commentary related to the selected themes: {', '.join(selected_themes)}. When you complete your task, first plan how you should answer and which data you will use within \
                             <thinking> </thinking> XML tags. This is a space for you to write down relevant content and will not be shown to the user. Once you are done thinking, output your final answer to the user within <answer> </answer> XML tags. Do not include closing tags or unnecessary open-and-close tag sections."
 
-                    partner_letters = self.document_fetcher.fetch_partner_letters(fund_names_dates)
-                    
-                    # Display the included document names
+                    # The analysis runs in the background, so other widgets can be used (and more analyses started) meanwhile
+                    label = f"{analysis_type}: {', '.join(selected_themes)} ({start_quarter} to {end_quarter})"
+                    job_id = get_job_manager().submit(label, lambda job: self.run_analysis(job, message_prompt, system_prompt, fund_names_dates))
+                    st.session_state.setdefault("market_mood_jobs", []).append(job_id)
+            else:
+                st.write(f"No funds found that discussed the selected {analysis_type.lower()} themes.")
+
+    def run_analysis(self, job, message_prompt, system_prompt, fund_names_dates):
+        # Runs on a job worker, so results are returned instead of written to the page
+        with job.stage(f"Fetching {len(fund_names_dates)} partner letters"):
+            letter_results = self.document_fetcher.fetch_partner_letters(fund_names_dates)
+
+        # Keep the letters and their names aligned by only passing the letters that were fetched
+        partner_letters = [result.content for result in letter_results if result.ok]
+        included = [result.name for result in letter_results if result.ok]
+
+        # Market-wide questions over many letters yield to interactive Ask Anything calls
+        answer = self.ai_response_generator.compute_response(message_prompt, system_prompt, partner_letters, included, priority=LLM_PRIORITY_BULK, stage=job.stage)
+        return {
+            "answer": answer,
+            "included": included,
+            "skipped": [result.name for result in letter_results if not result.ok],
+        }
+
+    def display_jobs(self):
+        job_manager = get_job_manager()
+        job_ids = [job_id for job_id in st.session_state.get("market_mood_jobs", []) if job_manager.get(job_id) is not None]
+        st.session_state["market_mood_jobs"] = job_ids
+        if not job_ids:
+            return
+
+        if any(not job_manager.get(job_id).done for job_id in job_ids):
+            run_periodically(lambda: self.render_jobs(job_ids, polling=True), JOB_POLL_SECONDS)
+        else:
+            self.render_jobs(job_ids, polling=False)
+            if st.button("Clear finished analyses"):
+                st.session_state["market_mood_jobs"] = []
+                st.rerun()
+
+    def render_jobs(self, job_ids, polling):
+        job_manager = get_job_manager()
+        jobs = [job_manager.get(job_id) for job_id in job_ids]
+
+        # Newest analysis first
+        for job in reversed([job for job in jobs if job is not None]):
+            if job.status == "done":
+                with st.expander(job.label, expanded=True):
+                    for name in job.result["skipped"]:
+                        st.warning(f"The partner letter for {name} could not be loaded and was left out of the analysis.")
                     st.write("These funds were included in the analysis:")
-                    for fund_name_date in fund_names_dates:
+                    for fund_name_date in job.result["included"]:
                         st.write(f"- {fund_name_date}")
-
-                    # Generate the response
-                    self.ai_response_generator.generate_response(message_prompt, system_prompt, partner_letters, fund_names_dates)
+                    st.write(job.result["answer"])
+            elif job.status == "failed":
+                st.error(f"{job.label} failed: {job.error}")
             else:
-                st.write(f"No funds found that discussed the selected {analysis_type.lower()} themes.")
+                st.info(f"{job.label}: {job.progress}...")
+
+        if polling and all(job is None or job.done for job in jobs):
+            # Everything has finished; rerun the page once so it stops polling
+            st.rerun()
     
+    @traced("MarketMoodMonitor.run")
     def run(self, selected_funds):
         if not selected_funds:
             st.write("**Please select at least one fund to analyze.**")
             return
 
         analysis_type = st.radio('Select analysis type:', ['Market Commentary', 'Asset Class', 'Geography'])
-        fund_info_data = self.fetch_fund_info_data()
             
         # Add a slider for selecting the date range
-        quarters = ["2022 Q3", "2022 Q4", "2023 Q1", "2023 Q2", "2023 Q3", "2023 Q4", "2024 Q1"]
+        quarters = quarter_options(self.aws_operations.fetch_dataset_quarters(self.fund_info_path, "hedgefunds"))
         start_quarter, end_quarter = st.sidebar.select_slider("Select Date Range", options=quarters, value=(quarters[0], quarters[-1]))
 
+        # Only the partitions inside the selected date range are loaded
+        fund_info_data = self.fetch_fund_info_data(quarters_between(start_quarter, end_quarter))
+
         # Check if "All" is selected
         if "All" in selected_funds:
             # Get all unique fund names from the fund_info_data
-            selected_funds = list(set(obj['Fund Name'] for obj in fund_info_data))
+            selected_funds = fund_info_data.fund_names()
 
         self.handle_theme_specific(fund_info_data, analysis_type, selected_funds, start_quarter, end_quarter)
 
+        self.display_jobs()
+
 class MediaAndEvents:
     def __init__(self, aws_operations):
         self.aws_operations = aws_operations
 
-    def fetch_firm_updates_data(self):
-        firm_updates_data = self.aws_operations.fetch_object("hedgefund_firm_updates.json", "hedgefunds")
-        firm_updates_data = json.loads(firm_updates_data)
+    def fetch_firm_updates_data(self, quarters=None):
+        firm_updates_data = self.aws_operations.fetch_dataset("hedgefund_firm_updates.json", "hedgefunds", quarters=quarters)
         return firm_updates_data
     
+    @traced("MediaAndEvents.run")
     def run(self, selected_funds):
         if not selected_funds:
             st.write("**Please select at least one fund to view media and events updates.**")
             return
 
-        firm_updates_data = self.fetch_firm_updates_data()
-        unique_dates = sorted(set(obj['Date'] for obj in firm_updates_data), reverse=True)
+        unique_dates = sorted(self.aws_operations.fetch_dataset_quarters("hedgefund_firm_updates.json", "hedgefunds"), key=Quarter.parse, reverse=True)
 
         selected_date = st.selectbox("Select a date", unique_dates)
         update_type = st.radio("Select update type", ("Media Update", "Event Update"))
 
         if st.button("Submit"):
+            firm_updates_data = self.fetch_firm_updates_data([selected_date])
+
             # Check if "All" is selected
             if "All" in selected_funds:
                 # Get all unique fund names from the firm updates data
-                selected_funds = list(set(obj['Fund Name'] for obj in firm_updates_data))
+                selected_funds = firm_updates_data.fund_names()
 
-            filtered_data = [obj for obj in firm_updates_data if obj['Fund Name'] in selected_funds and obj['Date'] == selected_date]
+            filtered_data = [obj for fund in selected_funds for obj in firm_updates_data.lookup(fund, selected_date)]
 
             for fund_data in filtered_data:
                 fund_name = fund_data['Fund Name']
@@ -507,29 +3485,29 @@ class MediaAndEvents:
     #         st.write("---")
 
 class SpecificFundsSection:
-    def __init__(self, aws_operations):
+    def __init__(self, aws_operations, ai_response_generator, document_fetcher):
         self.aws_operations = aws_operations
+        self.ai_response_generator = ai_response_generator
+        self.document_fetcher = document_fetcher
 
+    @memoized_stage("hedgefunds")
     def fetch_available_quarters(self, selected_fund):
         # Fetch the JSON file containing the fund information
-        fund_info_data = self.aws_operations.fetch_object("hedgefund_general_insights.json", "hedgefunds")
-        fund_info_data = json.loads(fund_info_data)
+        fund_info_data = self.aws_operations.fetch_dataset("hedgefund_general_insights.json", "hedgefunds")
 
         # Extract the available quarters for the selected fund
-        available_quarters = [obj['Date'] for obj in fund_info_data if obj['Fund Name'] == selected_fund]
+        available_quarters = [obj['Date'] for obj in fund_info_data.records_for_fund(selected_fund)]
 
         # Sort the quarters based on year and quarter number
-        def sort_key(quarter):
-            year, quarter_num = quarter.split(' ')
-            return (int(year), int(quarter_num[1]))
-
-        available_quarters.sort(key=sort_key, reverse=True)
+        available_quarters.sort(key=Quarter.parse, reverse=True)
 
         return available_quarters
 
+    @memoized_stage("hedgefunds")
     def fetch_markdown_file(self, selected_fund, selected_quarter):
         # Format the markdown file name
-        markdown_file_name = f"{selected_fund.lower().replace(' ', '')}/cleaned/sum_med {selected_fund} {selected_quarter}.md"
+        fund_prefix = self.aws_operations.fund_prefix(selected_fund, "hedgefunds")
+        markdown_file_name = f"{fund_prefix}/cleaned/sum_med {selected_fund} {selected_quarter}.md"
 
         try:
             # Fetch the markdown file from S3
@@ -542,44 +3520,92 @@ class SpecificFundsSection:
             else:
                 raise e
 
-    def fetch_pdf_file(self, selected_fund, selected_quarter):
-        # Format the PDF file name
-        pdf_file_name = f"{selected_fund}/{selected_fund} {selected_quarter} Summary.pdf"
+    def pdf_file_name(self, selected_fund, selected_quarter):
+        # Summary PDFs have been uploaded both under the fund name and under the fund's folder
+        return self.aws_operations.resolve_key([
+            f"{selected_fund}/{selected_fund} {selected_quarter} Summary.pdf",
+            f"{self.aws_operations.fund_prefix(selected_fund, 'hedgefunds')}/{selected_fund} {selected_quarter} Summary.pdf"
+        ], "hedgefunds")
+
+    def pdf_exists(self, selected_fund, selected_quarter):
+        pdf_file_name = self.pdf_file_name(selected_fund, selected_quarter)
+        exists = self.aws_operations.object_exists(pdf_file_name, "hedgefunds")
+        if exists is None:
+            # No manifest: a link to a missing object would open an S3 error page, so ask S3 first
+            try:
+                exists = get_pdf_mirror().exists(self.aws_operations.s3, pdf_file_name, "hedgefunds")
+            except (botocore.exceptions.BotoCoreError, botocore.exceptions.ClientError) as e:
+                print(f"Could not check {pdf_file_name}: {str(e)}")
+                return False
+        if not exists:
+            print(f"PDF file not found for fund: {selected_fund} and quarter: {selected_quarter}")
+        return exists
+
+    def fetch_pdf_url(self, selected_fund, selected_quarter):
+        if not self.pdf_exists(selected_fund, selected_quarter):
+            return None
+        return self.aws_operations.presigned_url(self.pdf_file_name(selected_fund, selected_quarter), "hedgefunds")
 
-        try:
-            # Fetch the PDF file from S3
-            pdf_content = self.aws_operations.fetch_object(pdf_file_name, "hedgefunds")
-            return pdf_content
-        except botocore.exceptions.ClientError as e:
-            if e.response['Error']['Code'] == 'NoSuchKey':
-                print(f"PDF file not found for fund: {selected_fund} and quarter: {selected_quarter}")
-                return None
+    def fetch_pdf_file(self, selected_fund, selected_quarter):
+        # Local path of the PDF, streamed from S3 into the size-bounded disk cache
+        pdf_path = self.aws_operations.fetch_object_file(self.pdf_file_name(selected_fund, selected_quarter), "hedgefunds", get_pdf_mirror())
+        if pdf_path is None:
+            print(f"PDF file not found for fund: {selected_fund} and quarter: {selected_quarter}")
+        return pdf_path
+
+    def read_pdf_file(self, selected_fund, selected_quarter):
+        pdf_path = self.fetch_pdf_file(selected_fund, selected_quarter)
+        if pdf_path is None:
+            raise FileNotFoundError(self.pdf_file_name(selected_fund, selected_quarter))
+        with open(pdf_path, 'rb') as pdf_file:
+            return pdf_file.read()
+
+    def display_pdf_download(self, selected_fund, selected_quarter):
+        # A single click starts the download; the PDF bytes never pass through session state
+        if PDF_DOWNLOAD_MODE == "presigned":
+            pdf_url = self.fetch_pdf_url(selected_fund, selected_quarter)
+            if pdf_url:
+                st.link_button("Download Summary as PDF", pdf_url)
             else:
-                raise e
+                st.write("PDF file not available for download.")
+        elif self.pdf_exists(selected_fund, selected_quarter):
+            # The PDF is only read when the button is clicked, not on every rerun that renders the section
+            st.download_button(
+                label="Download Summary as PDF",
+                data=functools.partial(self.read_pdf_file, selected_fund, selected_quarter),
+                file_name=f"{selected_fund} {selected_quarter} Summary.pdf",
+                mime="application/pdf"
+            )
+        else:
+            st.write("PDF file not available for download.")
             
+    @memoized_stage("hedgefunds")
     def fetch_anomalies_data(self, selected_fund, selected_quarter):
-        anomalies_data = self.aws_operations.fetch_object("hedgefund_anomalies.json", "hedgefunds")
-        anomalies_data = json.loads(anomalies_data)
+        anomalies_data = self.aws_operations.fetch_dataset("hedgefund_anomalies.json", "hedgefunds")
         
-        filtered_data = [obj for obj in anomalies_data if obj['Fund Name'] == selected_fund and obj['Date'] == selected_quarter]
+        filtered_data = list(anomalies_data.lookup(selected_fund, selected_quarter))
         
         return filtered_data
 
+    @memoized_stage("hedgefunds")
     def fetch_firm_updates_data(self, selected_fund, selected_quarter):
-        firm_updates_data = self.aws_operations.fetch_object("hedgefund_firm_updates.json", "hedgefunds")
-        firm_updates_data = json.loads(firm_updates_data)
+        firm_updates_data = self.aws_operations.fetch_dataset("hedgefund_firm_updates.json", "hedgefunds")
         
-        filtered_data = [obj for obj in firm_updates_data if obj['Fund Name'] == selected_fund and obj['Date'] == selected_quarter]
+        filtered_data = list(firm_updates_data.lookup(selected_fund, selected_quarter))
         
         return filtered_data
+
+    @memoized_stage("hedgefunds")
     def fetch_performance_data(self, selected_fund):
-        performance_data = self.aws_operations.fetch_object("hedgefund_performance_insights.json", "hedgefunds")
-        performance_data = json.loads(performance_data)
+        # Only the selected fund's rows are read from the columnar copy
+        performance_data = self.aws_operations.fetch_frame("hedgefund_performance_insights.json", "hedgefunds", filters=[("Fund Name", "==", selected_fund)])
         
-        filtered_data = [obj for obj in performance_data if obj['Fund Name'] == selected_fund]
+        # Missing fields become empty strings, like obj.get(key, '') on the JSON records
+        filtered_data = performance_data.astype(object).where(performance_data.notna(), "").to_dict('records')
         
         return filtered_data
     
+    @traced("SpecificFundsSection.run")
     def run(self, selected_fund):
         if selected_fund:
             available_quarters = self.fetch_available_quarters(selected_fund)
@@ -598,18 +3624,7 @@ class SpecificFundsSection:
                     if markdown_content:
                         st.markdown(markdown_content)
 
-                        # Offer the PDF for download when the user clicks the download button
-                        if st.button("Download Summary as PDF"):
-                            pdf_content = self.fetch_pdf_file(selected_fund, selected_quarter)
-                            if pdf_content:
-                                st.download_button(
-                                    label="Download",
-                                    data=pdf_content,
-                                    file_name=f"{selected_fund} {selected_quarter} Summary.pdf",
-                                    mime="application/pdf"
-                                )
-                            else:
-                                st.write("PDF file not available for download.")
+                        self.display_pdf_download(selected_fund, selected_quarter)
                     else:
                         st.write("No summary available for the selected fund and quarter.")
             elif selected_section == "Performance":
@@ -617,7 +3632,7 @@ class SpecificFundsSection:
                 performance_data = self.fetch_performance_data(selected_fund)
                 
                 if performance_data:
-                    quarters = sorted(set(obj['Date'] for obj in performance_data))
+                    quarters = sorted(set(obj['Date'] for obj in performance_data), key=Quarter.parse)
                     
                     start_quarter, end_quarter = st.sidebar.select_slider(
                         "Select Date Range",
@@ -625,7 +3640,10 @@ class SpecificFundsSection:
                         value=(quarters[0], quarters[-1])
                     )
                     
-                    filtered_data = [obj for obj in performance_data if start_quarter <= obj['Date'] <= end_quarter]
+                    # Compared as quarters rather than as text, like the other sections
+                    start_ordinal = Quarter.parse(start_quarter).ordinal
+                    end_ordinal = Quarter.parse(end_quarter).ordinal
+                    filtered_data = [obj for obj in performance_data if start_ordinal <= Quarter.parse(obj['Date']).ordinal <= end_ordinal]
                     
                     if filtered_data:
                         table_data = []
@@ -705,40 +3723,91 @@ class SpecificFundsSection:
                     st.write("No firm updates and events found for the selected fund and quarter.")
             elif selected_section == "Ask Anything":
                 st.title(selected_fund)
-                st.write("Ask Anything section will be implemented later.")
+                self.handle_ask_anything(selected_fund, selected_quarter)
+
+    def handle_ask_anything(self, selected_fund, selected_quarter):
+        user_input = st.text_input("Enter your question:")
+
+        if user_input:
+            fund_name_date = f"{selected_fund} {selected_quarter}"
+            letter_result = self.document_fetcher.fetch_partner_letters([fund_name_date])[0]
+
+            if letter_result.ok:
+                # Only the passages most relevant to the question are sent to the model
+                letter_excerpt = get_passage_index_cache().get(letter_result.content).build_excerpt(user_input)
+
+                system_prompt = f"""
+                You are an experienced investment analyst reviewing the quarterly partner letter from the hedge fund {selected_fund}.
+                Each hedge fund writes a quarterly partner letter discussing topics such as their performance, macroeconomic views, and rationale for adding specific equity positions to their fund.
+                The user will ask a question about the provided partner letter and I want you to do the best job at answering it.
+                You are given the passages of the letter that are most relevant to the question. Each passage is wrapped in <passage> tags with its id and its character offsets in the letter.
+                Provide a comprehensive response, citing specific examples from the letter to support your points.
+                When you complete your task, first plan how you should answer within <thinking> </thinking> XML tags. Once you are done thinking, output your final answer to the user within <answer> </answer> XML tags.
+                """
+
+                message_prompt = f"""
+                This is the user's question:
+                <user_input>
+                {user_input}
+                </user_input>
+
+                Please provide a detailed response based on the information in the {selected_quarter} partner letter from {selected_fund}. Make sure you cite your sources correctly by referring to the passage ids like this: [Passage 3], and provide a well-structured answer.
+                """
+
+                self.ai_response_generator.generate_response(message_prompt, system_prompt, [letter_excerpt], [fund_name_date])
+            else:
+                st.write("Partner letter not found for the selected fund and quarter.")
 
 class VCDocumentFetcher:
     def __init__(self, aws_operations):
         self.aws_operations = aws_operations
 
     def fetch_vc_partner_letters(self, fund_name, date):
-        bucket_name = fund_name.split(" ")[0].lower()
-        file_name = f"{bucket_name}/cleaned/{fund_name} {date}.txt"
+        result = self.fetch_vc_partner_letters_batch([(fund_name, date)])[0]
+        return result.content if result.ok else None
+
+    def fetch_vc_partner_letters_batch(self, fund_names_dates):
+        # Takes (fund name, date) pairs and returns one FetchResult per pair, in order
+        names = []
+        file_names = []
+        for fund_name, date in fund_names_dates:
+            fund_prefix = self.aws_operations.fund_prefix(fund_name, "venturecapitalfunds")
+            names.append(f"{fund_name} {date}")
+            file_names.append(f"{fund_prefix}/cleaned/{fund_name} {date}.txt")
+
+        results = self.aws_operations.fetch_objects(file_names, "venturecapitalfunds", names=names)
+        for result in results:
+            if not result.ok:
+                print(f"File not found: {result.file_name}")
+                print(f"Error: {str(result.error)}")
+        return results
+
+class VCOpportunityScout:
+    def __init__(self, aws_operations):
+        self.aws_operations = aws_operations
+
+    def fetch_investments_frame(self, fund_name):
+        fund_prefix = self.aws_operations.fund_prefix(fund_name, "venturecapitalfunds")
+        file_name = f"{fund_prefix}/{fund_prefix}_investments.json"
         try:
-            letter_content = self.aws_operations.fetch_object(file_name, "venturecapitalfunds")
-            return letter_content
+            return self.aws_operations.fetch_frame(file_name, "venturecapitalfunds", columns=INVESTMENT_COLUMNS)
         except Exception as e:
             print(f"File not found: {file_name}")
             print(f"Error: {str(e)}")
             return None
 
-class VCOpportunityScout:
-    def __init__(self, aws_operations):
-        self.aws_operations = aws_operations
-
+    @memoized_stage("venturecapitalfunds")
     def fetch_investments_data(self, selected_funds):
-        investments_data = []
-        for fund_name in selected_funds:
-            bucket_name = fund_name.split(" ")[0].lower()
-            file_name = f"{bucket_name}/{bucket_name}_investments.json"
-            try:
-                json_data = self.aws_operations.fetch_object(file_name, "venturecapitalfunds")
-                investments_data.extend(json.loads(json_data))
-            except Exception as e:
-                print(f"File not found: {file_name}")
-                print(f"Error: {str(e)}")
-        return investments_data
+        # Fetch every fund's investments concurrently and stack them into one frame
+        workers = max(1, min(S3_FETCH_MAX_WORKERS, len(selected_funds)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            frames = [frame for frame in executor.map(in_current_span(self.fetch_investments_frame), selected_funds) if frame is not None and not frame.empty]
+
+        if not frames:
+            return pd.DataFrame(columns=INVESTMENT_COLUMNS)
+        return pd.concat(frames, ignore_index=True)
     
+    @traced("VCOpportunityScout.run")
     def run(self, fund_type, selected_funds):
         if not selected_funds:
             st.write("**Please select at least one fund in the side bar**")
@@ -746,7 +3815,7 @@ class VCOpportunityScout:
         
         if fund_type == "Venture Capital Funds":
             investments_data = self.fetch_investments_data(selected_funds)
-            investment_types = sorted(set(item["Type of Investment"] for item in investments_data))
+            investment_types = sorted(investments_data["Type of Investment"].dropna().unique())
             selected_investment_type = st.selectbox("Select Type of Investment", ["All"] + investment_types)
 
             # Add the "Select Amount Invested" filter
@@ -754,30 +3823,33 @@ class VCOpportunityScout:
             selected_amount_invested = st.selectbox("Select Amount Invested", amount_invested_options)
 
             # Add the "Fair Value of the Investment" filter
-            fair_value_options = sorted(set(item["Fair Value of the Investment"] for item in investments_data))
+            fair_value_options = sorted(investments_data["Fair Value of the Investment"].dropna().unique())
             selected_fair_value = st.selectbox("Select Fair Value of the Investment", ["All"] + fair_value_options)
 
             if st.button("Submit"):
-                filtered_data = investments_data
+                mask = np.ones(len(investments_data), dtype=bool)
 
                 if selected_investment_type != "All":
-                    filtered_data = [item for item in filtered_data if item["Type of Investment"] == selected_investment_type]
+                    mask &= (investments_data["Type of Investment"] == selected_investment_type).to_numpy()
 
                 # Apply the "Select Amount Invested" filter
                 if selected_amount_invested != "All":
+                    amount_invested = investments_data["Amount Invested"].astype(float).to_numpy()
                     if selected_amount_invested == "<$1m":
-                        filtered_data = [item for item in filtered_data if float(item["Amount Invested"]) < 1]
+                        mask &= amount_invested < 1
                     elif selected_amount_invested == "$1m-$10m":
-                        filtered_data = [item for item in filtered_data if 1 <= float(item["Amount Invested"]) <= 10]
+                        mask &= (amount_invested >= 1) & (amount_invested <= 10)
                     else:  # ">$10m"
-                        filtered_data = [item for item in filtered_data if float(item["Amount Invested"]) > 10]
+                        mask &= amount_invested > 10
 
                 # Apply the "Fair Value of the Investment" filter
                 if selected_fair_value != "All":
-                    filtered_data = [item for item in filtered_data if item["Fair Value of the Investment"] == selected_fair_value]
+                    mask &= (investments_data["Fair Value of the Investment"] == selected_fair_value).to_numpy()
 
-                if filtered_data:
-                    df = pd.DataFrame(filtered_data)
+                filtered_data = investments_data[mask]
+
+                if not filtered_data.empty:
+                    df = filtered_data.copy()
                     df["Amount Invested"] = df["Amount Invested"].apply(lambda x: "${:,.2f}".format(float(x)))
                     df = df[["Fund", "Date", "Company", "Type of Investment", "Amount Invested", "Date invested", "Fair Value of the Investment", "Summary"]]
                     
@@ -798,13 +3870,13 @@ class SpecificVCFundsSection:
         self.ai_response_generator = ai_response_generator
         self.vc_document_fetcher = vc_document_fetcher
 
+    @memoized_stage("venturecapitalfunds")
     def fetch_performance_data(self, selected_fund):
         # Fetch the performance data from the JSON file in the S3 bucket
-        performance_data = self.aws_operations.fetch_object("vc_performance_insights.json", "venturecapitalfunds")
-        performance_data = json.loads(performance_data)
+        performance_data = self.aws_operations.fetch_dataset("vc_performance_insights.json", "venturecapitalfunds")
 
-        # Filter the performance data based on the selected fund
-        filtered_data = [obj for obj in performance_data if obj['Fund Name'] == selected_fund]
+        # Look up the performance data for the selected fund
+        filtered_data = list(performance_data.records_for_fund(selected_fund))
 
         return filtered_data
 
@@ -831,42 +3903,16 @@ class SpecificVCFundsSection:
         st.write(text)
 
     def generate_vc_response(self, prompt, system_prompt, partner_letter, fund_name, date):
-        client = anthropic.Anthropic(api_key=self.ai_response_generator.api_key)
-        
+        documents = [(f"{fund_name} {date}", content_hash(partner_letter))]
+
         # Create XML tags for the document
         fund_name = fund_name.replace(" ", "").replace(",", "")
         quarter = date.split(" ")[0].lower()
         year = date.split(" ")[1]
         tag = f"<{fund_name}_{year}_{quarter}>"
         tagged_letter = f"{tag}\n{partner_letter}\n</{fund_name}_{year}_{quarter}>"
-        
-        message = client.messages.create(
-            model=CLAUDE_HAIKU,
-            max_tokens=2000,
-            temperature=0.2,
-            system=system_prompt,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": f"{tagged_letter}\n\n{prompt}"
-                        }
-                    ]
-                }
-            ]
-        )
-        
-        raw_text = message.content
-        answer = raw_text[0].text
-        
-        # Extract the content within <answer></answer> tags if present
-        answer_match = re.search(r'<answer>(.*?)</answer>', answer, re.DOTALL)
-        if answer_match:
-            answer = answer_match.group(1).strip()
-        
-        st.write(answer)
+
+        self.ai_response_generator.render_completion(system_prompt, f"{tagged_letter}\n\n{prompt}", documents)
 
     def handle_ask_anything(self, selected_fund, filtered_data):
         user_input = st.text_input("Enter your question:")
@@ -876,11 +3922,15 @@ class SpecificVCFundsSection:
             partner_letter = self.vc_document_fetcher.fetch_vc_partner_letters(selected_fund, date)
 
             if partner_letter:
+                # Only the passages most relevant to the question are sent to the model
+                letter_excerpt = get_passage_index_cache().get(partner_letter).build_excerpt(user_input)
+
                 system_prompt = f"""
                 You are an experienced venture capital analyst reviewing the quarterly letter from the VC fund {selected_fund}.
                 Venture capitalists invest in early-stage, high-growth potential companies with the goal of generating significant returns for their investors. They write quarterly letters to provide updates on the fund's performance, portfolio companies, and market insights to their limited partners (investors).
                 The user will ask a question about the provided quarterly letter and I want you to do the best job at answering it.
-                Your task is to analyze the provided partner letter and extract relevant insights to answer the user's question.
+                You are given the passages of the letter that are most relevant to the question. Each passage is wrapped in <passage> tags with its id and its character offsets in the letter.
+                Your task is to analyze the provided passages and extract relevant insights to answer the user's question.
                 Provide a comprehensive response, citing specific examples from the letter to support your points.
                 After reviewing the relevant information, take a moment to organize your thoughts and present your final analysis to the user.
                 """
@@ -891,13 +3941,14 @@ class SpecificVCFundsSection:
                 {user_input}
                 </user_input>
 
-                Please provide a detailed response based on the information in the quarterly letter from {selected_fund}. Make sure you cite your sources correctly and provide a well-structured answer.
+                Please provide a detailed response based on the information in the quarterly letter from {selected_fund}. Make sure you cite your sources correctly by referring to the passage ids like this: [Passage 3], and provide a well-structured answer.
                 """
 
-                self.generate_vc_response(message_prompt, system_prompt, partner_letter, selected_fund, date)
+                self.generate_vc_response(message_prompt, system_prompt, letter_excerpt, selected_fund, date)
             else:
                 st.write("Partner letter not found for the selected fund and date.")
 
+    @traced("SpecificVCFundsSection.run")
     def run(self, selected_fund):
         if selected_fund:
             st.title(selected_fund)
@@ -928,15 +3979,15 @@ class SourcesSection:
         self.aws_operations = aws_operations
 
     def fetch_fund_names(self, bucket_name, fund_info_path):
-        # Fetch the JSON file from S3
-        json_data = self.aws_operations.fetch_object(fund_info_path, bucket_name)
-        fund_info_data = json.loads(json_data)
+        # Fetch the shared, parsed dataset
+        fund_info_data = self.aws_operations.fetch_dataset(fund_info_path, bucket_name)
 
         # Get unique fund names
-        fund_names = set(obj['Fund Name'] for obj in fund_info_data)
+        fund_names = set(fund_info_data.fund_names())
 
         return list(fund_names)
 
+    @traced("SourcesSection.run")
     def run(self):
         source_option = st.radio(
             "Select a source option",
@@ -977,13 +4028,72 @@ class SourcesSection:
 
 def main():
     st.set_page_config(layout="wide")
+
+    profiler = SamplingProfiler(threading.get_ident(), PROFILE_INTERVAL_SECONDS).start() if profiling_requested() else None
+
+    stage_memo = get_stage_memo()
+    stage_memo.start_rerun()
+
+    # Everything below runs inside one trace per rerun
+    try:
+        with get_tracer().span("rerun") as trace:
+            render_page()
+            trace.set(stages_reused=len(stage_memo.reused), stages_computed=len(stage_memo.computed))
+    finally:
+        if profiler is not None:
+            profiler.stop()
+
+    if TRACING_ENABLED and st.sidebar.checkbox("Show performance panel", value=TRACE_PANEL):
+        display_performance_panel(trace, stage_memo)
+
+    if profiler is not None:
+        display_profile(profiler)
+
+def display_profile(profiler):
+    base_name = profiler.write(PROFILE_OUTPUT_DIR, "rerun")
+    with st.expander("Profile of this rerun", expanded=True):
+        st.write(f"{sum(profiler.samples.values())} samples over {profiler.duration:.2f}s, written to {base_name}.collapsed and {base_name}.speedscope.json (open the latter at speedscope.app).")
+        hotspots = profiler.hotspots(__file__)
+        if hotspots:
+            st.dataframe(pd.DataFrame(hotspots), hide_index=True)
+
+def display_performance_panel(trace, stage_memo):
+    rows = []
+
+    def add_rows(span, depth):
+        if len(rows) >= 200:
+            return
+        numbers = {attribute: value for attribute, value in span.attributes.items() if isinstance(value, (int, float)) and not isinstance(value, bool)}
+        rows.append({
+            "Span": "· " * depth + span.name,
+            "ms": round(span.duration * 1000, 1),
+            "Bytes": numbers.get("bytes"),
+            "Rows": numbers.get("rows"),
+            "Detail": span.attributes.get("key", "") or ("reused" if span.attributes.get("reused") else "") or (span.error or ""),
+        })
+        for child in sorted(span.children, key=lambda child: child.start):
+            add_rows(child, depth + 1)
+
+    for child in sorted(trace.children, key=lambda child: child.start):
+        add_rows(child, 0)
+
+    # Time not covered by any span is mostly Streamlit itself (widgets, rendering) and untraced Python
+    untraced = max(0.0, trace.duration - sum(child.duration for child in trace.children))
+    with st.sidebar.expander("Performance", expanded=True):
+        st.write(f"This rerun took {trace.duration * 1000:.0f} ms, of which {untraced * 1000:.0f} ms outside traced spans.")
+        if stage_memo.reused or stage_memo.computed:
+            st.write(f"Reused {len(stage_memo.reused)} of {len(stage_memo.reused) + len(stage_memo.computed)} stages: {', '.join(stage_memo.reused) or 'none'}.")
+        if rows:
+            st.dataframe(pd.DataFrame(rows), hide_index=True)
+
+def render_page():
     aws_operations = AWSOperations()
     ai_response_generator = AIResponseGenerator(ANTHROPIC_API_KEY)
     document_fetcher = DocumentFetcher(aws_operations)
     market_mood_monitor = MarketMoodMonitor(aws_operations, ai_response_generator, "hedgefund_general_insights.json", document_fetcher)
     sources_section = SourcesSection(aws_operations)
     performance_pulse = PerformancePulse(aws_operations)
-    specific_funds_section = SpecificFundsSection(aws_operations)
+    specific_funds_section = SpecificFundsSection(aws_operations, ai_response_generator, document_fetcher)
     vc_document_fetcher = VCDocumentFetcher(aws_operations)
     specific_vc_funds_section = SpecificVCFundsSection(aws_operations, ai_response_generator, vc_document_fetcher)
     vc_opportunity_scout = VCOpportunityScout(aws_operations) 